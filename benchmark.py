@@ -0,0 +1,352 @@
+import argparse
+import datetime
+import http.client
+import json
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from examples import events
+import src.constants as constants
+
+# Load generator and latency benchmark for the HTTP API.
+#
+#   python benchmark.py                               # in-process through Flask's test client
+#   python benchmark.py --url http://localhost:5000   # against a running server
+#
+# Results are printed as JSON, one entry per route with throughput and p50/p95/p99 latency.
+
+
+class TestClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body, buffered=False)
+        # An event stream never ends, it counts as answered with its first chunk
+        if response.mimetype == 'text/event-stream':
+            next(response.response, None)
+        else:
+            response.get_data()
+        response.close()
+        return response.status_code
+
+
+class HttpClient:
+    def __init__(self, url):
+        parsed = urllib.parse.urlparse(url)
+        # One keep-alive connection per load thread
+        self.connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=60)
+
+    def request(self, method, path, body=None):
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+
+        self.connection.request(method, path, payload, headers)
+        response = self.connection.getresponse()
+
+        # An event stream never ends, it counts as answered with its first chunk and the
+        # connection is reopened for the next request
+        if response.getheader('Content-Type', '').startswith('text/event-stream'):
+            response.readline()
+            self.connection.close()
+        else:
+            response.read()
+        return response.status
+
+
+class Traffic:
+    # Synthesizes payloads shaped like the samples in examples.py for a fleet of farmers and nodes
+    def __init__(self, farmers, nodes, farms_per_farmer, seed):
+        self.random = random.Random(seed)
+        self.farmers = [f'farmer-{i}' for i in range(farmers)]
+        self.nodes = [f'node-{i}' for i in range(nodes)]
+        self.farms_per_farmer = farms_per_farmer
+        self.start = datetime.datetime.now() - datetime.timedelta(days=1)
+        self.tick = 0
+        self.lock = threading.Lock()
+
+    def datetime(self):
+        # Strictly increasing timestamps spread over the last day
+        with self.lock:
+            self.tick += 1
+            tick = self.tick
+        return (self.start + datetime.timedelta(milliseconds=tick * 10)).strftime('%Y-%m-%d %H:%M:%S.%f')
+
+    def farmer(self):
+        return self.random.choice(self.farmers)
+
+    def node(self):
+        return self.random.choice(self.nodes)
+
+    def farm_index(self):
+        return self.random.randrange(self.farms_per_farmer)
+
+    def farmer_payload(self):
+        return {'Farmer Name': self.farmer()}
+
+    def node_payload(self):
+        return {'Node Name': self.node(), 'Node Status': 'Running'}
+
+    def farm_payload(self):
+        farmer_name = self.farmer()
+        farm_index = self.farm_index()
+        return {
+            'Farmer Name': farmer_name,
+            'Data': {
+                'Farm ID': f'{events["Insert Farm"]["Farm ID"]}-{farmer_name}-{farm_index}',
+                'Farm Index': farm_index,
+                'Farm Status': 'Plotting'
+            }
+        }
+
+    def farmer_event_payload(self):
+        sample = events[self.random.choice(['Plotting Sector', 'Replotting Sector', 'Reward'])]
+        return {
+            'Farmer Name': self.farmer(),
+            'Event Type': sample['Event Type'],
+            'Datetime': self.datetime(),
+            'Data': dict(sample['Data'], **{'Farm Index': self.farm_index()})
+        }
+
+    def node_event_payload(self):
+        return {
+            'Node Name': self.node(),
+            'Event Type': 'Idle Node',
+            'Datetime': self.datetime(),
+            'Data': {'Peers': self.random.randrange(40)}
+        }
+
+    def plot_payload(self):
+        sample = events[self.random.choice(['Plotting Sector', 'Replotting Sector'])]['Data']
+        return {
+            'Farmer Name': self.farmer(),
+            'Datetime': self.datetime(),
+            'Data': {
+                'Farm Index': self.farm_index(),
+                'Plot Percentage': round(self.random.uniform(0, sample['Percentage Complete']), 2),
+                'Plot Current Sector': self.random.randrange(sample['Current Sector']),
+                'Plot Type': sample['Replot']
+            }
+        }
+
+    def reward_payload(self):
+        sample = events['Reward']['Data']
+        return {
+            'Farmer Name': self.farmer(),
+            'Datetime': self.datetime(),
+            'Data': {
+                'Farm Index': self.farm_index(),
+                'Reward Hash': f'{sample["Hash"]}{self.random.getrandbits(32):08x}',
+                'Reward Type': 'Reward'
+            }
+        }
+
+    def error_payload(self):
+        return {
+            'Farmer Name': self.farmer(),
+            'Datetime': self.datetime(),
+            'Data': events['Error']['Data']
+        }
+
+    def claim_payload(self):
+        return {
+            'Node Name': self.node(),
+            'Datetime': self.datetime(),
+            'Data': {
+                'Slot': self.random.randrange(10 ** 6),
+                'Claim Type': self.random.choice(['Vote', 'Block'])
+            }
+        }
+
+    def consensus_payload(self):
+        best = self.random.randrange(10 ** 6)
+        return {
+            'Node Name': self.node(),
+            'Datetime': self.datetime(),
+            'Data': {
+                'Status': 'Syncing',
+                'Peers': self.random.randrange(40),
+                'Best': best,
+                'Target': best + self.random.randrange(100),
+                'Finalized': best - 10,
+                'BPS': round(self.random.uniform(0, 20), 1),
+                'Down Speed': round(self.random.uniform(0, 500), 1),
+                'Up Speed': round(self.random.uniform(0, 500), 1)
+            }
+        }
+
+    def time_window(self):
+        # Covers everything generated so far
+        end = datetime.datetime.now() + datetime.timedelta(days=1)
+        return urllib.parse.urlencode({
+            'start_datetime': self.start.strftime('%Y-%m-%d %H:%M:%S.%f'),
+            'end_datetime': end.strftime('%Y-%m-%d %H:%M:%S.%f')
+        })
+
+
+def routes(traffic, batch_size):
+    insert_entities = ['farmer', 'node', 'farm', 'farmer_event', 'node_event', 'plot', 'reward', 'error', 'claim', 'consensus']
+
+    for entity in insert_entities:
+        payload = getattr(traffic, f'{entity}_payload')
+        yield f'POST /insert/{entity}', lambda payload=payload, entity=entity: ('POST', f'/insert/{entity}', payload())
+
+    for entity in ['plot', 'consensus']:
+        payload = getattr(traffic, f'{entity}_payload')
+        yield f'POST /insert/{entity}/batch', lambda payload=payload, entity=entity: ('POST', f'/insert/{entity}/batch', [payload() for _ in range(batch_size)])
+
+    yield 'GET /get/farmers', lambda: ('GET', '/get/farmers', None)
+    yield 'GET /get/nodes', lambda: ('GET', '/get/nodes', None)
+    yield 'GET /get/farms', lambda: ('GET', '/get/farms', None)
+    yield 'GET /get/farmer_events', lambda: ('GET', f'/get/farmer_events?{traffic.time_window()}&farmer_name={traffic.farmer()}', None)
+    yield 'GET /get/node_events', lambda: ('GET', f'/get/node_events?{traffic.time_window()}&node_name={traffic.node()}', None)
+    yield 'GET /get/plots', lambda: ('GET', f'/get/plots?{traffic.time_window()}&farmer_name={traffic.farmer()}&farm_index={traffic.farm_index()}', None)
+    yield 'GET /get/rewards', lambda: ('GET', f'/get/rewards?{traffic.time_window()}&farmer_name={traffic.farmer()}', None)
+    yield 'GET /get/errors', lambda: ('GET', f'/get/errors?{traffic.time_window()}', None)
+    yield 'GET /get/consensus', lambda: ('GET', f'/get/consensus?{traffic.time_window()}&node_name={traffic.node()}', None)
+    yield 'GET /get/plot_state', lambda: ('GET', f'/get/plot_state?farmer_name={traffic.farmer()}', None)
+    yield 'GET /get/consensus_state', lambda: ('GET', '/get/consensus_state', None)
+
+    yield 'GET /aggregate/rewards', lambda: ('GET', f'/aggregate/rewards?{traffic.time_window()}&group_by=farmer', None)
+    yield 'GET /aggregate/plots', lambda: ('GET', f'/aggregate/plots?{traffic.time_window()}&farmer_name={traffic.farmer()}', None)
+    yield 'GET /export/plots', lambda: ('GET', f'/export/plots?{traffic.time_window()}&farmer_name={traffic.farmer()}', None)
+
+    # Measures subscribing up to the first chunk, needs stream.enabled
+    yield 'GET /stream/plots', lambda: ('GET', f'/stream/plots?farmer_name={traffic.farmer()}', None)
+
+
+def percentile(sorted_values, percent):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(percent / 100 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+def run_route(make_client, request_factory, requests, concurrency):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(count):
+        client = make_client()
+        local_latencies = []
+        local_errors = 0
+        for _ in range(count):
+            method, path, body = request_factory()
+            start = time.perf_counter()
+            try:
+                status = client.request(method, path, body)
+            except Exception:
+                status = None
+            local_latencies.append(time.perf_counter() - start)
+            if status is None or status >= 400:
+                local_errors += 1
+
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    counts = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(count,)) for count in counts if count]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'seconds': round(elapsed, 4),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else None
+    }
+
+
+def create_test_app(config_file):
+    import logging
+    from src.helpers import Helpers
+    from src.nexus import create_app
+
+    # Request logging would dominate the measurements
+    logging.disable(logging.CRITICAL)
+
+    config = Helpers.read_yaml_file(config_file) if config_file else {}
+    config = dict(config or {}, database_location=tempfile.mkdtemp(prefix='nexus-bench-') + '/')
+
+    app = create_app(config)
+    app.config['database_api'].initialize()
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Nexus HTTP API.')
+    parser.add_argument('--url', help='base URL of a running server, defaults to an in-process test client')
+    parser.add_argument('--config', help='config file used for the in-process app (e.g. to benchmark async ingest)')
+    parser.add_argument('--farmers', type=int, default=20, help='number of simulated farmers')
+    parser.add_argument('--nodes', type=int, default=5, help='number of simulated nodes')
+    parser.add_argument('--farms-per-farmer', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=500, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients per route')
+    parser.add_argument('--batch-size', type=int, default=100, help='records per batch insert request')
+    parser.add_argument('--route', action='append', help='only run routes containing this text, can be repeated')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the JSON results to this file instead of stdout')
+    args = parser.parse_args()
+
+    if args.url:
+        make_client = lambda: HttpClient(args.url)
+        target = args.url
+    else:
+        app = create_test_app(args.config)
+        make_client = lambda: TestClient(app)
+        target = 'flask-test-client'
+
+    traffic = Traffic(args.farmers, args.nodes, args.farms_per_farmer, args.seed)
+
+    results = {
+        'nexus': constants.VERSIONS['nexus'],
+        'target': target,
+        'farmers': args.farmers,
+        'nodes': args.nodes,
+        'requests_per_route': args.requests,
+        'concurrency': args.concurrency,
+        'batch_size': args.batch_size,
+        'routes': {}
+    }
+
+    # Inserts run first so the reads below have data to page through
+    for name, request_factory in routes(traffic, args.batch_size):
+        if args.route and not any(route in name for route in args.route):
+            continue
+        print(f'Running {name}', file=sys.stderr)
+        results['routes'][name] = run_route(make_client, request_factory, args.requests, args.concurrency)
+
+    if not args.url and app.config.get('ingest_queue'):
+        app.config['ingest_queue'].stop()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
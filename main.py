@@ -1,6 +1,6 @@
 import argparse
 import sys
-from src.logger import logger
+from src.logger import logger, setup_logging
 from src.helpers import Helpers
 from src.nexus import Nexus
 
@@ -16,9 +16,12 @@ def main():
     config = Helpers.read_yaml_file(args.config_file)
 
     if not config:
-        logger.error(f'Error loading config from {args.config}. Are you sure you put in the right location?')
+        logger.error(f'Error loading config from {args.config_file}. Are you sure you put in the right location?')
         sys.exit(1)
 
+    # Levels, rotation and handlers come from the logging section of the config
+    setup_logging(config.get('logging'))
+
     nexus = Nexus(config)
     nexus.run()
 
@@ -1,48 +1,164 @@
 import sqlite3
 import json
-import datetime
+import itertools
+import sys
+import threading
+import time
 
-from src.logger import logger
+from src.logger import get_logger
+from src.backend import StorageBackend
 from src.helpers import Helpers
 from src.constants import keys
+from src.pool import ConnectionPool
+from src.metrics import InstrumentedConnection
+import src.rollups as rollups
+import src.state as state
+import src.schema as schema
+import src.timestamps as timestamps
+
+logger = get_logger(__name__)
 
 # TODO:
 # More Validation for Arguments
 
-class DatabaseAPI:
-    def __init__(self, db_location):
+class DatabaseAPI(StorageBackend):
+    # WAL mode SQLite, see src/checkpoint.py
+    checkpoints_wal = True
+
+    # Table -> column that orders rows of equal datetime, keyset pagination and batch deletes use it
+    row_ids = {}
+
+    # Tables paged newest first unless ?order= says otherwise, the rest are paged oldest first
+    newest_first = {'farmers', 'nodes', 'farms', 'farmer_events', 'node_events'}
+
+    def __init__(self, db_location, pool_size=8, pool_timeout=30, pragmas=None, instrument=True):
         self.db_location = db_location
-        self.conn = None
+        self.instrument = instrument
+
+        # Instrumented connections time every execute, fetch and commit for /metrics
+        factory = InstrumentedConnection if instrument else sqlite3.Connection
+        self.pool = ConnectionPool(db_location, size=pool_size, timeout=pool_timeout, pragmas=pragmas, factory=factory)
+
+        # Each thread checks out its own connection, so concurrent requests never share a handle
+        self._local = threading.local()
 
-    def connect(self):
+        # Called as listener(action, table, rows) after every committed write
+        self.write_listeners = []
+
+    @property
+    def conn(self):
+        return getattr(self._local, 'conn', None)
+
+    @staticmethod
+    def _caller_name(depth=1):
+        # The public method that called us (skipping private helpers) names the call
+        frame = sys._getframe(depth + 1)
+        while frame.f_code.co_name.startswith('_') and frame.f_back:
+            frame = frame.f_back
+        return frame.f_code.co_name
+
+    def connect(self, call_name=None):
         # logger.info('Connecting to DB')
-        self.conn = sqlite3.connect(self.db_location)
+        if self.conn is None:
+            start = time.perf_counter()
+            self._local.conn = self.pool.acquire()
+            self._local.depth = 0
+
+            if self.instrument:
+                self._local.conn.begin_call(call_name or self._caller_name(), start)
+
+        # Nested connect() calls on the same thread reuse the checked out connection
+        self._local.depth += 1
 
     def disconnect(self):
         # logger.info('Disconnecting from DB')
-        if self.conn:
-            self.conn.close()
+        conn = self.conn
+        if conn is None:
+            return
+
+        self._local.depth -= 1
+        if self._local.depth <= 0:
+            self._local.conn = None
+            if self.instrument:
+                conn.end_call()
+            self.pool.release(conn)
+
+    def close(self):
+        logger.info('Closing DB connection pool')
+        self.pool.close()
+
+    def suspend(self):
+        # Closes the pooled connections and holds off new ones, so a forked child inherits none
+        self.pool.suspend()
+
+    def resume(self):
+        self.pool.resume()
+
+    def add_write_listener(self, listener):
+        self.write_listeners.append(listener)
+
+    def _notify_write(self, action, table, rows=None):
+        # rows are the written rows (or the keys updated/deleted), None when any row may have changed
+        for listener in self.write_listeners:
+            try:
+                listener(action, table, rows)
+            except Exception as e:
+                logger.error(f'Error in write listener for {table}: {e}')
+
+    def checkpoint(self, mode='PASSIVE'):
+        try:
+            self.connect()
+            cursor = self.conn.cursor()
+
+            if mode not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+                raise ValueError(f'Unknown checkpoint mode: {mode}')
+
+            cursor.execute(f"PRAGMA wal_checkpoint({mode})")
+            busy, log_frames, checkpointed_frames = cursor.fetchone()
+
+            response = {
+                "Success": True,
+                "Data": {
+                    "Busy": bool(busy),
+                    "Log Frames": log_frames,
+                    "Checkpointed Frames": checkpointed_frames
+                }
+            }
 
-    def initialize(self):
+        except Exception as e:
+            logger.error(f'Error checkpointing WAL: {e}')
+            response = {
+                "Success": False,
+                "Message": f"Error checkpointing WAL: {e}"
+            }
+
+        finally:
+            self.disconnect()
+
+        return response
+
+    def initialize(self, vacuum_existing=False):
         logger.info(f'initializing DB at location: {self.db_location}')
         
         self.connect()
         cursor = self.conn.cursor()
 
+        self._enable_incremental_vacuum(cursor, vacuum_existing)
+
         logger.info('initializing "farmers" Table')
         cursor.execute('''CREATE TABLE IF NOT EXISTS farmers (
                             farmer_name TEXT,
                             farmer_piece_cache_status TEXT,
                             farmer_piece_cache_percent REAL,
                             farmer_workers INTEGER,
-                            creation_datetime DATETIME
+                            creation_datetime INTEGER
                         )''')
         
         logger.info('initializing "nodes" Table')
         cursor.execute('''CREATE TABLE IF NOT EXISTS nodes (
                             node_name TEXT,
                             node_status TEXT,
-                            creation_datetime DATETIME
+                            creation_datetime INTEGER
                         )''')
         
         logger.info('initializing "farms" Table')
@@ -54,7 +170,7 @@ class DatabaseAPI:
                             farm_allocated_space_gib REAL,
                             farm_directory TEXT,
                             farm_status TEXT,
-                            creation_datetime DATETIME
+                            creation_datetime INTEGER
                         )''')
         
         logger.info('initializing "farmer_events" Table')
@@ -63,7 +179,8 @@ class DatabaseAPI:
                             farmer_name TEXT,
                             event_type TEXT,
                             event_data TEXT,
-                            event_datetime DATETIME
+                            event_datetime INTEGER,
+                            event_hash INTEGER
                         )''')
         
         logger.info('initializing "node_events" Table')
@@ -72,7 +189,8 @@ class DatabaseAPI:
                             node_name TEXT,
                             event_type TEXT,
                             event_data TEXT,
-                            event_datetime DATETIME
+                            event_datetime INTEGER,
+                            event_hash INTEGER
                         )''')
         
         logger.info('Initializing "plots" Table')
@@ -83,7 +201,7 @@ class DatabaseAPI:
                             plot_percentage REAL,
                             plot_current_sector INTEGER,
                             plot_type INTEGER,
-                            plot_datetime DATETIME
+                            plot_datetime INTEGER
                         )''')
         
         logger.info('initializing "rewards" Table')
@@ -93,7 +211,7 @@ class DatabaseAPI:
                             farm_index TEXT,
                             reward_hash TEXT,
                             reward_type TEXT,
-                            reward_datetime DATETIME
+                            reward_datetime INTEGER
                         )''')
         
         logger.info('Initializing "errors" Table')
@@ -101,7 +219,7 @@ class DatabaseAPI:
                             error_id INTEGER PRIMARY KEY AUTOINCREMENT,
                             farmer_name TEXT,
                             error TEXT,
-                            error_datetime DATETIME
+                            error_datetime INTEGER
                         )''')
         
         logger.info('Initializing "claims" Table')
@@ -110,7 +228,7 @@ class DatabaseAPI:
                             node_name TEXT,
                             slot INT,
                             claim_type TEXT,
-                            claim_datetime DATETIME
+                            claim_datetime INTEGER
                         )''')
         # best: Current Block
         # target: Highest Block
@@ -127,182 +245,534 @@ class DatabaseAPI:
                             bps INT,
                             down_speed_kib REAL,
                             up_speed_kib REAL,
-                            consensus_datetime DATETIME
+                            consensus_datetime INTEGER
                         )''')
+
+        self._migrate(cursor)
+        self._create_indexes(cursor)
+        self._create_rollups(cursor)
+        self._create_state_tables(cursor)
         
         self.conn.commit()
         self.disconnect()
 
+    # DDL of the rollup and state tables, see src/rollups.py and src/state.py
+    rollup_table_statements = {
+        (entity, resolution): rollups.create_table_sql(entity, resolution)
+        for entity in rollups.rollups
+        for resolution in rollups.resolutions
+    }
+    state_table_statements = {entity: state.create_table_sql(entity) for entity in state.states}
+    state_backfill_statements = {entity: state.backfill_sql(entity) for entity in state.states}
+
+    def _table_exists(self, cursor, table):
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        return cursor.fetchone()[0] > 0
+
+    def _index_exists(self, cursor, index_name):
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND name = ?", (index_name,))
+        return cursor.fetchone()[0] > 0
+
+    def _create_rollups(self, cursor):
+        for entity, rollup in rollups.rollups.items():
+            backfill = False
+            for resolution in rollups.resolutions:
+                table = rollups.rollup_table(entity, resolution)
+                backfill = backfill or not self._table_exists(cursor, table)
+
+                logger.info(f'Initializing "{table}" Table')
+                cursor.execute(self.rollup_table_statements[(entity, resolution)])
+                cursor.execute(rollups.create_index_sql(entity, resolution))
+
+            if not backfill:
+                continue
+
+            # Fold existing history into newly created rollup tables, in chunks to bound memory
+            columns = list(rollup['group']) + rollup['metrics'] + [rollup['datetime']]
+            source = self.conn.cursor()
+            source.execute(f"SELECT {', '.join(columns)} FROM {rollup['table']} ORDER BY {rollup['datetime']}")
+            backfilled = 0
+            while True:
+                rows = source.fetchmany(10000)
+                if not rows:
+                    break
+                self._update_rollups(cursor, entity, [dict(zip(columns, row)) for row in rows])
+                backfilled += len(rows)
+
+            if backfilled:
+                logger.info(f'Backfilled {backfilled} {rollup["table"]} rows into rollups')
+
+    def _create_state_tables(self, cursor):
+        for entity, entity_state in state.states.items():
+            table = entity_state['table']
+            backfill = not self._table_exists(cursor, table)
+
+            logger.info(f'Initializing "{table}" Table')
+            cursor.execute(self.state_table_statements[entity])
+
+            # Seed a new state table with the newest existing row of every series
+            if backfill:
+                cursor.execute(self.state_backfill_statements[entity])
+                if cursor.rowcount > 0:
+                    logger.info(f'Backfilled {cursor.rowcount} rows into "{table}"')
+
+    def _enable_incremental_vacuum(self, cursor, vacuum_existing):
+        # Lets the pruner hand freed pages back to the OS. Switching modes needs a VACUUM, which is
+        # instant on a new database but rewrites the whole file on an existing one, so that is opt in.
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] == 2:
+            return
+
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master")
+        is_new = cursor.fetchone()[0] == 0
+
+        if is_new or vacuum_existing:
+            logger.info('Enabling incremental auto vacuum')
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cursor.execute("VACUUM")
+        else:
+            logger.info('Incremental auto vacuum is off, pruned space will be reused but not returned to the OS')
+
+    # Tables and their columns holding timestamps, see src/timestamps.py
+    datetime_columns = {
+        'farmers': ['creation_datetime'],
+        'nodes': ['creation_datetime'],
+        'farms': ['creation_datetime'],
+        'farmer_events': ['event_datetime'],
+        'node_events': ['event_datetime'],
+        'plots': ['plot_datetime'],
+        'rewards': ['reward_datetime'],
+        'errors': ['error_datetime'],
+        'claims': ['claim_datetime'],
+        'consensus': ['consensus_datetime'],
+        **{
+            rollups.rollup_table(entity, resolution): ['bucket_datetime', 'last_datetime']
+            for entity in rollups.rollups
+            for resolution in rollups.resolutions
+        },
+        **{entity_state['table']: [entity_state['datetime']] for entity_state in state.states.values()}
+    }
+
+    def _migrate_timestamps(self, cursor):
+        # Databases written before user_version 1 store datetimes as 'YYYY-MM-DD HH:MM:SS.ffffff' strings
+        cursor.execute("PRAGMA user_version")
+        if cursor.fetchone()[0] >= 1:
+            return
+
+        for table, columns in self.datetime_columns.items():
+            if not self._table_exists(cursor, table):
+                continue
+
+            for column in columns:
+                # Strings that are not datetimes at all are left as they are. Two spellings of the same
+                # time collide on the unique indexes, only one of those duplicates is kept.
+                cursor.execute(f"UPDATE OR REPLACE {table} SET {column} = {timestamps.migrate_sql(column)} "
+                               f"WHERE typeof({column}) = 'text' AND strftime('%s', {column}) IS NOT NULL")
+                if cursor.rowcount > 0:
+                    logger.info(f'Converted {cursor.rowcount} "{table}.{column}" datetimes to integer timestamps')
+
+        cursor.execute("PRAGMA user_version = 1")
+
+    def _migrate(self, cursor):
+        self._migrate_timestamps(cursor)
+
+        # Older databases have no event_hash column, add and backfill it
+        self.conn.create_function('nexus_event_hash', 1, Helpers.hash_event_data, deterministic=True)
+        for table in ['farmer_events', 'node_events']:
+            cursor.execute(f"PRAGMA table_info({table})")
+            columns = [row[1] for row in cursor.fetchall()]
+            if 'event_hash' not in columns:
+                logger.info(f'Adding "event_hash" column to "{table}"')
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN event_hash INTEGER")
+            cursor.execute(f"UPDATE {table} SET event_hash = nexus_event_hash(event_data) WHERE event_hash IS NULL")
+
+        # Typed columns over the JSON payload, virtual so they cost no storage and can be added to existing tables
+        for table, fields in self.event_fields.items():
+            cursor.execute(f"PRAGMA table_xinfo({table})")
+            columns = [row[1] for row in cursor.fetchall()]
+            for field, (column, column_type) in fields.items():
+                if column not in columns:
+                    logger.info(f'Adding "{column}" column to "{table}"')
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type} "
+                                   f"GENERATED ALWAYS AS ({self._payload_expression(field)}) VIRTUAL")
+
+        # Remove duplicates that the old SELECT-then-INSERT dedup let through, so the unique indexes can be built.
+        # Once an index exists its table can hold no duplicates, so the full scan only runs once.
+        for table, table_indexes in self.unique_indexes.items():
+            for columns in table_indexes:
+                if self._index_exists(cursor, self._unique_index_name(table, columns)):
+                    continue
+                cursor.execute(f"DELETE FROM {table} WHERE rowid NOT IN (SELECT MAX(rowid) FROM {table} GROUP BY {', '.join(columns)})")
+                if cursor.rowcount > 0:
+                    logger.info(f'Removed {cursor.rowcount} duplicate rows from "{table}"')
+
+        # Superseded by the unique dedup indexes
+        cursor.execute("DROP INDEX IF EXISTS idx_farmer_events_farmer_name_event_type_event_datetime")
+        cursor.execute("DROP INDEX IF EXISTS idx_node_events_node_name_event_type_event_datetime")
+
+    # Payload fields exposed as typed generated columns, payload key -> (column, type)
+    event_fields = {
+        'farmer_events': {
+            'Farm Index': ('farm_index', 'INTEGER'),
+            'Current Sector': ('current_sector', 'INTEGER'),
+            'Percentage Complete': ('percentage_complete', 'REAL'),
+            'Replot': ('replot', 'INTEGER')
+        },
+        'node_events': {
+            'Peers': ('peers', 'INTEGER')
+        }
+    }
+
+    def _payload_expression(self, field):
+        # Field names end up inside the SQL, only plain names are allowed
+        if not field.replace(' ', '').replace('_', '').isalnum():
+            raise ValueError(f"Invalid payload field: {field}")
+        # json_valid() keeps a single malformed payload from failing every query
+        return f"CASE WHEN json_valid(event_data) THEN json_extract(event_data, '$.\"{field}\"') END"
+
+    def _payload_conditions(self, table, payload):
+        # payload holds (field, value) pairs, fields with a generated column use it (and its indexes)
+        conditions = []
+        params = []
+        for field, value in payload or ():
+            if field in self.event_fields[table]:
+                conditions.append(f"{self.event_fields[table][field][0]} = ?")
+            else:
+                conditions.append(f"{self._payload_expression(field)} = ?")
+            params.append(value)
+        return conditions, params
+
+    # Uniqueness constraints the INSERT OR IGNORE statements rely on for dedup
+    unique_indexes = {
+        'farmers': [
+            ('farmer_name',)
+        ],
+        'nodes': [
+            ('node_name',)
+        ],
+        'farms': [
+            ('farmer_name', 'farm_index'),
+            ('farmer_name', 'farm_id')
+        ],
+        'farmer_events': [
+            ('farmer_name', 'event_type', 'event_datetime', 'event_hash')
+        ],
+        'node_events': [
+            ('node_name', 'event_type', 'event_datetime', 'event_hash')
+        ]
+    }
+
+    # Composite indexes matching the filters and ordering used by the get_* queries
+    indexes = {
+        'farmer_events': [
+            ('farmer_name', 'event_datetime'),
+            ('farmer_name', 'farm_index', 'event_datetime'),
+            ('event_type', 'event_datetime'),
+            ('event_datetime',)
+        ],
+        'node_events': [
+            ('node_name', 'event_datetime'),
+            ('event_type', 'event_datetime'),
+            ('event_datetime',)
+        ],
+        'plots': [
+            ('farmer_name', 'farm_index', 'plot_datetime'),
+            ('farmer_name', 'plot_datetime'),
+            ('plot_datetime',)
+        ],
+        'rewards': [
+            ('farmer_name', 'farm_index', 'reward_datetime'),
+            ('farmer_name', 'reward_datetime'),
+            ('reward_datetime',)
+        ],
+        'errors': [
+            ('farmer_name', 'error_datetime'),
+            ('error_datetime',)
+        ],
+        'claims': [
+            ('node_name', 'claim_datetime'),
+            ('claim_datetime',)
+        ],
+        'consensus': [
+            ('node_name', 'consensus_datetime'),
+            ('consensus_datetime',)
+        ]
+    }
+
+    def _unique_index_name(self, table, columns):
+        return f"uq_{table}_{'_'.join(columns)}"
+
+    def _create_indexes(self, cursor):
+        for table, table_indexes in self.unique_indexes.items():
+            for columns in table_indexes:
+                index_name = self._unique_index_name(table, columns)
+                logger.info(f'Initializing "{index_name}" Index')
+                cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {table} ({', '.join(columns)})")
+
+        for table, table_indexes in self.indexes.items():
+            for columns in table_indexes:
+                index_name = f"idx_{table}_{'_'.join(columns)}"
+                logger.info(f'Initializing "{index_name}" Index')
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({', '.join(columns)})")
+
+        self._analyze(cursor)
+
+    def _analyze(self, cursor):
+        # Refresh planner statistics so the new indexes are picked up, sampling keeps this fast on large tables
+        cursor.execute("PRAGMA analysis_limit = 1000")
+        cursor.execute("ANALYZE")
+
     # ===== INSERT
-    def insert_farmer(self, data):
+    # Entities, their tables and validation come from the registry in src/schema.py
+    insert_entities = tuple(schema.schemas)
+
+    # Table each entity is written to
+    insert_tables = {entity: entity_schema['table'] for entity, entity_schema in schema.schemas.items()}
+
+    # Statements use named parameters so the single and batch insert paths can share them.
+    # Duplicates are dropped by the unique indexes instead of a SELECT before every insert.
+    insert_statements = {entity: schema.insert_sql(entity) for entity in schema.schemas}
+
+    # A farm replaces any farm of the same farmer that shares its ID or index, unless it is a complete match
+    farm_statements = [
+        '''DELETE FROM farms
+           WHERE farmer_name = :farmer_name AND (farm_id = :farm_id OR farm_index = :farm_index)
+           AND NOT (farm_id = :farm_id AND farm_index = :farm_index)''',
+        insert_statements['farm']
+    ]
+
+    def prepare_insert(self, entity, data):
+        # Returns (row, None) or (None, error message)
+        return self.prepare_inserts(entity, [data])[0]
+
+    def prepare_inserts(self, entity, records):
+        if entity not in self.insert_entities:
+            return [(None, f"Unknown entity: {entity}")] * len(records)
+
+        return schema.prepare(entity, records)
+
+    def _write_rows(self, cursor, entity, rows):
+        # Returns the number of rows actually inserted
+        if entity == 'farm':
+            inserted = 0
+            for row in rows:
+                cursor.execute(self.farm_statements[0], row)
+                cursor.execute(self.farm_statements[1], row)
+                inserted += cursor.rowcount
+            return inserted
+
+        inserted = self._insert_rows(cursor, entity, rows)
+
+        if entity in rollups.rollups:
+            self._update_rollups(cursor, entity, rows)
+
+        if entity in state.states:
+            cursor.executemany(self.state_statements[entity], rows)
+
+        return inserted
+
+    def _insert_rows(self, cursor, entity, rows):
+        cursor.executemany(self.insert_statements[entity], rows)
+        return cursor.rowcount
+
+    # Latest-state upserts, see src/state.py
+    state_statements = {entity: state.upsert_sql(entity) for entity in state.states}
+
+    # Rollup upserts are built once, they only depend on the rollup definitions
+    rollup_statements = {
+        (entity, resolution): rollups.upsert_sql(entity, resolution)
+        for entity in rollups.rollups
+        for resolution in rollups.resolutions
+    }
+
+    def _update_rollups(self, cursor, entity, rows):
+        datetime_column = rollups.rollups[entity]['datetime']
+        for resolution in rollups.resolutions:
+            bucketed = [dict(row, bucket_datetime=rollups.bucket(row[datetime_column], resolution)) for row in rows]
+            cursor.executemany(self.rollup_statements[(entity, resolution)], bucketed)
+
+    def insert(self, entity, data):
+        # Single row inserts, the same path as a batch of one
+        entity_schema = schema.schemas.get(entity)
+        if entity_schema is None:
+            return {
+                "Success": False,
+                "Message": f"Unknown entity: {entity}"
+            }
+
+        inserted_message, exists_message = entity_schema['messages']
+        flag = entity_schema.get('inserted_flag')
+
         try:
-            self.connect()
-            cursor = self.conn.cursor()
-            logger.info(f"Data: {data}")
+            logger.debug('Data: %s', data)
 
-            farmer_name = data.get('Farmer Name')
+            row, message = self.prepare_insert(entity, data)
 
-            if not farmer_name:
-                logger.warn('No Farmer Name Provided')
+            if message:
+                logger.warn(message)
                 response = {
-                    'Success': False,
-                    'Message': 'No Farmer Name Provided'
+                    "Success": False,
+                    "Message": message
                 }
+                if flag:
+                    response[flag] = False
                 return response
 
-            self.conn.execute("BEGIN TRANSACTION")
+            logger.debug('Validation Passed')
 
-            # Check if a row with the given farmer_name already exists
-            cursor.execute("SELECT COUNT(*) FROM farmers WHERE farmer_name = ?", (farmer_name,))
-            row_count = cursor.fetchone()[0]
+            # Connect to DB
+            self.connect()
+            cursor = self.conn.cursor()
 
-            if row_count == 0:
-                # Add a new row with the farmer_name
-                current_datetime = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
-                cursor.execute("INSERT INTO farmers (farmer_name, creation_datetime) VALUES (?, ?)", (farmer_name, current_datetime))
-                logger.info(f"{farmer_name} added to database")
-                response = {
-                    'Success': True,
-                    'Message': f"{farmer_name} Added to Database"
-                }
-                self.conn.commit()
+            # Ignored by the unique index if the row already exists
+            inserted = self._write_rows(cursor, entity, [row])
+            self.conn.commit()
 
+            if inserted:
+                self._notify_write('insert', self.insert_tables[entity], [row])
+                message = inserted_message.format(**row)
             else:
-                logger.info(f'Farmer {farmer_name} exists, no changes needed')
-                response = {
-                    'Success': True,
-                    'Message': f"Farmer {farmer_name} exists, no changes needed"
-                }
+                message = exists_message.format(**row)
 
-            
+            logger.debug(message)
+            response = {
+                "Success": True,
+                "Message": message
+            }
+            if flag:
+                response[flag] = bool(inserted)
 
         except Exception as e:
             # Rollback the transaction if an error occurs
-            logger.error(f'Error inserting farmer: {e}')
-            self.conn.rollback()
+            logger.error(f'Error inserting {entity}: {e}')
+            if self.conn:
+                self.conn.rollback()
             response = {
                 "Success": False,
-                'Message': f'Error inserting farmer: {e}'
+                'Message': f'Error inserting {entity}: {e}'
             }
+            if flag:
+                response[flag] = False
 
         finally:
             self.disconnect()
 
         return response
 
-    def insert_node(self, data):
-        try:
-            self.connect()
-            cursor = self.conn.cursor()
-            logger.info(f"Data: {data}")
-
-            node_name = data.get('Node Name')
-            node_status = data.get('Node Status')
-
-            if not node_name:
-                logger.warn('No Node Name Provided')
-                response = {
-                    'Success': False,
-                    'Message': 'No Node Name Provided'
-                }
-                return response
-
-            self.conn.execute("BEGIN TRANSACTION")
+    def insert_batch(self, entity, records):
+        if not isinstance(records, list):
+            return {
+                "Success": False,
+                "Message": "Expected a JSON array of records"
+            }
 
-            # Check if a row with the given node_name already exists
-            cursor.execute("SELECT COUNT(*) FROM nodes WHERE node_name = ?", (node_name,))
-            row_count = cursor.fetchone()[0]
+        # Validate everything up front, only valid rows are written
+        results = []
+        rows = []
+        for index, (row, message) in enumerate(self.prepare_inserts(entity, records)):
+            if message:
+                results.append({
+                    "Index": index,
+                    "Success": False,
+                    "Message": message
+                })
+            else:
+                rows.append(row)
+                results.append({
+                    "Index": index,
+                    "Success": True
+                })
 
-            if row_count == 0:
-                # Add a new row with the node_name
-                current_datetime = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
-                cursor.execute("INSERT INTO nodes (node_name, node_status, creation_datetime) VALUES (?, ?, ?)", (node_name, node_status, current_datetime))
-                logger.info(f"{node_name} added to database")
-                response = {
-                    'Success': True,
-                    'Message': f"{node_name} Added to Database"
-                }
-                self.conn.commit()
+        failed = len(records) - len(rows)
+        logger.info(f'Batch of {len(records)} {entity} records, {failed} failed validation')
 
-            else:
-                logger.info(f'Node {node_name} exists, no changes needed')
-                response = {
-                    'Success': True,
-                    'Message': f"Node {node_name} exists, no changes needed"
+        if not rows:
+            return {
+                "Success": True,
+                "Data": {
+                    "Results": results,
+                    "Inserted Rows": 0,
+                    "Failed Items": failed
                 }
-
-        except Exception as e:
-            # Rollback the transaction if an error occurs
-            logger.error(f'Error inserting node: {e}')
-            self.conn.rollback()
-            response = {
-                "Success": False,
-                'Message': f'Error inserting node: {e}'
             }
 
-        finally:
-            self.disconnect()
+        response = self.write_rows({entity: rows})
+        if response["Success"]:
+            response["Data"]["Results"] = results
+            response["Data"]["Failed Items"] = failed
+
+        elif "Unwritten Rows" in response:
+            # The rows that failed on their own are marked, the others are committed
+            unwritten = set(map(id, response.pop("Unwritten Rows")[entity]))
+            valid_results = [result for result in results if result["Success"]]
+            for result, row in zip(valid_results, rows):
+                if id(row) in unwritten:
+                    result["Success"] = False
+                    result["Message"] = response["Message"]
+            response["Data"]["Results"] = results
+            response["Data"]["Failed Items"] = failed + len(unwritten)
 
         return response
 
-    def insert_farm(self, data):
-        try:
-            farm_id = data.get('Data', {}).get('Farm ID')
-            farm_index = data.get('Data', {}).get('Farm Index')
-            farm_status = data.get('Data', {}).get('Farm Status')
-            farmer_name = data.get('Farmer Name')
+    def _begin_write(self, cursor):
+        # Take the write lock once for the whole batch
+        cursor.execute("BEGIN IMMEDIATE")
 
-            if farm_id == None or farm_index == None or farmer_name == None:
-                message = "Farm ID, Farmer Name, and Farm Index is required"
-                logger.warn(message)
-                return {
-                    'Success': False,
-                    'Message': message
-                }
-            
+    def write_rows(self, rows_by_entity):
+        # Writes already prepared rows for any number of entities in a single transaction
+        try:
             self.connect()
             cursor = self.conn.cursor()
-            
-            cursor.execute("SELECT * FROM farms WHERE (farm_id = ? OR farm_index = ?) and farmer_name = ?", (farm_id, farm_index, farmer_name))
-            farms = cursor.fetchall()
-
-            insert = True
-            if len(farms) > 0:
-                zipped_farms = [dict(zip(keys['Farm'], row)) for row in farms]
-
-                for farm in zipped_farms:
-                    if farm['Farm ID'] == farm_id and farm['Farm Index'] == farm_index:
-                        insert = False
-                        message = 'Complete match exists, no need to insert'
-                        logger.info(message)
-                        response = {
-                            "Success": True,
-                            "Message": message
-                        }
-                    else:
-                        logger.info('Conflict found, removing conflict')
-                        cursor.execute("DELETE FROM farms WHERE farm_id = ? AND farm_index = ?", (farm['Farm ID'], farm['Farm Index']))
-
-            if insert:
-                current_datetime = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
-                cursor.execute("INSERT INTO farms (farm_id, farm_index, farmer_name, farm_status, creation_datetime) VALUES (?, ?, ?, ?, ?)", (farm_id, farm_index, farmer_name, farm_status, current_datetime))
+
+            try:
+                self._begin_write(cursor)
+                inserted = 0
+                written = {}
+                for entity, rows in rows_by_entity.items():
+                    count = self._write_rows(cursor, entity, rows)
+                    if count:
+                        written[entity] = rows
+                    inserted += count
                 self.conn.commit()
+                unwritten = {}
+
+            except Exception as e:
+                # One bad row fails the whole transaction, so the rows are written again one at a
+                # time and only the rows that fail on their own are left out
+                logger.warn(f'Error writing {", ".join(rows_by_entity)} rows, writing them one at a time: {e}')
+                self.conn.rollback()
+                inserted, written, unwritten, error = self._write_rows_one_by_one(cursor, rows_by_entity)
 
-                message = f"Inserted new farm with id of {farm_id}, farmer_name of {farmer_name}, farm_status of {farm_status} and index of {farm_index}"
-                logger.info(message)
+            for entity, rows in written.items():
+                self._notify_write('insert', self.insert_tables[entity], rows)
 
+            if unwritten:
+                failed = sum(len(rows) for rows in unwritten.values())
+                logger.error(f'Error writing {failed} {", ".join(unwritten)} rows: {error}')
+                response = {
+                    "Success": False,
+                    "Message": f'Error writing {failed} {", ".join(unwritten)} rows: {error}',
+                    "Data": {
+                        "Inserted Rows": inserted
+                    },
+                    "Unwritten Rows": unwritten
+                }
+            else:
                 response = {
                     "Success": True,
-                    "Message": message
+                    "Data": {
+                        "Inserted Rows": inserted
+                    }
                 }
-            
+
         except Exception as e:
-            # Rollback the transaction if an error occurs
-            logger.error(f'Error inserting farm: {e}')
-            self.conn.rollback()
+            # Rollback the whole batch if an error occurs
+            logger.error(f'Error writing {", ".join(rows_by_entity)} rows: {e}')
+            if self.conn:
+                self.conn.rollback()
             response = {
                 "Success": False,
-                'Message': f'Error inserting farm: {e}'
+                'Message': f'Error writing {", ".join(rows_by_entity)} rows: {e}'
             }
 
         finally:
@@ -310,233 +780,221 @@ class DatabaseAPI:
 
         return response
 
-    def insert_farmer_event(self, data):
+    def _write_rows_one_by_one(self, cursor, rows_by_entity):
+        # Still one transaction, each row is written under a savepoint that a failure rolls back to.
+        # Returns (inserted count, written rows, unwritten rows, last error) with rows per entity.
+        inserted = 0
+        written = {}
+        unwritten = {}
+        error = None
+
+        self._begin_write(cursor)
+        for entity, rows in rows_by_entity.items():
+            for row in rows:
+                cursor.execute("SAVEPOINT nexus_row")
+                try:
+                    count = self._write_rows(cursor, entity, [row])
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT nexus_row")
+                    unwritten.setdefault(entity, []).append(row)
+                    error = e
+                else:
+                    if count:
+                        written.setdefault(entity, []).append(row)
+                    inserted += count
+                cursor.execute("RELEASE SAVEPOINT nexus_row")
+        self.conn.commit()
+
+        return inserted, written, unwritten, error
+
+    # ===== GET
+    def _timestamp_param(self, data, data_key):
+        # API datetimes are strings, the columns hold microseconds
+        if data.get(data_key) is None:
+            return None
         try:
-            # Connect to DB
-            self.connect()
-            cursor = self.conn.cursor()
+            return timestamps.parse_bound(data[data_key])
+        except ValueError:
+            raise ValueError(f"{data_key} must be in the format YYYY-MM-DD[ HH:MM:SS[.ffffff]]")
+
+    def _datetimes_to_strings(self, description, rows, width=None):
+        # Converts every *_datetime column back to the API's string format
+        positions = [index for index, column in enumerate(description[:width]) if column[0].endswith('_datetime')]
+        if not positions or not rows:
+            return rows
+
+        to_string = timestamps.to_string
+        converted = []
+        for row in rows:
+            row = list(row)
+            for index in positions:
+                row[index] = to_string(row[index])
+            converted.append(row)
+        return converted
+
+    def _page_order(self, table, data):
+        order = data.get('Order') or ('desc' if table in self.newest_first else 'asc')
+        if order not in ('asc', 'desc'):
+            raise ValueError(f"Unknown order: {order}")
+        return order
+
+    def _page_queries(self, table, columns, datetime_column, conditions, params, data, time_range=True):
+        start_time = self._timestamp_param(data, 'Start Time')
+        end_time = self._timestamp_param(data, 'End Time')
+        count_start_time = start_time
+        count_end_time = end_time
+
+        order = self._page_order(table, data)
+        comparison = '<' if order == 'desc' else '>'
+
+        # Keyset pagination continues after the last (datetime, rowid) seen. The cursor datetime
+        # also becomes the near bound of the index range, so deep pages cost the same as the
+        # first. Plain page numbers still work through OFFSET.
+        row_id = self.row_ids.get(table, 'rowid')
+        keyset_conditions = []
+        keyset_params = []
+        if data.get('Cursor'):
+            last_datetime, last_id = Helpers.decode_cursor(data['Cursor'])
+            # Cursors issued before timestamps were stored as integers hold the string
+            if isinstance(last_datetime, str):
+                last_datetime = timestamps.parse(last_datetime)
+            keyset_conditions.append(f"({datetime_column}, {row_id}) {comparison} (?, ?)")
+            keyset_params.extend([last_datetime, last_id])
+            if time_range and order == 'desc' and end_time is not None:
+                end_time = min(end_time, last_datetime)
+            if time_range and order == 'asc' and start_time is not None:
+                start_time = max(start_time, last_datetime)
+            offset = 0
+        else:
+            offset = (data['Page'] - 1) * data['Limit']
 
-            # Get data from event
-            event_datetime = data.get("Datetime")
-            event_type = data.get("Event Type")
-            event_data = data.get("Data")
-            farmer_name = data.get('Farmer Name')
+        if time_range:
+            conditions = [f"{datetime_column} BETWEEN ? AND ?"] + conditions
+            count_params = [count_start_time, count_end_time] + params
+            params = [start_time, end_time] + params
+        else:
+            count_params = list(params)
 
-            missing = []
-            if farmer_name == None:
-                missing.append('Farmer Name')
-            if event_datetime == None:
-                missing.append('Event Datetime')
-            if event_type == None:
-                missing.append('Event Type')
-            if event_data == None:
-                missing.append('Event Data')
+        page_conditions = conditions + keyset_conditions
+        page_params = params + keyset_params
 
+        where = " WHERE " + " AND ".join(page_conditions) if page_conditions else ""
+        sql = f"SELECT {columns}, {datetime_column}, {row_id} FROM {table}{where} ORDER BY {datetime_column} {order.upper()}, {row_id} {order.upper()} LIMIT ? OFFSET ?"
+        page_params.extend([data['Limit'], offset])
 
-            if len(missing) > 0:
-                logger.warn('Missing Required Fields')
-                response = {
-                    "Success": False,
-                    "Message": f"Missing {' and '.join(missing)}"
-                }
-                return response
-            
-            # Validate that the datetime is in the correct format
-            if not Helpers.validate_date(event_datetime):
-                logger.warn('Invalid Datetime Received')
-                response = {
-                    "Success": False,
-                    "Message": "Invalid Datetime",
-                    "Inserted Event": False
-                }
-                return response
-            
+        count_where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        count_sql = f"SELECT COUNT(*) FROM {table}{count_where}"
 
-            logger.info('Validation Passed')
+        return sql, page_params, count_sql, count_params
 
-            # Check if the event already exists
-            cursor.execute('SELECT COUNT(*) FROM farmer_events WHERE event_datetime = ? AND event_type = ? AND event_data = ? AND farmer_name = ?',
-                        (event_datetime, event_type, json.dumps(event_data), farmer_name))
-            exists = cursor.fetchone()[0] > 0
+    def _get_page(self, key_name, result_name, table, columns, datetime_column, conditions, params, data, time_range=True):
+        cursor = self.conn.cursor()
 
-            if not exists:
-                # Insert the event into the database
-                cursor.execute('INSERT INTO farmer_events (event_datetime, event_type, event_data, farmer_name) VALUES (?, ?, ?, ?)',
-                            (event_datetime, event_type, json.dumps(event_data), farmer_name))
-                self.conn.commit()
-                response = {
-                    "Success": True,
-                    "Message": "Successfully inserted farmer event",
-                    "Inserted Event": True
-                }
+        if data.get('Explain'):
+            return self._explain(cursor, *self._page_queries(table, columns, datetime_column, conditions, params, data, time_range))
 
-            else:
-                response = {
-                    "Success": True,
-                    "Message": "Event already exists",
-                    "Inserted Event": False
-                }
+        self._response_format(data)
+        description, rows, total_items = self._fetch_page(cursor, table, columns, datetime_column, conditions, params, data, time_range)
 
-            return response
-                
-        except Exception as e:
-            # Rollback the transaction if an error occurs
-            logger.error(f'Error inserting farmer event: {e}')
-            self.conn.rollback()
-            response = {
-                "Success": False,
-                'Message': f'Error inserting farmer event: {e}',
-                "Inserted Event": False
-            }
+        next_cursor = None
+        if len(rows) == data['Limit']:
+            next_cursor = Helpers.encode_cursor(rows[-1][-2], rows[-1][-1])
 
-        finally:
-            self.disconnect()
+        return self._page_response(key_name, result_name, description, rows, total_items, next_cursor, data)
 
-    def insert_node_event(self, data):
-        try:
-            # Connect to DB
-            self.connect()
-            cursor = self.conn.cursor()
+    def _response_format(self, data):
+        response_format = data.get('Format') or 'objects'
+        if response_format not in ('objects', 'rows', 'columnar'):
+            raise ValueError(f"Unknown format: {response_format}")
+        return response_format
 
-            # Get data from event
-            event_datetime = data.get("Datetime")
-            event_type = data.get("Event Type")
-            event_data = data.get("Data")
-            node_name = data.get('Node Name')
+    def _fetch_page(self, cursor, table, columns, datetime_column, conditions, params, data, time_range=True):
+        # Returns (description, rows, total items), rows end with the raw datetime and rowid
+        sql, page_params, count_sql, count_params = self._page_queries(table, columns, datetime_column, conditions, params, data, time_range)
 
-            missing = []
-            if node_name == None:
-                missing.append('Node Name')
-            if event_datetime == None:
-                missing.append('Event Datetime')
-            if event_type == None:
-                missing.append('Event Type')
-            if event_data == None:
-                missing.append('Event Data')
+        logger.debug('Executing: %s %s', sql, page_params)
+        cursor.execute(sql, page_params)
+        rows = cursor.fetchall()
+        description = cursor.description
 
+        # The count doubles the cost of a request, clients can opt out with count=false
+        total_items = None
+        if data.get('Count', True):
+            logger.debug('Executing: %s %s', count_sql, count_params)
+            cursor.execute(count_sql, count_params)
+            total_items = cursor.fetchone()[0]
 
-            if len(missing) > 0:
-                logger.warn('Missing Required Fields')
-                response = {
-                    "Success": False,
-                    "Message": f"Missing {' and '.join(missing)}"
-                }
-                return response
-            
-            # Validate that the datetime is in the correct format
-            if not Helpers.validate_date(event_datetime):
-                logger.warn('Invalid Datetime Received')
-                response = {
-                    "Success": False,
-                    "Message": "Invalid Datetime",
-                    "Inserted Event": False
-                }
-                return response
-            
+        return description, rows, total_items
 
-            logger.info('Validation Passed')
+    def _page_response(self, key_name, result_name, description, rows, total_items, next_cursor, data):
+        response_format = self._response_format(data)
 
-            # Check if the event already exists
-            cursor.execute('SELECT COUNT(*) FROM node_events WHERE event_datetime = ? AND event_type = ? AND event_data = ? AND node_name = ?',
-                        (event_datetime, event_type, json.dumps(event_data), node_name))
-            exists = cursor.fetchone()[0] > 0
+        # The trailing datetime and rowid columns only feed the cursor and are dropped here
+        columns = keys[key_name]
+        rows = self._datetimes_to_strings(description, rows, len(columns))
+        results = self._format_rows(columns, rows, response_format)
 
-            if not exists:
-                # Insert the event into the database
-                cursor.execute('INSERT INTO node_events (event_datetime, event_type, event_data, node_name) VALUES (?, ?, ?, ?)',
-                            (event_datetime, event_type, json.dumps(event_data), node_name))
-                self.conn.commit()
-                response = {
-                    "Success": True,
-                    "Message": "Successfully inserted node event",
-                    "Inserted Event": True
-                }
+        response = {
+            "Success": True,
+            "Data": {
+                result_name: results,
+                "Total Items": total_items,
+                "Next Cursor": next_cursor
+            }
+        }
+        if response_format != 'objects':
+            response["Data"]["Columns"] = columns
+            response["Data"]["Format"] = response_format
+        return response
 
-            else:
-                response = {
-                    "Success": True,
-                    "Message": "Event already exists",
-                    "Inserted Event": False
-                }
+    def _format_rows(self, columns, rows, response_format):
+        if response_format == 'objects':
+            return [dict(zip(columns, row)) for row in rows]
+        if response_format == 'rows':
+            # Column names once, then one array per row
+            width = len(columns)
+            return [row[:width] for row in rows]
+        # Column names once, then one array per column
+        return self._columnar(columns, rows)["Values"]
+
+    def _columnar(self, columns, rows):
+        # Column names once plus one array per column instead of a dict per row, columns past
+        # the named ones (the keyset datetime and rowid) are dropped
+        return {
+            "Columns": columns,
+            "Values": [list(values) for values in itertools.islice(zip(*rows), len(columns))] if rows else [[] for _ in columns]
+        }
 
-            return response
-        
-        except Exception as e:
-            # Rollback the transaction if an error occurs
-            logger.error(f'Error inserting node event: {e}')
-            self.conn.rollback()
-            response = {
-                "Success": False,
-                'Message': f'Error inserting node event: {e}',
-                "Inserted Event": False
+    # Statement prefix returning a query plan, and the column of each plan row holding its text
+    explain = ("EXPLAIN QUERY PLAN ", 3)
+
+    def _explain(self, cursor, sql, params, count_sql, count_params):
+        # Returns the query plans instead of running the queries, used to verify index usage
+        plans = {}
+        prefix, detail = self.explain
+        for name, query, query_params in [('Query', sql, params), ('Count Query', count_sql, count_params)]:
+            cursor.execute(prefix + query, query_params)
+            plans[name] = {
+                'SQL': query,
+                'Plan': [row[detail] for row in cursor.fetchall()]
             }
 
-        finally:
-            self.disconnect()
+        response = {
+            "Success": True,
+            "Data": plans
+        }
+        return response
 
-    def insert_plot(self, data):
+    def get_farmers(self, data):
         try:
-            # Connect to DB
             self.connect()
-            cursor = self.conn.cursor()
-
-            # Get data from plot
-            farmer_name = data.get("Farmer Name")
-            farm_index = data.get("Data", {}).get("Farm Index")
-            plot_percentage = data.get("Data", {}).get("Plot Percentage")
-            plot_current_sector = data.get("Data", {}).get('Plot Current Sector')
-            plot_type = data.get("Data", {}).get('Plot Type')
-            plot_datetime = data.get('Datetime')
-
-            missing = []
-            if farmer_name == None:
-                missing.append('Farmer Name')
-            if farm_index == None:
-                missing.append('Farm Index')
-            if plot_percentage == None:
-                missing.append('Plot Percentage')
-            if plot_current_sector == None and plot_percentage != 100.0:
-                missing.append('Plot Current Sector')
-            if plot_type == None:
-                missing.append('Plot Type')
-            if plot_datetime == None:
-                missing.append('Datetime')
-
-            if len(missing) > 0:
-                logger.warn('Missing Required Fields')
-                response = {
-                    "Success": False,
-                    "Message": f"Missing {' and '.join(missing)}"
-                }
-                return response
-            
-            # Validate that the datetime is in the correct format
-            if not Helpers.validate_date(plot_datetime):
-                logger.warn('Invalid Datetime Received')
-                response = {
-                    "Success": False,
-                    "Message": "Invalid Datetime"
-                }
-                return response
-            
-            logger.info('Validation Passed')
-
-            # Insert the event into the database
-            cursor.execute('INSERT INTO plots (farmer_name, farm_index, plot_percentage, plot_current_sector, plot_type, plot_datetime) VALUES (?, ?, ?, ?, ?, ?)',
-                        (farmer_name, farm_index, plot_percentage, plot_current_sector, plot_type, plot_datetime))
-            self.conn.commit()
-            response = {
-                "Success": True,
-                "Message": "Successfully inserted plot"
-            }
+            response = self._get_page('Farmer', 'Farmers', 'farmers', '*', 'creation_datetime', [], [], data, time_range=False)
 
         except Exception as e:
-            # Rollback the transaction if an error occurs
-            logger.error(f'Error inserting event: {e}')
-            self.conn.rollback()
+            logger.error(f'Error getting farmers: {e}')
             response = {
                 "Success": False,
-                'Message': f'Error inserting event: {e}'
+                "Message": f"Error getting farmers: {e}"
             }
 
         finally:
@@ -544,68 +1002,16 @@ class DatabaseAPI:
 
         return response
 
-    def insert_reward(self, data):
+    def get_nodes(self, data):
         try:
-            # Connect to DB
             self.connect()
-            cursor = self.conn.cursor()
-
-            # Get data from reward
-            farmer_name = data.get("Farmer Name")
-            farm_index = data.get("Data", {}).get("Farm Index")
-            reward_hash = data.get("Data", {}).get("Reward Hash")
-            reward_type = data.get("Data", {}).get("Reward Type")
-            reward_datetime = data.get('Datetime')
-
-
-            missing = []
-            if farmer_name == None:
-                missing.append('Farmer Name')
-            if farm_index == None:
-                missing.append('Farm Index')
-            if reward_type == None:
-                missing.append('Reward Type')
-            if reward_hash == None and reward_type == 'Reward':
-                missing.append('Reward Hash')
-            if reward_datetime == None:
-                missing.append('Datetime')
-
-            if len(missing) > 0:
-                logger.warn('Missing Required Fields')
-                response = {
-                    "Success": False,
-                    "Message": f"Missing {' and '.join(missing)}"
-                }
-                return response
-            
-            # Validate that the datetime is in the correct format
-            if not Helpers.validate_date(reward_datetime):
-                logger.warn('Invalid Datetime Received')
-                response = {
-                    "Success": False,
-                    "Message": "Invalid Datetime"
-                }
-                return response
-            
-            logger.info('Validation Passed')
-
-            # Insert the event into the database
-            cursor.execute('INSERT INTO rewards (farmer_name, farm_index, reward_hash, reward_type, reward_datetime) VALUES (?, ?, ?, ?, ?)',
-                        (farmer_name, farm_index, reward_hash, reward_type, reward_datetime))
-            self.conn.commit()
-
-            response = {
-                "Success": True,
-                "Message": "Successfully inserted reward"
-            }
+            response = self._get_page('Node', 'Nodes', 'nodes', '*', 'creation_datetime', [], [], data, time_range=False)
 
         except Exception as e:
-            # Rollback the transaction if an error occurs
-            logger.error(f'Error inserting event: {e}')
-            self.conn.rollback()
+            logger.error(f'Error getting nodes: {e}')
             response = {
                 "Success": False,
-                'Message': f'Error inserting event: {e}'
+                "Message": f"Error getting nodes: {e}"
             }
 
         finally:
@@ -613,603 +1019,552 @@ class DatabaseAPI:
 
         return response
 
-    def insert_error(self, data):
+    def get_farms(self, data):
         try:
-            # Connect to DB
             self.connect()
-            cursor = self.conn.cursor()
-
-            # Get data from error
-            farmer_name = data.get("Farmer Name")
-            error = data.get("Data", {}).get("Error")
-            error_datetime = data.get('Datetime')
-
-            logger.info(data)
-
-            # Validate that all data points are there
-            if not all([farmer_name, error, error_datetime]):
-                logger.warn('Missing Required Fields')
-                response = {
-                    "Success": False,
-                    "Message": "Missing Required Fields"
-                }
-                return response
-            
-            # Validate that the datetime is in the correct format
-            if not Helpers.validate_date(error_datetime):
-                logger.warn('Invalid Datetime Received')
-                response = {
-                    "Success": False,
-                    "Message": "Invalid Datetime"
-                }
-                return response
-            
-            logger.info('Validation Passed')
-
-            # Insert the event into the database
-            cursor.execute('INSERT INTO errors (farmer_name, error, error_datetime) VALUES (?, ?, ?)',
-                        (farmer_name, error, error_datetime))
-            self.conn.commit()
-            response = {
-                "Success": True,
-                "Message": "Successfully inserted error"
-            }
+            response = self._get_page('Farm', 'Farms', 'farms', '*', 'creation_datetime', [], [], data, time_range=False)
 
         except Exception as e:
-            # Rollback the transaction if an error occurs
-            logger.error(f'Error inserting event: {e}')
-            self.conn.rollback()
+            logger.error(f'Error getting farms: {e}')
             response = {
                 "Success": False,
-                'Message': f'Error inserting event: {e}'
+                "Message": f"Error getting farms: {e}"
             }
 
         finally:
             self.disconnect()
 
         return response
-
-    def insert_claim(self, data):
+    
+    def get_farmer_events(self, data):
         try:
-            # Connect to DB
             self.connect()
-            cursor = self.conn.cursor()
 
-            # Get data from error
-            node_name = data.get("Node Name")
-            slot = data.get('Data').get('Slot')
-            claim_type = data.get('Data').get('Claim Type')
-            claim_datetime = data.get('Datetime')
-
-            missing = []
-            if node_name == None:
-                missing.append('Node Name')
-            if slot == None:
-                missing.append('Slot')
-            if claim_type == None:
-                missing.append('Claim Type')
-
-            if len(missing) > 0:
-                logger.warn('Missing Required Fields')
-                response = {
-                    "Success": False,
-                    "Message": f"Missing {' and '.join(missing)}"
-                }
-                return response
-            
-            # Validate that the datetime is in the correct format
-            if not Helpers.validate_date(claim_datetime):
-                logger.warn('Invalid Datetime Received')
-                response = {
-                    "Success": False,
-                    "Message": "Invalid Datetime"
-                }
-                return response
-            
-            logger.info('Validation Passed')
+            conditions = []
+            params = []
 
-            # Insert the claim into the database
-            cursor.execute('INSERT INTO claims (node_name, slot, claim_type, claim_datetime) VALUES (?, ?, ?, ?)',
-                        (node_name, slot, claim_type, claim_datetime))
-            self.conn.commit()
-            response = {
-                "Success": True,
-                "Message": "Successfully inserted claim"
-            }
+            # Add optional filters if provided
+            if data['Event Type']:
+                conditions.append("event_type = ?")
+                params.append(data['Event Type'])
+            if data['Farmer Name']:
+                conditions.append("farmer_name = ?")
+                params.append(data['Farmer Name'])
+            if data.get('Farm Index') is not None:
+                conditions.append("farm_index = ?")
+                params.append(data['Farm Index'])
+
+            payload_conditions, payload_params = self._payload_conditions('farmer_events', data.get('Payload'))
+            conditions += payload_conditions
+            params += payload_params
+
+            columns = "event_id, farmer_name, event_type, event_data"
+            response = self._get_page('Farm Event', 'Events', 'farmer_events', columns, 'event_datetime', conditions, params, data)
 
         except Exception as e:
-            # Rollback the transaction if an error occurs
-            logger.error(f'Error inserting claim: {e}')
-            self.conn.rollback()
+            logger.error(f'Error getting farmer events: {e}')
             response = {
                 "Success": False,
-                'Message': f'Error inserting claim: {e}'
+                "Message": f"Error getting farmer events: {e}"
             }
 
         finally:
             self.disconnect()
 
         return response
-
-    def insert_consensus(self, data):
+    
+    def get_node_events(self, data):
         try:
-            # Connect to DB
             self.connect()
-            cursor = self.conn.cursor()
-
-            # Get data from error
-            node_name = data.get("Node Name")
-            status = data.get('Data').get('Status')
-            peers = data.get('Data').get('Peers')
-            best = data.get('Data').get('Best')
-            target = data.get('Data').get('Target')
-            finalized = data.get('Data').get('Finalized')
-            bps = data.get('Data').get('BPS')
-            down_speed_kib = data.get('Data').get('Down Speed')
-            up_speed_kib = data.get('Data').get('Up Speed')
-            consensus_datetime = data.get('Datetime')
-
-            missing = []
-            if node_name == None:
-                missing.append('Node Name')
-            if status == None:
-                missing.append('Status')
-            if peers == None:
-                missing.append('Peers')
-            if consensus_datetime == None:
-                missing.append('Datetime')
-            if best == None:
-                missing.append('Best')
-            if finalized == None:
-                missing.append('Finalized')
-            if up_speed_kib == None:
-                missing.append('Up Speed')
-            if down_speed_kib == None:
-                missing.append('Down Speed')
-
-            if len(missing) > 0:
-                logger.warn('Missing Required Fields')
-                response = {
-                    "Success": False,
-                    "Message": f"Missing {' and '.join(missing)}"
-                }
-                return response
-            
-            # Validate that the datetime is in the correct format
-            if not Helpers.validate_date(consensus_datetime):
-                logger.warn('Invalid Datetime Received')
-                response = {
-                    "Success": False,
-                    "Message": "Invalid Datetime"
-                }
-                return response
-            
-            logger.info('Consensus Validation Passed')
-
-            # Build the SQL query string
-            sql_query = 'INSERT INTO consensus (node_name, status, peers, best, finalized, down_speed_kib, up_speed_kib, consensus_datetime'
-            sql_values = (node_name, status, peers, best, finalized, down_speed_kib, up_speed_kib, consensus_datetime)
 
-            if target is not None:
-                sql_query += ', target'
-                sql_values += (target,)
-            if bps is not None:
-                sql_query += ', bps'
-                sql_values += (bps,)
+            conditions = []
+            params = []
 
-            sql_query += ') VALUES (' + ','.join(['?'] * len(sql_values)) + ')'
+            # Add optional filters if provided
+            if data['Event Type']:
+                conditions.append("event_type = ?")
+                params.append(data['Event Type'])
+            if data['Node Name']:
+                conditions.append("node_name = ?")
+                params.append(data['Node Name'])
 
-            # Insert the data into the database
-            cursor.execute(sql_query, sql_values)
-            self.conn.commit()
-            response = {
-                "Success": True,
-                "Message": "Successfully inserted consensus"
-            }
+            payload_conditions, payload_params = self._payload_conditions('node_events', data.get('Payload'))
+            conditions += payload_conditions
+            params += payload_params
+
+            columns = "event_id, node_name, event_type, event_data"
+            response = self._get_page('Node Event', 'Events', 'node_events', columns, 'event_datetime', conditions, params, data)
 
         except Exception as e:
-            # Rollback the transaction if an error occurs
-            logger.error(f'Error inserting claim: {e}')
-            self.conn.rollback()
+            logger.error(f'Error getting node events: {e}')
             response = {
                 "Success": False,
-                'Message': f'Error inserting claim: {e}'
+                "Message": f"Error getting node events: {e}"
             }
 
         finally:
             self.disconnect()
 
         return response
-    
-    # ===== GET
-    def get_farmers(self, data):
+
+    def get_plots(self, data):
         try:
             self.connect()
-            cursor = self.conn.cursor()
-            page = data['Page']
-            limit = data['Limit']
+            logger.debug('Data: %s', data)
 
-            offset = (page - 1) * limit
-            cursor.execute("SELECT COUNT(*) FROM farmers")
-            total_items = cursor.fetchone()[0]
+            conditions = []
+            params = []
 
-            cursor.execute("SELECT * FROM farmers ORDER BY creation_datetime DESC LIMIT ? OFFSET ?", (limit, offset))            
-            farmers = cursor.fetchall()
+            # Add optional filters if provided
+            if data.get('Farm Index') is not None:
+                conditions.append("farm_index = ?")
+                params.append(data['Farm Index'])
+            if data['Farmer Name']:
+                conditions.append("farmer_name = ?")
+                params.append(data['Farmer Name'])
+            if data.get('Plot Type') is not None:
+                conditions.append("plot_type = ?")
+                params.append(data['Plot Type'])
 
-            zipped_farmers = [dict(zip(keys['Farmer'], row)) for row in farmers]
+            resolution = rollups.pick_resolution(data.get('Resolution') or 'raw', data['Start Time'], data['End Time'])
+            if resolution == 'raw':
+                response = self._get_page('Plot', 'Plots', 'plots', '*', 'plot_datetime', conditions, params, data)
+            else:
+                response = self._get_rollup_page('plot', 'Plot Rollup', 'Plots', resolution, conditions, params, data)
 
         except Exception as e:
-            logger.error(f'Error getting farmers: {e}')
+            logger.error(f'Error getting plots: {e}')
             response = {
                 "Success": False,
-                "Message": f"Error getting farmers: {e}"
+                "Message": f"Error getting plots: {e}"
             }
 
         finally:
             self.disconnect()
 
-        response = {
-            "Success": True,
-            "Data": {
-                "Farmers": zipped_farmers,
-                "Total Items": total_items
-            }
-        }
         return response
-    
-    #TODO: Get Nodes
 
-    def get_farms(self, data):
+    def get_rewards(self, data):
         try:
             self.connect()
-            cursor = self.conn.cursor()
-            page = data['Page']
-            limit = data['Limit']
+            logger.debug('Data: %s', data)
 
-            offset = (page - 1) * limit
-            cursor.execute("SELECT COUNT(*) FROM farms")
-            total_items = cursor.fetchone()[0]
+            conditions = []
+            params = []
 
-            cursor.execute("SELECT * FROM farms ORDER BY creation_datetime DESC LIMIT ? OFFSET ?", (limit, offset))            
-            farms = cursor.fetchall()
+            # Add optional filters if provided
+            if data.get('Farm Index') is not None:
+                conditions.append("farm_index = ?")
+                params.append(data['Farm Index'])
+            if data['Farmer Name']:
+                conditions.append("farmer_name = ?")
+                params.append(data['Farmer Name'])
 
-            zipped_farms = [dict(zip(keys['Farm'], row)) for row in farms]
+            response = self._get_page('Reward', 'Rewards', 'rewards', '*', 'reward_datetime', conditions, params, data)
 
         except Exception as e:
-            logger.error(f'Error getting farmers: {e}')
+            logger.error(f'Error getting rewards: {e}')
             response = {
                 "Success": False,
-                "Message": f"Error getting farmers: {e}"
+                "Message": f"Error getting rewards: {e}"
             }
 
         finally:
             self.disconnect()
 
-        response = {
-            "Success": True,
-            "Data": {
-                "Farms": zipped_farms,
-                "Total Items": total_items
-            }
-        }
         return response
-    
-    def get_farmer_events(self, data):
+
+    def get_errors(self, data):
         try:
             self.connect()
-            cursor = self.conn.cursor()
-
-            # Construct the SQL query
-            sql = "SELECT * FROM farmer_events WHERE"
+            logger.debug('Data: %s', data)
 
-            conditions = " event_datetime BETWEEN ? AND ?"
-            params = [data['Start Time'], data['End Time']]
+            conditions = []
+            params = []
 
             # Add optional filters if provided
-            if data['Event Type']:
-                conditions += " AND event_type = ?"
-                params.append(data['Event Type'])
             if data['Farmer Name']:
-                conditions += " AND farmer_name = ?"
+                conditions.append("farmer_name = ?")
                 params.append(data['Farmer Name'])
 
-            sql += conditions
-
-            # Add pagination
-            offset = (data['Page'] - 1) * data['Limit']
-            sql += " ORDER BY event_datetime DESC LIMIT ? OFFSET ?"
-            params.extend([data['Limit'], offset])
-
-            logger.info(f"Executing: {sql}")
-            logger.info(params)
-
-            cursor.execute(sql, params)
-            events = cursor.fetchall()
-
-            zipped_events = [dict(zip(keys['Farm Event'], row)) for row in events]
-
-            # Execute the count query
-            count_sql = "SELECT COUNT(*) FROM farmer_events WHERE" + conditions
-            logger.info(f"Executing: {count_sql}")
-            cursor.execute(count_sql, params[:-2])  # Exclude LIMIT and OFFSET
-            total_items = cursor.fetchone()[0]
+            response = self._get_page('Error', 'Errors', 'errors', '*', 'error_datetime', conditions, params, data)
 
         except Exception as e:
-            logger.error(f'Error getting farmer events: {e}')
+            logger.error(f'Error getting errors: {e}')
             response = {
                 "Success": False,
-                "Message": f"Error getting farmer events: {e}"
+                "Message": f"Error getting errors: {e}"
             }
-            return response
 
         finally:
             self.disconnect()
 
-        response = {
-            "Success": True,
-            "Data": {
-                "Events": zipped_events,
-                "Total Items": total_items
-            }
-        }
-
         return response
     
-    def get_node_events(self, data):
+    def _get_rollup_page(self, entity, key_name, result_name, resolution, conditions, params, data):
+        if resolution not in rollups.resolutions:
+            raise ValueError(f"Unknown resolution: {resolution}")
+
+        table = rollups.rollup_table(entity, resolution)
+        response = self._get_page(key_name, result_name, table, rollups.select_columns(entity), 'bucket_datetime', conditions, params, data)
+
+        if response["Success"] and "Data" in response:
+            response["Data"]["Resolution"] = resolution
+        return response
+
+    def get_plot_state(self, data):
         try:
             self.connect()
             cursor = self.conn.cursor()
 
-            # Construct the SQL query
-            sql = "SELECT * FROM node_events WHERE"
+            response_format = self._response_format(data)
 
-            conditions = " event_datetime BETWEEN ? AND ?"
-            params = [data['Start Time'], data['End Time']]
+            conditions = []
+            params = []
 
             # Add optional filters if provided
-            if data['Event Type']:
-                conditions += " AND event_type = ?"
-                params.append(data['Event Type'])
-            if data['Node Name']:
-                conditions += " AND node_name = ?"
-                params.append(data['Node Name'])
-
-            sql += conditions
-
-            # Add pagination
-            offset = (data['Page'] - 1) * data['Limit']
-            sql += " ORDER BY event_datetime DESC LIMIT ? OFFSET ?"
-            params.extend([data['Limit'], offset])
-
-            logger.info(f"Executing: {sql}")
-            logger.info(params)
-
-            cursor.execute(sql, params)
-            events = cursor.fetchall()
+            if data.get('Farmer Name'):
+                conditions.append("farmer_name = ?")
+                params.append(data['Farmer Name'])
+            if data.get('Farm Index') is not None:
+                conditions.append("farm_index = ?")
+                params.append(data['Farm Index'])
 
-            zipped_events = [dict(zip(keys['Node Event'], row)) for row in events]
+            # One row per farm, so the whole table is returned without paging
+            where = " WHERE " + " AND ".join(conditions) if conditions else ""
+            cursor.execute(f"SELECT {state.select_columns('plot')} FROM plot_state{where} ORDER BY farmer_name, CAST(farm_index AS INTEGER)", params)
+            rows = self._datetimes_to_strings(cursor.description, cursor.fetchall())
 
-            # Execute the count query
-            count_sql = "SELECT COUNT(*) FROM node_events WHERE" + conditions
-            logger.info(f"Executing: {count_sql}")
-            cursor.execute(count_sql, params[:-2])  # Exclude LIMIT and OFFSET
-            total_items = cursor.fetchone()[0]
+            columns = keys['Plot State']
+            response = {
+                "Success": True,
+                "Data": {
+                    "Plot State": self._format_rows(columns, rows, response_format),
+                    "Total Items": len(rows)
+                }
+            }
+            if response_format != 'objects':
+                response["Data"]["Columns"] = columns
+                response["Data"]["Format"] = response_format
 
         except Exception as e:
-            logger.error(f'Error getting node events: {e}')
+            logger.error(f'Error getting plot state: {e}')
             response = {
                 "Success": False,
-                "Message": f"Error getting node events: {e}"
+                "Message": f"Error getting plot state: {e}"
             }
-            return response
 
         finally:
             self.disconnect()
 
-        response = {
-            "Success": True,
-            "Data": {
-                "Events": zipped_events,
-                "Total Items": total_items
-            }
-        }
-
         return response
 
-    def get_plots(self, data):
+    def get_consensus_state(self, data):
         try:
             self.connect()
             cursor = self.conn.cursor()
 
-            logger.info(data)
+            response_format = self._response_format(data)
 
-            # Construct the SQL query
-            sql = "SELECT * FROM plots WHERE"
+            stale_minutes = data.get('Stale Minutes', 5)
 
-            conditions = " plot_datetime BETWEEN ? AND ?"
-            params = [data['Start Time'], data['End Time']]
+            conditions = []
+            params = []
 
             # Add optional filters if provided
-            if data.get('Farm Index'):
-                conditions += " AND farm_index = ?"
-                params.append(data['Farm Index'])
-
-            if data['Farmer Name']:
-                conditions += " AND farmer_name = ?"
-                params.append(data['Farmer Name'])
-
-            sql += conditions
+            if data.get('Node Name'):
+                conditions.append("node_name = ?")
+                params.append(data['Node Name'])
 
-            # Add pagination
-            offset = (data['Page'] - 1) * data['Limit']
-            sql += " LIMIT ? OFFSET ?"
-            params.extend([data['Limit'], offset])
+            # One row per node, so the whole table is returned without paging
+            where = " WHERE " + " AND ".join(conditions) if conditions else ""
+            cursor.execute(f"SELECT {state.select_columns('consensus')} FROM consensus_state{where} ORDER BY node_name", params)
 
-            logger.info(f"Executing: {sql}")
-            logger.info(params)
+            rows = []
+            for row in cursor.fetchall():
+                best, target, bps, consensus_datetime = row[3], row[4], row[6], row[9]
 
-            cursor.execute(sql, params)
-            plots = cursor.fetchall()
+                # Target is only reported while syncing
+                blocks_behind = max(target - best, 0) if target is not None else 0
+                synced = blocks_behind == 0
+                eta_seconds = round(blocks_behind / bps) if not synced and bps else None
+                age_minutes = Helpers.check_age_of_timestamp(consensus_datetime)
 
-            zippled_plots = [dict(zip(keys['Plot'], row)) for row in plots]
+                rows.append(row[:9] + (timestamps.to_string(consensus_datetime), synced, blocks_behind, eta_seconds, age_minutes, age_minutes > stale_minutes))
 
-            # Execute the count query
-            count_sql = "SELECT COUNT(*) FROM plots WHERE" + conditions
-            logger.info(f"Executing: {count_sql}")
-            cursor.execute(count_sql, params[:-2])  # Exclude LIMIT and OFFSET
-            total_items = cursor.fetchone()[0]
+            columns = keys['Consensus State']
+            response = {
+                "Success": True,
+                "Data": {
+                    "Consensus State": self._format_rows(columns, rows, response_format),
+                    "Total Items": len(rows),
+                    "Synced Nodes": sum(1 for row in rows if row[10]),
+                    "Stale Nodes": sum(1 for row in rows if row[14])
+                }
+            }
+            if response_format != 'objects':
+                response["Data"]["Columns"] = columns
+                response["Data"]["Format"] = response_format
 
         except Exception as e:
-            logger.error(f'Error getting farmers: {e}')
+            logger.error(f'Error getting consensus state: {e}')
             response = {
                 "Success": False,
-                "Message": f"Error getting farmers: {e}"
+                "Message": f"Error getting consensus state: {e}"
             }
-            return response
 
         finally:
             self.disconnect()
 
-        response = {
-            "Success": True,
-            "Data": {
-                "Plots": zippled_plots,
-                "Total Items": total_items
-            }
-        }
-        
         return response
 
-    def get_rewards(self, data):
+    #TODO: Get Claims
+
+    def get_consensus(self, data):
         try:
             self.connect()
-            cursor = self.conn.cursor()
-
-            logger.info(data)
 
-            # Construct the SQL query
-            sql = "SELECT * FROM rewards WHERE"
-
-            conditions = " reward_datetime BETWEEN ? AND ?"
-            params = [data['Start Time'], data['End Time']]
+            conditions = []
+            params = []
 
             # Add optional filters if provided
-            if data.get('Farm Index'):
-                conditions += " AND farm_index = ?"
-                params.append(data['Farm Index'])
+            if data['Node Name']:
+                conditions.append("node_name = ?")
+                params.append(data['Node Name'])
 
-            if data['Farmer Name']:
-                conditions += " AND farmer_name = ?"
-                params.append(data['Farmer Name'])
+            resolution = rollups.pick_resolution(data.get('Resolution') or 'raw', data['Start Time'], data['End Time'])
+            if resolution == 'raw':
+                response = self._get_page('Consensus', 'Consensus', 'consensus', '*', 'consensus_datetime', conditions, params, data)
+            else:
+                response = self._get_rollup_page('consensus', 'Consensus Rollup', 'Consensus', resolution, conditions, params, data)
 
-            sql += conditions
+        except Exception as e:
+            logger.error(f'Error getting consensus: {e}')
+            response = {
+                "Success": False,
+                "Message": f"Error getting consensus: {e}"
+            }
 
-            # Add pagination
-            offset = (data['Page'] - 1) * data['Limit']
-            sql += " LIMIT ? OFFSET ?"
-            params.extend([data['Limit'], offset])
+        finally:
+            self.disconnect()
 
-            logger.info(f"Executing: {sql}")
-            logger.info(params)
+        return response
+    
+    # ===== AGGREGATE
+    # group_by -> grouping columns, plots are always split by plot_type as well
+    aggregate_groups = {
+        'farm': ['farmer_name', 'farm_index'],
+        'farmer': ['farmer_name'],
+        'none': []
+    }
+
+    group_keys = {
+        'farmer_name': 'Farmer Name',
+        'farm_index': 'Farm Index',
+        'plot_type': 'Plot Type'
+    }
+
+    def _aggregate_filters(self, data, datetime_column, filters):
+        resolution = data.get('Resolution') or '1h'
+        if resolution not in rollups.resolutions:
+            raise ValueError(f"Unknown resolution: {resolution}")
+
+        group_by = data.get('Group By') or 'farm'
+        if group_by not in self.aggregate_groups:
+            raise ValueError(f"Unknown group_by: {group_by}")
+
+        conditions = []
+        params = []
+        for data_key, column in filters.items():
+            if data.get(data_key) is not None:
+                conditions.append(f"{column} = ?")
+                params.append(data[data_key])
+
+        for data_key, operator in [('Start Time', '>='), ('End Time', '<=')]:
+            if data.get(data_key) is not None:
+                conditions.append(f"{datetime_column} {operator} ?")
+                params.append(self._timestamp_param(data, data_key))
+
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return resolution, list(self.aggregate_groups[group_by]), where, params
+
+    def aggregate_rewards(self, data):
+        try:
+            self.connect()
+            cursor = self.conn.cursor()
 
-            cursor.execute(sql, params)
-            rewards = cursor.fetchall()
+            resolution, group, where, params = self._aggregate_filters(
+                data, 'reward_datetime', {'Farmer Name': 'farmer_name', 'Farm Index': 'farm_index', 'Reward Type': 'reward_type'})
 
+            bucket = rollups.bucket_sql('reward_datetime', resolution)
+            group_sql = ''.join(f"{column}, " for column in group)
+            sql = f"""SELECT {group_sql}{bucket} AS bucket_datetime, COUNT(*), COUNT(*) * 3600.0 / {rollups.resolution_seconds[resolution]}
+                      FROM rewards{where}
+                      GROUP BY {group_sql}bucket_datetime
+                      ORDER BY {', '.join(['bucket_datetime'] + group)}"""
 
-            zipped_rewards = [dict(zip(keys['Reward'], row)) for row in rewards]
+            logger.debug('Executing: %s %s', sql, params)
+            cursor.execute(sql, params)
 
-            # Execute the count query
-            count_sql = "SELECT COUNT(*) FROM rewards WHERE" + conditions
-            logger.info(f"Executing: {count_sql}")
-            cursor.execute(count_sql, params[:-2])  # Exclude LIMIT and OFFSET
-            total_items = cursor.fetchone()[0]
+            columns = [self.group_keys[column] for column in group] + keys['Reward Aggregate']
+            rows = self._datetimes_to_strings(cursor.description, cursor.fetchall())
+            response = {
+                "Success": True,
+                "Data": dict(self._columnar(columns, rows), Resolution=resolution)
+            }
 
         except Exception as e:
-            logger.error(f'Error getting rewards: {e}')
+            logger.error(f'Error aggregating rewards: {e}')
             response = {
                 "Success": False,
-                "Message": f"Error getting rewards: {e}"
+                "Message": f"Error aggregating rewards: {e}"
             }
-            return response
 
         finally:
             self.disconnect()
 
-        response = {
-            "Success": True,
-            "Data": {
-                "Rewards": zipped_rewards,
-                "Total Items": total_items
-            }
-        }
-        
         return response
 
-    def get_errors(self, data):
+    def aggregate_plots(self, data):
         try:
             self.connect()
             cursor = self.conn.cursor()
 
-            logger.info(data)
-
-            # Construct the SQL query
-            sql = "SELECT * FROM errors WHERE"
-
-            conditions = " error_datetime BETWEEN ? AND ?"
-            params = [data['Start Time'], data['End Time']]
-
-            # Add optional filters if provided
-            if data['Farmer Name']:
-                conditions += " AND farmer_name = ?"
-                params.append(data['Farmer Name'])
-
-            sql += conditions
-
-            # Add pagination
-            offset = (data['Page'] - 1) * data['Limit']
-            sql += " LIMIT ? OFFSET ?"
-            params.extend([data['Limit'], offset])
-
-            logger.info(f"Executing: {sql}")
-            logger.info(params)
-
+            resolution, group, where, params = self._aggregate_filters(
+                data, 'plot_datetime', {'Farmer Name': 'farmer_name', 'Farm Index': 'farm_index', 'Plot Type': 'plot_type'})
+            group.append('plot_type')
+
+            group_sql = ''.join(f"{column}, " for column in group)
+            partition = ', '.join(group)
+
+            # A sector starts at the first row reporting a new plot_current_sector, its time is the
+            # gap to the next start on the same farm. Percentiles use the nearest rank, ceil(n * p).
+            sql = f"""WITH samples AS (
+                          SELECT farmer_name, farm_index, plot_type, plot_datetime,
+                                 plot_current_sector AS sector,
+                                 LAG(plot_current_sector) OVER (PARTITION BY farmer_name, farm_index, plot_type ORDER BY plot_datetime) AS previous_sector
+                          FROM plots{where}
+                      ), starts AS (
+                          SELECT farmer_name, farm_index, plot_type, plot_datetime,
+                                 LAG(plot_datetime) OVER (PARTITION BY farmer_name, farm_index, plot_type ORDER BY plot_datetime) AS previous_start
+                          FROM samples
+                          WHERE previous_sector IS NULL OR sector != previous_sector
+                      ), sectors AS (
+                          SELECT {group_sql}{rollups.bucket_sql('plot_datetime', resolution)} AS bucket_datetime,
+                                 round((plot_datetime - previous_start) / {float(timestamps.MICROS_PER_SECOND)}, 3) AS seconds
+                          FROM starts
+                          WHERE previous_start IS NOT NULL
+                      ), ranked AS (
+                          SELECT *,
+                                 ROW_NUMBER() OVER (PARTITION BY {partition}, bucket_datetime ORDER BY seconds) AS position,
+                                 COUNT(*) OVER (PARTITION BY {partition}, bucket_datetime) AS total
+                          FROM sectors
+                      )
+                      SELECT {group_sql}bucket_datetime, COUNT(*), COUNT(*) * 3600.0 / {rollups.resolution_seconds[resolution]},
+                             round(AVG(seconds), 3), MIN(seconds),
+                             MAX(CASE WHEN position = (total * 50 + 99) / 100 THEN seconds END),
+                             MAX(CASE WHEN position = (total * 95 + 99) / 100 THEN seconds END),
+                             MAX(seconds)
+                      FROM ranked
+                      GROUP BY {group_sql}bucket_datetime
+                      ORDER BY {', '.join(['bucket_datetime'] + group)}"""
+
+            logger.debug('Executing: %s %s', sql, params)
             cursor.execute(sql, params)
-            errors = cursor.fetchall()
 
-
-            zipped_errors = [dict(zip(keys['Error'], row)) for row in errors]
-
-            # Execute the count query
-            count_sql = "SELECT COUNT(*) FROM errors WHERE" + conditions
-            logger.info(f"Executing: {count_sql}")
-            cursor.execute(count_sql, params[:-2])  # Exclude LIMIT and OFFSET
-            total_items = cursor.fetchone()[0]
+            columns = [self.group_keys[column] for column in group] + keys['Plot Aggregate']
+            rows = self._datetimes_to_strings(cursor.description, cursor.fetchall())
+            response = {
+                "Success": True,
+                "Data": dict(self._columnar(columns, rows), Resolution=resolution)
+            }
 
         except Exception as e:
-            logger.error(f'Error getting errors: {e}')
+            logger.error(f'Error aggregating plots: {e}')
             response = {
                 "Success": False,
-                "Message": f"Error getting errors: {e}"
+                "Message": f"Error aggregating plots: {e}"
             }
-            return response
 
         finally:
             self.disconnect()
 
-        response = {
-            "Success": True,
-            "Data": {
-                "Errors": zipped_errors,
-                "Total Items": total_items
-            }
-        }
-        
         return response
-    
-    #TODO: Get Claims
 
-    #TODO: Get Consensus
-    
+    # ===== EXPORT
+    # Entity -> keys name, table, columns (in the order of keys[...]), datetime column and
+    # the filters it accepts as data key -> column
+    export_entities = {
+        'farmer_events': ('Farm Event', 'farmer_events', 'event_id, farmer_name, event_type, event_data, event_datetime', 'event_datetime',
+                          {'Farmer Name': 'farmer_name', 'Event Type': 'event_type', 'Farm Index': 'farm_index'}),
+        'node_events': ('Node Event', 'node_events', 'event_id, node_name, event_type, event_data, event_datetime', 'event_datetime',
+                        {'Node Name': 'node_name', 'Event Type': 'event_type'}),
+        'plots': ('Plot', 'plots', 'plot_id, farmer_name, farm_index, plot_percentage, plot_current_sector, plot_type, plot_datetime', 'plot_datetime',
+                  {'Farmer Name': 'farmer_name', 'Farm Index': 'farm_index', 'Plot Type': 'plot_type'}),
+        'rewards': ('Reward', 'rewards', 'reward_id, farmer_name, farm_index, reward_hash, reward_type, reward_datetime', 'reward_datetime',
+                    {'Farmer Name': 'farmer_name', 'Farm Index': 'farm_index'}),
+        'errors': ('Error', 'errors', 'error_id, farmer_name, error, error_datetime', 'error_datetime',
+                   {'Farmer Name': 'farmer_name'}),
+        'claims': ('Claim', 'claims', 'claim_id, node_name, slot, claim_type, claim_datetime', 'claim_datetime',
+                   {'Node Name': 'node_name'}),
+        'consensus': ('Consensus', 'consensus', 'consensus_id, node_name, status, peers, best, target, finalized, bps, down_speed_kib, up_speed_kib, consensus_datetime', 'consensus_datetime',
+                      {'Node Name': 'node_name'})
+    }
+
+    def export_query(self, entity, data):
+        # Returns (sql, params, keys) for export_rows(), raises ValueError for bad arguments
+        if entity not in self.export_entities:
+            raise ValueError(f"Unknown entity: {entity}")
+
+        key_name, table, columns, datetime_column, filters = self.export_entities[entity]
+
+        conditions = []
+        params = []
+        for data_key, column in filters.items():
+            if data.get(data_key) is not None:
+                conditions.append(f"{column} = ?")
+                params.append(data[data_key])
+
+        if data.get('Payload'):
+            if table not in self.event_fields:
+                raise ValueError("Payload filters only apply to events")
+            payload_conditions, payload_params = self._payload_conditions(table, data['Payload'])
+            conditions += payload_conditions
+            params += payload_params
+
+        for data_key, operator in [('Start Time', '>='), ('End Time', '<=')]:
+            if data.get(data_key) is not None:
+                conditions.append(f"{datetime_column} {operator} ?")
+                params.append(self._timestamp_param(data, data_key))
+
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        # Oldest first, the same (filter, datetime) indexes used by the getters serve the order
+        sql = f"SELECT {columns} FROM {table}{where} ORDER BY {datetime_column}, {self.row_ids.get(table, 'rowid')}"
+
+        return sql, params, keys[key_name]
+
+    def export_rows(self, sql, params, batch_size=1000):
+        # Generator yielding lists of up to batch_size rows straight from the SQLite cursor, so memory
+        # stays flat however large the export is. The pooled connection (and its WAL read snapshot)
+        # is held until the generator is exhausted or closed.
+        try:
+            self.connect()
+            cursor = self._export_cursor()
+
+            logger.debug('Exporting: %s %s', sql, params)
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield self._datetimes_to_strings(cursor.description, rows)
+
+        finally:
+            self.disconnect()
+
+    def _export_cursor(self):
+        return self.conn.cursor()
+
     # ===== UPDATE
     def update_farmer(self, data):
         try:
@@ -1266,6 +1621,7 @@ class DatabaseAPI:
 
             if rowcount > 0:
                 self.conn.commit()
+                self._notify_write('update', 'farmers', [{'farmer_name': farmer_name}])
                 logger.info(f"Farmer {farmer_name} updated")
                 response = {
                     'Success': True,
@@ -1318,7 +1674,7 @@ class DatabaseAPI:
                 return response
             
             # Construct the SQL update query
-            sql = "UPDATE farmers SET "
+            sql = "UPDATE nodes SET "
             params = []
 
             if node_status is not None:
@@ -1338,6 +1694,7 @@ class DatabaseAPI:
 
             if rowcount > 0:
                 self.conn.commit()
+                self._notify_write('update', 'nodes', [{'node_name': node_name}])
                 logger.info(f"Node {node_name} updated")
                 response = {
                     'Success': True,
@@ -1409,7 +1766,6 @@ class DatabaseAPI:
             if farm_status is not None:
                 sql += "farm_status = ?, "
                 params.append(farm_status)
-            logger.info(sql)
 
             # Remove the trailing comma and space
             sql = sql.rstrip(', ')
@@ -1419,12 +1775,13 @@ class DatabaseAPI:
             params.extend([farmer_name, farm_index])
 
             # Execute the SQL query
-            logger.info(sql)
+            logger.debug('Executing: %s %s', sql, params)
             cursor.execute(sql, params)
             rowcount = cursor.rowcount
 
             if rowcount > 0:
                 self.conn.commit()
+                self._notify_write('update', 'farms', [{'farmer_name': farmer_name}])
                 logger.info(f"Farm updated")
                 response = {
                     'Success': True,
@@ -1480,6 +1837,7 @@ class DatabaseAPI:
 
             else:
                 self.conn.commit()
+                self._notify_write('delete', 'farmers', [{'farmer_name': farmer_name}])
                 logger.info(f"{farmer_name} Deleted")
                 response = {
                     'Success': True,
@@ -1528,6 +1886,7 @@ class DatabaseAPI:
 
             else:
                 self.conn.commit()
+                self._notify_write('delete', 'nodes', [{'node_name': node_name}])
                 logger.info(f"{node_name} Deleted")
                 response = {
                     'Success': True,
@@ -1552,7 +1911,7 @@ class DatabaseAPI:
         try:
             self.connect()
             cursor = self.conn.cursor()
-            logger.info(data)
+            logger.debug('Data: %s', data)
 
             farm_id = data.get('Farm ID')
             farmer_name = data.get('Farmer Name')
@@ -1567,7 +1926,7 @@ class DatabaseAPI:
                 }
                 return response
             
-            logger.info('Executing')
+            logger.debug('Executing')
             
             cursor.execute("DELETE FROM farms WHERE farmer_name = ? AND farm_id = ? AND farm_index = ?", (farmer_name, farm_id, farm_index))
             rowcount = cursor.rowcount
@@ -1581,6 +1940,7 @@ class DatabaseAPI:
 
             else:
                 self.conn.commit()
+                self._notify_write('delete', 'farms', [{'farmer_name': farmer_name}])
                 logger.info(f"Farm Deleted")
                 response = {
                     'Success': True,
@@ -1601,6 +1961,97 @@ class DatabaseAPI:
 
         return response
     
+    # ===== PRUNE
+    # Tables retention policies can apply to, with the column their age is measured by
+    retention_columns = {
+        'farmer_events': 'event_datetime',
+        'node_events': 'event_datetime',
+        'plots': 'plot_datetime',
+        'rewards': 'reward_datetime',
+        'errors': 'error_datetime',
+        'claims': 'claim_datetime',
+        'consensus': 'consensus_datetime',
+        **{
+            rollups.rollup_table(entity, resolution): 'bucket_datetime'
+            for entity in rollups.rollups
+            for resolution in rollups.resolutions
+        }
+    }
+
+    def prune(self, table, cutoff_datetime, batch_size=1000):
+        # Deletes one batch of rows older than the cutoff in its own short transaction
+        try:
+            datetime_column = self.retention_columns.get(table)
+            if not datetime_column:
+                raise ValueError(f'No retention for table: {table}')
+
+            # The cutoff is microseconds or a datetime string
+            if isinstance(cutoff_datetime, str):
+                cutoff_datetime = timestamps.parse(cutoff_datetime)
+
+            self.connect()
+            cursor = self.conn.cursor()
+
+            row_id = self.row_ids.get(table, 'rowid')
+            cursor.execute(f"DELETE FROM {table} WHERE {row_id} IN (SELECT {row_id} FROM {table} WHERE {datetime_column} < ? LIMIT ?)",
+                           (cutoff_datetime, batch_size))
+            rowcount = cursor.rowcount
+            self.conn.commit()
+            if rowcount:
+                self._notify_write('delete', table)
+
+            response = {
+                'Success': True,
+                'Data': {
+                    'Deleted Rows': rowcount
+                }
+            }
+
+        except Exception as e:
+            logger.error(f'Error pruning {table}: {e}')
+            if self.conn:
+                self.conn.rollback()
+            response = {
+                "Success": False,
+                'Message': f'Error pruning {table}: {e}'
+            }
+
+        finally:
+            self.disconnect()
+
+        return response
+
+    def incremental_vacuum(self, pages):
+        try:
+            self.connect()
+            cursor = self.conn.cursor()
+
+            cursor.execute("PRAGMA freelist_count")
+            free_pages = cursor.fetchone()[0]
+
+            # The pragma frees one page per step and execute() only steps once, executescript() runs it to completion
+            cursor.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+
+            cursor.execute("PRAGMA freelist_count")
+            response = {
+                'Success': True,
+                'Data': {
+                    'Freed Pages': free_pages - cursor.fetchone()[0]
+                }
+            }
+
+        except Exception as e:
+            logger.error(f'Error running incremental vacuum: {e}')
+            response = {
+                "Success": False,
+                'Message': f'Error running incremental vacuum: {e}'
+            }
+
+        finally:
+            self.disconnect()
+
+        return response
+
     # ===== DELETE ALL
     def delete_all_farmers(self):
         try:
@@ -1618,6 +2069,7 @@ class DatabaseAPI:
             }
 
             self.conn.commit()
+            self._notify_write('delete', 'farmers')
 
         except Exception as e:
             # Rollback the transaction if an error occurs
@@ -1649,6 +2101,7 @@ class DatabaseAPI:
             }
 
             self.conn.commit()
+            self._notify_write('delete', 'nodes')
 
         except Exception as e:
             # Rollback the transaction if an error occurs
@@ -1680,6 +2133,7 @@ class DatabaseAPI:
             }
 
             self.conn.commit()
+            self._notify_write('delete', 'farms')
 
         except Exception as e:
             # Rollback the transaction if an error occurs
@@ -1710,6 +2164,7 @@ class DatabaseAPI:
             }
 
             self.conn.commit()
+            self._notify_write('delete', 'farmer_events')
 
         except Exception as e:
             # Rollback the transaction if an error occurs
@@ -1740,6 +2195,7 @@ class DatabaseAPI:
             }
 
             self.conn.commit()
+            self._notify_write('delete', 'node_events')
 
         except Exception as e:
             # Rollback the transaction if an error occurs
@@ -1762,6 +2218,10 @@ class DatabaseAPI:
             cursor.execute("DELETE FROM plots")
             rowcount = cursor.rowcount
 
+            for resolution in rollups.resolutions:
+                cursor.execute(f"DELETE FROM {rollups.rollup_table('plot', resolution)}")
+            cursor.execute(f"DELETE FROM {state.states['plot']['table']}")
+
             response = {
                 'Success': True,
                 'Data': {
@@ -1770,6 +2230,7 @@ class DatabaseAPI:
             }
 
             self.conn.commit()
+            self._notify_write('delete', 'plots')
 
         except Exception as e:
             # Rollback the transaction if an error occurs
@@ -1800,6 +2261,7 @@ class DatabaseAPI:
             }
 
             self.conn.commit()
+            self._notify_write('delete', 'rewards')
 
         except Exception as e:
             # Rollback the transaction if an error occurs
@@ -1830,6 +2292,7 @@ class DatabaseAPI:
             }
 
             self.conn.commit()
+            self._notify_write('delete', 'errors')
 
         except Exception as e:
             # Rollback the transaction if an error occurs
@@ -1860,6 +2323,7 @@ class DatabaseAPI:
             }
 
             self.conn.commit()
+            self._notify_write('delete', 'claims')
 
         except Exception as e:
             # Rollback the transaction if an error occurs
@@ -1882,6 +2346,11 @@ class DatabaseAPI:
             cursor.execute("DELETE FROM consensus")
             rowcount = cursor.rowcount
 
+            cursor.execute(f"DELETE FROM {state.states['consensus']['table']}")
+
+            for resolution in rollups.resolutions:
+                cursor.execute(f"DELETE FROM {rollups.rollup_table('consensus', resolution)}")
+
             response = {
                 'Success': True,
                 'Data': {
@@ -1890,6 +2359,7 @@ class DatabaseAPI:
             }
 
             self.conn.commit()
+            self._notify_write('delete', 'consensus')
 
         except Exception as e:
             # Rollback the transaction if an error occurs
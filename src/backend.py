@@ -0,0 +1,210 @@
+import abc
+
+# The storage calls nexus_routes, the ingest queue, the pruner and the checkpointer make.
+# src/api.py implements them on SQLite (the default), src/sharding.py over several SQLite
+# files and src/postgres.py on PostgreSQL/TimescaleDB. Every call returns the usual
+# {"Success", "Message"/"Data"} response dict unless noted.
+
+
+class StorageBackend(abc.ABC):
+    # Entities accepted by insert(), insert_batch() and prepare_insert()
+    insert_entities = ()
+
+    # Entity -> export definition, see DatabaseAPI.export_entities
+    export_entities = {}
+
+    # Table -> datetime column the pruner may delete by
+    retention_columns = {}
+
+    # Whether the backend keeps a WAL file that the Checkpointer in src/checkpoint.py should manage
+    checkpoints_wal = False
+
+    @abc.abstractmethod
+    def initialize(self, vacuum_existing=False):
+        # Creates or migrates the schema, called once before any worker starts
+        pass
+
+    @abc.abstractmethod
+    def close(self):
+        pass
+
+    @abc.abstractmethod
+    def suspend(self):
+        # Closes every open connection and holds off new ones until resume(), the master calls
+        # it around forking a worker
+        pass
+
+    @abc.abstractmethod
+    def resume(self):
+        pass
+
+    @abc.abstractmethod
+    def add_write_listener(self, listener):
+        # listener(action, table, rows) is called after every committed write
+        pass
+
+    # ===== INSERT
+    @abc.abstractmethod
+    def prepare_insert(self, entity, data):
+        # Returns (row, None) or (None, error message) without touching the database
+        pass
+
+    @abc.abstractmethod
+    def insert(self, entity, data):
+        pass
+
+    @abc.abstractmethod
+    def insert_batch(self, entity, records):
+        pass
+
+    @abc.abstractmethod
+    def write_rows(self, rows_by_entity):
+        # Writes rows returned by prepare_insert(). A failure that left part of the batch committed
+        # returns the rest as 'Unwritten Rows', without it nothing was written.
+        pass
+
+    # ===== GET
+    @abc.abstractmethod
+    def get_farmers(self, data):
+        pass
+
+    @abc.abstractmethod
+    def get_nodes(self, data):
+        pass
+
+    @abc.abstractmethod
+    def get_farms(self, data):
+        pass
+
+    @abc.abstractmethod
+    def get_farmer_events(self, data):
+        pass
+
+    @abc.abstractmethod
+    def get_node_events(self, data):
+        pass
+
+    @abc.abstractmethod
+    def get_plots(self, data):
+        pass
+
+    @abc.abstractmethod
+    def get_plot_state(self, data):
+        pass
+
+    @abc.abstractmethod
+    def get_rewards(self, data):
+        pass
+
+    @abc.abstractmethod
+    def get_errors(self, data):
+        pass
+
+    @abc.abstractmethod
+    def get_consensus(self, data):
+        pass
+
+    @abc.abstractmethod
+    def get_consensus_state(self, data):
+        pass
+
+    # ===== AGGREGATE
+    @abc.abstractmethod
+    def aggregate_rewards(self, data):
+        pass
+
+    @abc.abstractmethod
+    def aggregate_plots(self, data):
+        pass
+
+    # ===== EXPORT
+    @abc.abstractmethod
+    def export_query(self, entity, data):
+        # Returns (query, params, keys) for export_rows(), raises ValueError for bad arguments
+        pass
+
+    @abc.abstractmethod
+    def export_rows(self, query, params, batch_size=1000):
+        # Generator yielding lists of rows, oldest first
+        pass
+
+    # ===== UPDATE
+    @abc.abstractmethod
+    def update_farmer(self, data):
+        pass
+
+    @abc.abstractmethod
+    def update_node(self, data):
+        pass
+
+    @abc.abstractmethod
+    def update_farm(self, data):
+        pass
+
+    # ===== DELETE
+    @abc.abstractmethod
+    def delete_farmer(self, data):
+        pass
+
+    @abc.abstractmethod
+    def delete_node(self, data):
+        pass
+
+    @abc.abstractmethod
+    def delete_farm(self, data):
+        pass
+
+    # ===== MAINTENANCE
+    @abc.abstractmethod
+    def checkpoint(self, mode='PASSIVE'):
+        pass
+
+    @abc.abstractmethod
+    def prune(self, table, cutoff_datetime, batch_size=1000):
+        # Deletes up to batch_size rows older than the cutoff, Data holds the Deleted Rows
+        pass
+
+    @abc.abstractmethod
+    def incremental_vacuum(self, pages):
+        pass
+
+    # ===== DELETE ALL
+    @abc.abstractmethod
+    def delete_all_farmers(self):
+        pass
+
+    @abc.abstractmethod
+    def delete_all_nodes(self):
+        pass
+
+    @abc.abstractmethod
+    def delete_all_farms(self):
+        pass
+
+    @abc.abstractmethod
+    def delete_all_farmer_events(self):
+        pass
+
+    @abc.abstractmethod
+    def delete_all_node_events(self):
+        pass
+
+    @abc.abstractmethod
+    def delete_all_plots(self):
+        pass
+
+    @abc.abstractmethod
+    def delete_all_rewards(self):
+        pass
+
+    @abc.abstractmethod
+    def delete_all_errors(self):
+        pass
+
+    @abc.abstractmethod
+    def delete_all_claims(self):
+        pass
+
+    @abc.abstractmethod
+    def delete_all_consensus(self):
+        pass
@@ -0,0 +1,152 @@
+import collections
+import threading
+import time
+
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ResponseCache:
+    # GET entity -> the query arg naming the farmer or node its rows belong to, entities
+    # without one (farmers, nodes, farms) return every row so any write to them invalidates all
+    filters = {
+        'farmer_events': 'Farmer Name',
+        'node_events': 'Node Name',
+        'plots': 'Farmer Name',
+        'plot_state': 'Farmer Name',
+        'rewards': 'Farmer Name',
+        'errors': 'Farmer Name',
+        'consensus': 'Node Name',
+        'consensus_state': 'Node Name'
+    }
+
+    # Table written -> GET entities that read it, and the column matching the filter above
+    tables = {
+        'farmers': (['farmers'], 'farmer_name'),
+        'nodes': (['node', 'nodes'], 'node_name'),
+        'farms': (['farms'], 'farmer_name'),
+        'farmer_events': (['farmer_events'], 'farmer_name'),
+        'node_events': (['node_events'], 'node_name'),
+        'plots': (['plots', 'plot_state'], 'farmer_name'),
+        'rewards': (['rewards'], 'farmer_name'),
+        'errors': (['errors'], 'farmer_name'),
+        'claims': ([], 'node_name'),
+        'consensus': (['consensus', 'consensus_state'], 'node_name')
+    }
+
+    def __init__(self, max_entries=1024, ttl_seconds=5):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+
+        # key -> (expires, body), oldest first
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        # Bumped on every invalidation so a query that overlapped a write is not stored
+        self._generations = collections.defaultdict(int)
+
+        self._stats = {
+            'Hits': 0,
+            'Misses': 0,
+            'Stores': 0,
+            'Evictions': 0,
+            'Expired': 0,
+            'Invalidations': 0
+        }
+
+    def key(self, entity, data):
+        return (entity, tuple(sorted(data.items())))
+
+    def generation(self, entity):
+        with self._lock:
+            return self._generations[entity]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['Misses'] += 1
+                return None
+
+            expires, body = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                self._stats['Expired'] += 1
+                self._stats['Misses'] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats['Hits'] += 1
+            return body
+
+    def put(self, key, body, generation):
+        with self._lock:
+            # A write to this entity committed while the query ran, the body may already be stale
+            if self._generations[key[0]] != generation:
+                return
+
+            self._entries[key] = (time.monotonic() + self.ttl, body)
+            self._entries.move_to_end(key)
+            self._stats['Stores'] += 1
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['Evictions'] += 1
+
+    def invalidate(self, action, table, rows):
+        # Write listener, rows is None when any row of the table may have changed
+        table = table.split('_rollup_')[0]
+        entities, column = self.tables.get(table, (None, None))
+
+        if entities is None:
+            logger.warn(f'Unknown table {table} written, clearing response cache')
+            self.clear()
+            return
+
+        names = None
+        if rows is not None:
+            names = {row.get(column) for row in rows}
+            # Rows without the column could belong to anyone
+            if None in names:
+                names = None
+
+        with self._lock:
+            for entity in entities:
+                self._generations[entity] += 1
+
+            stale = []
+            for key in self._entries:
+                entity, args = key
+                if entity not in entities:
+                    continue
+
+                value = dict(args).get(self.filters.get(entity))
+                if names is None or value is None or value in names:
+                    stale.append(key)
+
+            for key in stale:
+                del self._entries[key]
+            self._stats['Invalidations'] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            for entity, _ in self._entries:
+                self._generations[entity] += 1
+            for entities, _ in self.tables.values():
+                for entity in entities:
+                    self._generations[entity] += 1
+
+            self._stats['Invalidations'] += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['Entries'] = len(self._entries)
+
+        lookups = stats['Hits'] + stats['Misses']
+        stats['Hit Ratio'] = round(stats['Hits'] / lookups, 4) if lookups else None
+        stats['Max Entries'] = self.max_entries
+        stats['TTL Seconds'] = self.ttl
+        return stats
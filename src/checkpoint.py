@@ -0,0 +1,49 @@
+import os
+import threading
+
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class Checkpointer:
+    def __init__(self, database_api, interval=60, truncate_size_mb=64):
+        self.database_api = database_api
+        self.interval = interval
+        self.truncate_size = truncate_size_mb * 1024 * 1024
+        self.wal_location = database_api.db_location + '-wal'
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        logger.info(f'Starting WAL checkpointer, interval {self.interval}s')
+        self._thread = threading.Thread(target=self._run, name='nexus-checkpointer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+
+        # Leave an empty WAL behind on a clean shutdown
+        self.database_api.checkpoint('TRUNCATE')
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.checkpoint()
+
+    def checkpoint(self):
+        try:
+            wal_size = os.path.getsize(self.wal_location)
+        except OSError:
+            # Not in WAL mode or nothing written yet
+            return
+
+        # PASSIVE never blocks readers or writers. Once the WAL has grown past the limit
+        # (long running readers kept it from being reset), wait for a TRUNCATE instead.
+        mode = 'TRUNCATE' if wal_size > self.truncate_size else 'PASSIVE'
+        response = self.database_api.checkpoint(mode)
+
+        if response['Success'] and mode == 'TRUNCATE':
+            logger.info(f'WAL was {wal_size} bytes, truncated: {not response["Data"]["Busy"]}')
@@ -8,7 +8,26 @@ keys = {
     'Reward': ['Reward ID', 'Farmer Name', 'Farm Index', 'Reward Hash', 'Reward Result', 'Reward Datetime'],
     'Error': ['Error ID', 'Farmer Name', 'Error', 'Error Datetime'],
     'Claim': ['Claim ID', 'Node Name', 'Slot', 'Claim Type', 'Claim Datetime'],
-    'Consensus': ['Consensus ID', 'Node Name', 'Status', 'Peers', 'Best', 'Target', 'Finalized', 'BPS', 'Down Speed KiB', 'Up Speed KiB', 'Consensus Datetime']
+    'Consensus': ['Consensus ID', 'Node Name', 'Status', 'Peers', 'Best', 'Target', 'Finalized', 'BPS', 'Down Speed KiB', 'Up Speed KiB', 'Consensus Datetime'],
+    'Plot Rollup': ['Farmer Name', 'Farm Index', 'Plot Type', 'Bucket Datetime', 'Samples',
+                    'Plot Percentage Min', 'Plot Percentage Max', 'Plot Percentage Avg', 'Plot Percentage Last',
+                    'Plot Current Sector Min', 'Plot Current Sector Max', 'Plot Current Sector Avg', 'Plot Current Sector Last'],
+    'Consensus Rollup': ['Node Name', 'Bucket Datetime', 'Samples',
+                         'Peers Min', 'Peers Max', 'Peers Avg', 'Peers Last',
+                         'Best Min', 'Best Max', 'Best Avg', 'Best Last',
+                         'Target Min', 'Target Max', 'Target Avg', 'Target Last',
+                         'Finalized Min', 'Finalized Max', 'Finalized Avg', 'Finalized Last',
+                         'BPS Min', 'BPS Max', 'BPS Avg', 'BPS Last',
+                         'Down Speed KiB Min', 'Down Speed KiB Max', 'Down Speed KiB Avg', 'Down Speed KiB Last',
+                         'Up Speed KiB Min', 'Up Speed KiB Max', 'Up Speed KiB Avg', 'Up Speed KiB Last'],
+    'Plot State': ['Farmer Name', 'Farm Index', 'Plot Type', 'Plot Percentage', 'Plot Current Sector', 'Plot Datetime'],
+    # Consensus State ends with fields derived from the stored ones
+    'Consensus State': ['Node Name', 'Status', 'Peers', 'Best', 'Target', 'Finalized', 'BPS', 'Down Speed KiB', 'Up Speed KiB', 'Consensus Datetime',
+                        'Synced', 'Blocks Behind', 'Sync ETA Seconds', 'Age Minutes', 'Stale'],
+    # Aggregates are prefixed with their group columns (Farmer Name, Farm Index, Plot Type)
+    'Reward Aggregate': ['Bucket Datetime', 'Rewards', 'Rewards Per Hour'],
+    'Plot Aggregate': ['Bucket Datetime', 'Sectors', 'Sectors Per Hour',
+                       'Sector Seconds Avg', 'Sector Seconds Min', 'Sector Seconds P50', 'Sector Seconds P95', 'Sector Seconds Max']
 }
 
 VERSIONS = {
@@ -1,36 +1,62 @@
-from flask import Blueprint, request, jsonify, current_app
-from src.logger import logger
+import csv
+import io
+import json
+import time
+
+from flask import Blueprint, request, jsonify, current_app, g
+from src.logger import get_logger
+import src.metrics as metrics
+import src.schema as schema
+import src.state as state
+
+logger = get_logger(__name__)
 
 nexus_routes = Blueprint('nexus_routes', __name__)
 
+# Entities the routes serve, any other <entity> is labeled unknown so typos and scans
+# can not create new metric series
+metric_entities = set(schema.schemas) | {entity_schema['table'] for entity_schema in schema.schemas.values()} | {entity_state['table'] for entity_state in state.states.values()}
+
+
+def entity_label(entity):
+    # /stream takes a comma separated list, known tables are labeled in a fixed order
+    tables = set(entity.split(','))
+    if not entity or not tables <= metric_entities:
+        return 'unknown' if entity else ''
+    return ','.join(sorted(tables))
+
+@nexus_routes.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@nexus_routes.after_request
+def record_request(response):
+    if current_app.config.get('metrics_enabled', True) and request.url_rule is not None:
+        elapsed = time.perf_counter() - g.request_start
+        route = request.url_rule.rule
+        entity = entity_label((request.view_args or {}).get('entity', ''))
+        metrics.http_request_seconds.labels(route, entity, request.method).observe(elapsed)
+        metrics.http_requests.labels(route, entity, request.method, response.status_code).inc()
+    return response
+
 @nexus_routes.route('/insert/<entity>', methods=['POST'])
 def insert(entity):
     database_api = current_app.config['database_api']
     data = request.json
-    logger.info(f"Inserting {entity}")
+    logger.debug('Inserting %s', entity)
 
-    # Map entity names to corresponding insert methods
-    insert_methods = {
-        'farmer': database_api.insert_farmer,
-        'node': database_api.insert_node,
-        'farm': database_api.insert_farm,
-        'farmer_event': database_api.insert_farmer_event,
-        'node_event': database_api.insert_node_event,
-        'plot': database_api.insert_plot,
-        'reward': database_api.insert_reward,
-        'error': database_api.insert_error,
-        'claim': database_api.insert_claim,
-        'consensus': database_api.insert_consensus
-    }
+    # In async ingest mode the row is validated here and written later by the ingest writer
+    ingest_queue = current_app.config.get('ingest_queue')
+    if ingest_queue and entity in database_api.insert_entities:
+        response, status = ingest_queue.submit(entity, data)
+        return jsonify(response), status
 
     # Check if the requested entity is supported
-    insert_method = insert_methods.get(entity)
-    if not insert_method:
+    if entity not in database_api.insert_entities:
         return jsonify({"error": f"Unknown entity: {entity}"}), 400
-    
-    # Call the appropriate delete method
+
     try:
-        response = insert_method(data)
+        response = database_api.insert(entity, data)
         if not response["Success"]:
             return jsonify(response), 400
         else:
@@ -38,11 +64,47 @@ def insert(entity):
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    
+
+@nexus_routes.route('/insert/<entity>/batch', methods=['POST'])
+def insert_batch(entity):
+    database_api = current_app.config['database_api']
+    records = request.json
+    logger.debug('Inserting %s batch', entity)
+
+    # Same entities as /insert/<entity>
+    if entity not in database_api.insert_entities:
+        return jsonify({"error": f"Unknown entity: {entity}"}), 400
+
+    # Validates every record and writes the valid ones in one transaction
+    try:
+        response = database_api.insert_batch(entity, records)
+        if not response["Success"]:
+            return jsonify(response), 400
+        else:
+            return jsonify(response), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def payload_filters():
+    # data.<Field>=value args filter events on fields of their payload, values are parsed as
+    # JSON so data.Replot=true or data.Peers=8 match typed fields. Kept hashable for the cache key.
+    filters = []
+    for arg, value in request.args.items():
+        if arg.startswith('data.'):
+            try:
+                parsed = json.loads(value)
+                if not isinstance(parsed, (dict, list)):
+                    value = parsed
+            except ValueError:
+                pass
+            filters.append((arg[len('data.'):], value))
+    return tuple(sorted(filters))
+
 @nexus_routes.route('/get/<entity>', methods=['GET'])
 def get(entity):
     database_api = current_app.config['database_api']
-    logger.info(f"Getting {entity}")
+    logger.debug('Getting %s', entity)
     data = {
         'Page': request.args.get('page', default=1, type=int),
         'Limit': request.args.get('limit', default=10, type=int),
@@ -52,31 +114,89 @@ def get(entity):
         'Plot Type': request.args.get('plot_type', default=None, type=str),
         'Farm Index': request.args.get('farm_index', default=None, type=int),
         'Start Time': request.args.get('start_datetime'),
-        'End Time': request.args.get('end_datetime')
+        'End Time': request.args.get('end_datetime'),
+        'Resolution': request.args.get('resolution', default='raw', type=str),
+        'Cursor': request.args.get('cursor', default=None, type=str),
+        'Order': request.args.get('order', default=None, type=str),
+        'Count': request.args.get('count', default='true').lower() != 'false',
+        'Explain': request.args.get('explain', default='false').lower() == 'true',
+        'Format': request.args.get('format', default='objects', type=str).lower(),
+        'Stale Minutes': request.args.get('stale_minutes', default=5, type=int),
+        'Payload': payload_filters()
     }
 
     # Map entity names to corresponding insert methods
     get_methods = {
         'farmers': database_api.get_farmers,
         'node': database_api.get_nodes,
+        'nodes': database_api.get_nodes,
         'farms': database_api.get_farms,
         'farmer_events': database_api.get_farmer_events,
         'node_events': database_api.get_node_events,
         'plots': database_api.get_plots,
+        'plot_state': database_api.get_plot_state,
         'rewards': database_api.get_rewards,
-        'errors': database_api.get_errors
+        'errors': database_api.get_errors,
+        'consensus': database_api.get_consensus,
+        'consensus_state': database_api.get_consensus_state
         #TODO: get_claims
-        #TODO: get_consensus
     }
     
     # Check if the requested entity is supported
     get_method = get_methods.get(entity)
     if not get_method:
         return jsonify({"error": f"Unknown entity: {entity}"}), 400
+
+    # Identical polls are answered from the response cache until a write invalidates them
+    response_cache = current_app.config.get('response_cache')
+    use_cache = response_cache is not None and not data['Explain']
+    if use_cache:
+        cache_key = response_cache.key(entity, data)
+        body = response_cache.get(cache_key)
+        if body is not None:
+            return current_app.response_class(body, status=200, mimetype='application/json')
+        generation = response_cache.generation(entity)
     
     # Call the appropriate delete method
     try:
         response = get_method(data)
+        if not response["Success"]:
+            return jsonify(response), 400
+        else:
+            response = jsonify(response)
+            if use_cache:
+                response_cache.put(cache_key, response.get_data(), generation)
+            return response, 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@nexus_routes.route('/aggregate/<entity>', methods=['GET'])
+def aggregate(entity):
+    database_api = current_app.config['database_api']
+    logger.debug('Aggregating %s', entity)
+    data = {
+        'Farmer Name': request.args.get('farmer_name', default=None, type=str),
+        'Farm Index': request.args.get('farm_index', default=None, type=int),
+        'Plot Type': request.args.get('plot_type', default=None, type=str),
+        'Reward Type': request.args.get('reward_type', default=None, type=str),
+        'Start Time': request.args.get('start_datetime'),
+        'End Time': request.args.get('end_datetime'),
+        'Resolution': request.args.get('resolution', default='1h', type=str),
+        'Group By': request.args.get('group_by', default='farm', type=str)
+    }
+
+    aggregate_methods = {
+        'rewards': database_api.aggregate_rewards,
+        'plots': database_api.aggregate_plots
+    }
+
+    # Check if the requested entity is supported
+    aggregate_method = aggregate_methods.get(entity)
+    if not aggregate_method:
+        return jsonify({"error": f"Unknown entity: {entity}"}), 400
+
+    try:
+        response = aggregate_method(data)
         if not response["Success"]:
             return jsonify(response), 400
         else:
@@ -84,13 +204,109 @@ def get(entity):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@nexus_routes.route('/export/<entity>', methods=['GET'])
+def export(entity):
+    database_api = current_app.config['database_api']
+    logger.debug('Exporting %s', entity)
+    data = {
+        'Farmer Name': request.args.get('farmer_name', default=None, type=str),
+        'Node Name': request.args.get('node_name', default=None, type=str),
+        'Event Type': request.args.get('event_type', default=None, type=str),
+        'Plot Type': request.args.get('plot_type', default=None, type=str),
+        'Farm Index': request.args.get('farm_index', default=None, type=int),
+        'Start Time': request.args.get('start_datetime'),
+        'End Time': request.args.get('end_datetime'),
+        'Payload': payload_filters()
+    }
+    export_format = request.args.get('format', default='ndjson', type=str).lower()
+
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({"error": f"Unknown format: {export_format}"}), 400
+
+    try:
+        sql, params, columns = database_api.export_query(entity, data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    batches = database_api.export_rows(sql, params)
+    # The generators run after the request context is gone
+    dumps = current_app.json.dumps
+
+    # Each batch of rows becomes one chunk of the chunked response
+    def ndjson():
+        for rows in batches:
+            yield ''.join(dumps(dict(zip(columns, row)), sort_keys=False) + '\n' for row in rows)
+
+    def csv_rows():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for rows in batches:
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        # Header only when nothing matched
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    if export_format == 'csv':
+        return current_app.response_class(csv_rows(), mimetype='text/csv',
+                                          headers={'Content-Disposition': f'attachment; filename={entity}.csv'})
+
+    return current_app.response_class(ndjson(), mimetype='application/x-ndjson')
+
+@nexus_routes.route('/stream/<entity>', methods=['GET'])
+def stream(entity):
+    event_stream = current_app.config.get('event_stream')
+    if not event_stream:
+        return jsonify({"error": "Streaming is not enabled"}), 400
+
+    # One table or a comma separated list, each event is named after its table
+    tables = entity.split(',')
+    for table in tables:
+        if table not in event_stream.tables:
+            return jsonify({"error": f"Unknown entity: {entity}"}), 400
+
+    # Repeat farmer_name or node_name to follow several, events of other tables match neither
+    names = request.args.getlist('farmer_name') + request.args.getlist('node_name')
+
+    subscriber = event_stream.subscribe(tables, names)
+    if subscriber is None:
+        # Another worker may have room, the next connection can land there
+        return jsonify({"error": f"This worker already serves {event_stream.max_clients} stream clients, try again later"}), 503, {'Retry-After': '5'}
+
+    heartbeat = event_stream.heartbeat_seconds
+    # The generator runs after the request context is gone
+    dumps = current_app.json.dumps
+
+    def events():
+        try:
+            yield f'retry: {heartbeat * 1000}\n\n'
+            while True:
+                batch = subscriber.wait(heartbeat)
+                if batch is None:
+                    if subscriber.evicted:
+                        yield 'event: evicted\ndata: {"Message": "Client fell behind, reconnect and catch up with /get"}\n\n'
+                    return
+                # A comment keeps proxies from closing an idle stream and detects gone clients
+                if not batch:
+                    yield ': keepalive\n\n'
+                    continue
+                yield ''.join(f'event: {table}\ndata: {dumps(event, sort_keys=False)}\n\n' for table, event in batch)
+        finally:
+            event_stream.unsubscribe(subscriber)
+
+    return current_app.response_class(events(), mimetype='text/event-stream',
+                                      headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @nexus_routes.route('/update/<entity>', methods=['POST'])
 def update(entity):
     database_api = current_app.config['database_api']
     data = request.json
 
 
-    logger.info(f"Updating {entity}")
+    logger.debug('Updating %s', entity)
     # Map entity names to corresponding update methods
     update_methods = {
         'farmer': database_api.update_farmer,
@@ -119,7 +335,7 @@ def update(entity):
 def delete(entity):
     database_api = current_app.config['database_api']
     data = request.json
-    logger.info(f"Deleting {entity}")
+    logger.debug('Deleting %s', entity)
 
     # Map entity names to corresponding insert methods
     insert_methods = {
@@ -147,7 +363,7 @@ def delete(entity):
 
 @nexus_routes.route('/delete/<entity>/all', methods=['POST'])
 def delete_all(entity):
-    logger.info(f"Deleting all rows in {entity}")
+    logger.debug('Deleting all rows in %s', entity)
 
     database_api = current_app.config.get('database_api')
 
@@ -181,6 +397,37 @@ def delete_all(entity):
         logger.error(f'Error calling delete_method: {e}')
         return jsonify({"error": str(e)}), 500
 
+@nexus_routes.route('/ingest/stats', methods=['GET'])
+def ingest_stats():
+    ingest_queue = current_app.config.get('ingest_queue')
+    if not ingest_queue:
+        return jsonify({"error": "Async ingest is not enabled"}), 400
+
+    return jsonify({"Success": True, "Data": ingest_queue.stats()}), 200
+
+@nexus_routes.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    response_cache = current_app.config.get('response_cache')
+    if not response_cache:
+        return jsonify({"error": "Response cache is not enabled"}), 400
+
+    return jsonify({"Success": True, "Data": response_cache.stats()}), 200
+
+@nexus_routes.route('/stream/stats', methods=['GET'])
+def stream_stats():
+    event_stream = current_app.config.get('event_stream')
+    if not event_stream:
+        return jsonify({"error": "Streaming is not enabled"}), 400
+
+    return jsonify({"Success": True, "Data": event_stream.stats()}), 200
+
+@nexus_routes.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    if not current_app.config.get('metrics_enabled', True):
+        return jsonify({"error": "Metrics are not enabled"}), 400
+
+    return current_app.response_class(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
 @nexus_routes.route('/hello', methods=['GET'])
 def hello():
     return jsonify({"message": "Hi"}), 200
@@ -1,8 +1,13 @@
 import os
+import json
 import yaml
-import datetime
+import base64
+import hashlib
 
-from src.logger import logger
+from src.logger import get_logger
+import src.timestamps as timestamps
+
+logger = get_logger(__name__)
 
 class Helpers:
     @staticmethod
@@ -21,31 +26,31 @@ class Helpers:
             
     @staticmethod
     def check_age_of_timestamp(timestamp):
-        # Parse the UTC timestamp string to a datetime object
-        utc_time = datetime.datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+        # Minutes since a stored timestamp (microseconds) or an ISO 8601 string, in local time
+        if isinstance(timestamp, str):
+            timestamp = timestamps.from_iso(timestamp)
 
-        # Get the current time in UTC
-        now_utc = datetime.datetime.now(datetime.timezone.utc)
+        return round((timestamps.now() - timestamp) / timestamps.MICROS_PER_MINUTE)
+    
+    @staticmethod
+    def hash_event_data(event_data):
+        # 64-bit digest of the serialized event payload, compact enough to index
+        digest = hashlib.blake2b(event_data.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'big', signed=True)
 
-        # Convert UTC current time to user's local time
-        user_timezone = datetime.datetime.now().astimezone().tzinfo
-        local_now = now_utc.astimezone(user_timezone)
+    @staticmethod
+    def encode_cursor(last_datetime, last_id):
+        # Opaque pagination cursor pointing just past the last row of a page
+        return base64.urlsafe_b64encode(json.dumps([last_datetime, last_id]).encode('utf-8')).decode('ascii')
 
-        # Convert UTC timestamp to user's local time
-        local_timestamp = utc_time.astimezone(user_timezone)
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            last_datetime, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        except (ValueError, TypeError):
+            raise ValueError('Invalid cursor')
 
-        # Calculate the difference in minutes
-        time_diff = local_now - local_timestamp
-        minutes_diff = round(time_diff.total_seconds() / 60)
+        return last_datetime, last_id
 
-        return minutes_diff
-    
     def validate_date(date_str):
-        try:
-            # Parse the date string
-            datetime_obj = datetime.datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S.%f')
-            # If parsing succeeds, return True
-            return True
-        except ValueError:
-            # If parsing fails, return False
-            return False
\ No newline at end of file
+        return timestamps.is_valid(date_str)
@@ -0,0 +1,160 @@
+import queue
+import threading
+import time
+
+from src.logger import get_logger
+import src.metrics as metrics
+
+logger = get_logger(__name__)
+
+
+class IngestQueue:
+    # Stats that are also exported at /metrics
+    counters = {
+        'Enqueued': metrics.ingest_enqueued.labels(),
+        'Rejected': metrics.ingest_rejected.labels(),
+        'Written Rows': metrics.ingest_rows_written.labels(),
+        'Failed Rows': metrics.ingest_rows_failed.labels(),
+        'Flushes': metrics.ingest_flushes.labels(),
+        'Retries': metrics.ingest_retries.labels()
+    }
+
+    def __init__(self, database_api, max_size=10000, flush_interval_ms=50, flush_rows=500, max_attempts=3):
+        self.database_api = database_api
+        self.max_size = max_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_rows = flush_rows
+        self.max_attempts = max_attempts
+
+        self._queue = queue.Queue(maxsize=max_size)
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'Enqueued': 0,
+            'Rejected': 0,
+            'Written Rows': 0,
+            'Failed Rows': 0,
+            'Flushes': 0,
+            'Retries': 0,
+            'Last Flush Rows': 0,
+            'Last Flush Seconds': 0.0
+        }
+
+        metrics.ingest_queue_depth.labels().set_function(self._queue.qsize)
+
+    def start(self):
+        logger.info(f'Starting ingest writer, queue size {self.max_size}, flushing every {self.flush_interval}s or {self.flush_rows} rows')
+        self._thread = threading.Thread(target=self._run, name='nexus-ingest-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        # The writer drains whatever is still queued before it exits
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+            logger.info('Ingest writer stopped, queue flushed')
+
+    def submit(self, entity, data):
+        # Returns (response, status code) for the HTTP layer
+        row, message = self.database_api.prepare_insert(entity, data)
+        if message:
+            logger.warn(message)
+            return {
+                "Success": False,
+                "Message": message
+            }, 400
+
+        if self._stop_event.is_set():
+            return {
+                "Success": False,
+                "Message": "Ingest queue is shutting down"
+            }, 503
+
+        try:
+            self._queue.put_nowait((entity, row))
+        except queue.Full:
+            # Backpressure, the client should retry later
+            self._count('Rejected')
+            return {
+                "Success": False,
+                "Message": "Ingest queue is full, retry later"
+            }, 503
+
+        self._count('Enqueued')
+        return {
+            "Success": True,
+            "Message": f"Queued {entity}",
+            "Queue Depth": self._queue.qsize()
+        }, 202
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+
+        stats['Queue Depth'] = self._queue.qsize()
+        stats['Queue Size'] = self.max_size
+        return stats
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+        self.counters[name].inc(amount)
+
+    def _run(self):
+        while not (self._stop_event.is_set() and self._queue.empty()):
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+
+    def _collect(self):
+        # Wait for the first item, then keep collecting until the batch is full or the interval is up
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.flush_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _flush(self, batch):
+        # Group per entity so each table is written with one executemany
+        rows_by_entity = {}
+        for entity, row in batch:
+            rows_by_entity.setdefault(entity, []).append(row)
+
+        start = time.perf_counter()
+        pending = rows_by_entity
+        for attempt in range(1, self.max_attempts + 1):
+            response = self.database_api.write_rows(pending)
+            if response['Success']:
+                break
+            # Rows that were committed anyway (the other rows of a batch with a bad row, the shards
+            # that succeeded) are listed as written, only the unwritten ones are retried
+            pending = response.get('Unwritten Rows', pending)
+            logger.warn(f'Ingest flush attempt {attempt} of {sum(len(rows) for rows in pending.values())} rows failed')
+            if attempt < self.max_attempts:
+                self._count('Retries')
+                time.sleep(self.flush_interval * attempt)
+
+        failed = 0 if response['Success'] else sum(len(rows) for rows in pending.values())
+        with self._stats_lock:
+            self._stats['Last Flush Rows'] = len(batch)
+            self._stats['Last Flush Seconds'] = time.perf_counter() - start
+        self._count('Flushes')
+        self._count('Written Rows', len(batch) - failed)
+        self._count('Failed Rows', failed)
+
+        if failed:
+            logger.error(f'Dropped {failed} queued rows: {response["Message"]}')
@@ -0,0 +1,39 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    # Serializes responses with orjson, several times faster than the stdlib encoder on large pages.
+    # Keys keep their insertion order instead of being sorted.
+    options = orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.options).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=self.default, option=self.options), mimetype=self.mimetype)
+
+
+def set_json_provider(app, encoder='auto'):
+    # auto uses orjson when it is installed, json always uses the stdlib encoder
+    if encoder == 'json':
+        return
+
+    if orjson is None:
+        if encoder == 'orjson':
+            logger.warn('json.encoder is orjson but orjson is not installed, install it with "pip install orjson"')
+        return
+
+    app.json = OrjsonProvider(app)
@@ -1,16 +1,167 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import pickle
+import queue
+import socket
+import threading
 
-os.makedirs('./logs/', exist_ok=True)
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S',
-    handlers=[
-        logging.FileHandler('./logs/app.log'),  # Log to a file
-        logging.StreamHandler()
-    ]
-)
+DEFAULT_CONFIG = {
+    'level': 'INFO',
+    'file': './logs/app.log',
+    'max_bytes': 10 * 1024 * 1024,
+    'backup_count': 5,
+    'console': True,
+    'levels': {}
+}
 
-logger = logging.getLogger(__name__)
\ No newline at end of file
+# Request threads only put records on this queue, the listener thread formats them
+# and does the blocking file and console writes
+_queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+_listener = None
+_config = dict(DEFAULT_CONFIG)
+
+# Longest message a forked worker relays to the master, longer ones are cut to fit a datagram
+MAX_RELAY_MESSAGE = 60000
+
+# Set by start_relay() in the master, forked workers send their records to this socket
+_relay_path = None
+_relay_socket = None
+
+
+class RelayHandler(logging.handlers.DatagramHandler):
+    # Sends a worker's records to the master over a UNIX datagram socket, so only the master
+    # writes and rotates the log file
+    def __init__(self, path):
+        super().__init__(path, None)
+
+    def makePickle(self, record):
+        message = record.getMessage()
+        if len(message) > MAX_RELAY_MESSAGE:
+            record = logging.makeLogRecord(dict(record.__dict__, msg=message[:MAX_RELAY_MESSAGE] + '...', args=None))
+        return super().makePickle(record)
+
+
+def _handlers(config):
+    formatter = logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT)
+    handlers = []
+
+    if config.get('file'):
+        os.makedirs(os.path.dirname(config['file']) or '.', exist_ok=True)
+        handlers.append(logging.handlers.RotatingFileHandler(
+            config['file'],
+            maxBytes=config.get('max_bytes', DEFAULT_CONFIG['max_bytes']),
+            backupCount=config.get('backup_count', DEFAULT_CONFIG['backup_count'])
+        ))
+
+    if config.get('console', True):
+        handlers.append(logging.StreamHandler())
+
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def _start_listener():
+    global _listener
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *_handlers(_config), respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener():
+    global _listener
+    if _listener:
+        # Writes out everything still queued
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def _restart_after_fork():
+    # The listener thread does not survive a fork (gunicorn workers), start a fresh one. Under a
+    # relaying master it only forwards records, the master owns the file and the console.
+    global _listener, _relay_socket
+    _listener = None
+    _queue_handler.queue = queue.SimpleQueue()
+
+    if _relay_path:
+        if _relay_socket:
+            _relay_socket.close()
+            _relay_socket = None
+        relay_handler = RelayHandler(_relay_path)
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, relay_handler, respect_handler_level=True)
+        _listener.start()
+        return
+
+    _start_listener()
+
+
+def start_relay(directory):
+    # Called in the master before it forks workers, their records arrive on a socket in directory
+    global _relay_path, _relay_socket
+    path = os.path.join(directory, 'log.sock')
+    relay_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    relay_socket.bind(path)
+    # The receive thread checks once a second whether the relay was stopped
+    relay_socket.settimeout(1)
+    _relay_socket = relay_socket
+    _relay_path = path
+    threading.Thread(target=_receive, args=(relay_socket,), name='nexus-log-relay', daemon=True).start()
+
+
+def stop_relay():
+    global _relay_path, _relay_socket
+    _relay_path = None
+    _relay_socket = None
+
+
+def _receive(relay_socket):
+    # Records are pickled by the master's own workers, the socket lives in a private directory
+    try:
+        while _relay_socket is relay_socket:
+            try:
+                datagram = relay_socket.recv(MAX_RELAY_MESSAGE + 65536)
+            except socket.timeout:
+                continue
+            try:
+                _queue_handler.queue.put(logging.makeLogRecord(pickle.loads(datagram[4:])))
+            except Exception:
+                pass
+    finally:
+        relay_socket.close()
+
+
+def setup_logging(config=None):
+    global _config
+    _config = {**DEFAULT_CONFIG, **(config or {})}
+
+    _stop_listener()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(_config['level'])
+
+    # Per-module overrides, e.g. {'src.api': 'WARNING', 'werkzeug': 'ERROR'}
+    for name, level in (_config.get('levels') or {}).items():
+        logging.getLogger(name).setLevel(level)
+
+    _start_listener()
+
+
+def get_logger(name):
+    return logging.getLogger(name)
+
+
+setup_logging()
+atexit.register(_stop_listener)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+logger = get_logger(__name__)
@@ -0,0 +1,473 @@
+import bisect
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# In-process metrics rendered in the Prometheus text exposition format at /metrics.
+#
+# Every metric child keeps one list of numbers per thread. Only the owning thread writes
+# to its list, so recording is an in-place increment with no lock, scrapes sum the lists.
+#
+# Under gunicorn every worker also writes its totals to a directory shared by all workers,
+# and a scrape answered by any of them sums the files, see Registry.share.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Lists of threads that exited are folded into one once there are more than this many
+MAX_SHARDS = 64
+
+# Seconds between writes of a worker's totals to the shared directory
+SHARE_INTERVAL_SECONDS = 5
+
+
+class _Cells:
+    def __init__(self, size):
+        self.size = size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        self._retired = [0] * size
+
+    def get(self):
+        try:
+            return self._local.cells
+        except AttributeError:
+            pass
+
+        # First use on this thread, allocate its list once
+        cells = [0] * self.size
+        with self._lock:
+            self._shards.append((weakref.ref(threading.current_thread()), cells))
+            if len(self._shards) > MAX_SHARDS:
+                self._fold()
+        self._local.cells = cells
+        return cells
+
+    def _fold(self):
+        # Called with the lock held, a dead thread can no longer write to its list
+        alive = []
+        for ref, cells in self._shards:
+            thread = ref()
+            if thread is None or not thread.is_alive():
+                for i, value in enumerate(cells):
+                    self._retired[i] += value
+            else:
+                alive.append((ref, cells))
+        self._shards = alive
+
+    def total(self):
+        with self._lock:
+            self._fold()
+            totals = list(self._retired)
+            for _, cells in self._shards:
+                for i, value in enumerate(cells):
+                    totals[i] += value
+        return totals
+
+    def reset(self):
+        # Zeroed in place, threads keep writing to the lists they hold
+        with self._lock:
+            self._retired = [0] * self.size
+            for _, cells in self._shards:
+                for i in range(self.size):
+                    cells[i] = 0
+
+
+class CounterChild:
+    __slots__ = ('_cells',)
+
+    def __init__(self):
+        self._cells = _Cells(1)
+
+    def inc(self, amount=1):
+        self._cells.get()[0] += amount
+
+    def totals(self):
+        return self._cells.total()
+
+    def reset(self):
+        self._cells.reset()
+
+    def samples(self, name, labels, totals):
+        yield name, labels, totals[0]
+
+
+class HistogramChild:
+    __slots__ = ('_cells', '_buckets')
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+        # One slot per bucket plus +Inf, then sum and count
+        self._cells = _Cells(len(buckets) + 3)
+
+    def observe(self, value):
+        cells = self._cells.get()
+        cells[bisect.bisect_left(self._buckets, value)] += 1
+        cells[-2] += value
+        cells[-1] += 1
+
+    def totals(self):
+        return self._cells.total()
+
+    def reset(self):
+        self._cells.reset()
+
+    def samples(self, name, labels, totals):
+        cumulative = 0
+        for bound, count in zip(self._buckets + ('+Inf',), totals):
+            cumulative += count
+            yield f'{name}_bucket', labels + (('le', str(bound)),), cumulative
+        yield f'{name}_sum', labels, totals[-2]
+        yield f'{name}_count', labels, totals[-1]
+
+
+class GaugeChild:
+    __slots__ = ('_value', '_function')
+
+    def __init__(self):
+        self._value = 0
+        self._function = None
+
+    def set(self, value):
+        self._value = value
+
+    def set_function(self, function):
+        # Read at scrape time, for values the owner already tracks (a queue's size)
+        self._function = function
+
+    def totals(self):
+        return [self._function() if self._function else self._value]
+
+    def reset(self):
+        self._value = 0
+
+    def samples(self, name, labels, totals):
+        yield name, labels, totals[0]
+
+
+class Metric:
+    def __init__(self, kind, name, documentation, labelnames, child_factory):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._child_factory = child_factory
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        # Callers on hot paths keep the child instead of looking it up per sample
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._child_factory()
+                    self._children[values] = child
+        return child
+
+    def totals(self):
+        # Label values -> totals of this process
+        return {values: child.totals() for values, child in list(self._children.items())}
+
+    def reset(self):
+        for child in list(self._children.values()):
+            child.reset()
+
+    def render(self, totals=None):
+        # totals are this process's own unless merged ones are passed in
+        if totals is None:
+            totals = self.totals()
+
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, child_totals in totals.items():
+            labels = tuple(zip(self.labelnames, values))
+            for name, sample_labels, value in self.labels(*values).samples(self.name, labels, child_totals):
+                lines.append(f'{name}{_format_labels(sample_labels)} {_format_value(value)}')
+        return lines
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+        # Set by share(), the directory every worker writes its totals to
+        self.directory = None
+        self.path = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Metric('counter', name, documentation, labelnames, CounterChild)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name, documentation, labelnames=()):
+        metric = Metric('gauge', name, documentation, labelnames, GaugeChild)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Metric('histogram', name, documentation, labelnames, lambda: HistogramChild(tuple(buckets)))
+        self.metrics.append(metric)
+        return metric
+
+    def share(self, directory, interval=SHARE_INTERVAL_SECONDS):
+        # Called in each worker after the fork. Counts inherited from the master were never
+        # scraped and would be added once per worker, so the worker starts from zero.
+        for metric in self.metrics:
+            metric.reset()
+
+        self.directory = directory
+        self.path = os.path.join(directory, f'{os.getpid()}.json')
+        self.dump()
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name='nexus-metrics', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        # Final totals of an exiting worker, its file stays so counters never go backwards
+        if self._thread:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+            self.dump()
+
+    def _run(self, interval):
+        while not self._stop_event.wait(interval):
+            try:
+                self.dump()
+            except Exception as e:
+                logger.error(f'Error writing metrics to {self.path}: {e}')
+
+    def dump(self):
+        snapshot = {metric.name: [[list(values), totals] for values, totals in metric.totals().items()] for metric in self.metrics}
+
+        # Written aside and renamed, a scrape never reads a half written file
+        temporary = f'{self.path}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(snapshot, file)
+        os.replace(temporary, self.path)
+
+    def _merged(self):
+        # Metric name -> label values -> totals summed over every worker. Counters and histograms
+        # of exited workers still count, their gauges describe a process that is gone.
+        merged = {metric.name: {} for metric in self.metrics}
+        gauges = {metric.name for metric in self.metrics if metric.kind == 'gauge'}
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            alive = _is_alive(int(name[:-len('.json')]))
+            try:
+                with open(os.path.join(self.directory, name)) as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError) as e:
+                logger.warn(f'Skipping metrics file {name}: {e}')
+                continue
+
+            for metric_name, children in snapshot.items():
+                metric_totals = merged.get(metric_name)
+                if metric_totals is None or (metric_name in gauges and not alive):
+                    continue
+                for values, totals in children:
+                    values = tuple(values)
+                    current = metric_totals.get(values)
+                    metric_totals[values] = totals if current is None else [a + b for a, b in zip(current, totals)]
+        return merged
+
+    def render(self):
+        merged = None
+        if self.directory:
+            # This worker's file is brought up to date, the others are at most one interval old
+            self.dump()
+            merged = self._merged()
+
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render(merged[metric.name] if merged else None))
+        return '\n'.join(lines) + '\n'
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+registry = Registry()
+
+http_requests = registry.counter('nexus_http_requests_total', 'HTTP requests handled', ['route', 'entity', 'method', 'status'])
+http_request_seconds = registry.histogram('nexus_http_request_duration_seconds', 'HTTP request latency', ['route', 'entity', 'method'])
+
+db_call_seconds = registry.histogram('nexus_db_call_duration_seconds', 'DatabaseAPI call latency, from connection checkout to release', ['method'])
+db_phase_seconds = registry.histogram('nexus_db_phase_seconds', 'Time per DatabaseAPI call spent in each phase', ['method', 'phase'])
+db_lock_wait_seconds = registry.histogram('nexus_db_lock_wait_seconds', 'Time per DatabaseAPI call spent waiting for the SQLite write lock (BEGIN IMMEDIATE)', ['method'])
+db_rows_written = registry.counter('nexus_db_rows_written_total', 'Rows inserted, updated or deleted', ['method'])
+db_rows_returned = registry.counter('nexus_db_rows_returned_total', 'Rows fetched', ['method'])
+
+ingest_queue_depth = registry.gauge('nexus_ingest_queue_depth', 'Rows waiting in the async ingest queue')
+ingest_enqueued = registry.counter('nexus_ingest_enqueued_total', 'Rows accepted into the async ingest queue')
+ingest_rejected = registry.counter('nexus_ingest_rejected_total', 'Rows rejected with 503 because the ingest queue was full')
+ingest_rows_written = registry.counter('nexus_ingest_rows_written_total', 'Queued rows written to the database')
+ingest_rows_failed = registry.counter('nexus_ingest_rows_failed_total', 'Queued rows dropped after every flush attempt failed')
+ingest_flushes = registry.counter('nexus_ingest_flushes_total', 'Ingest queue flushes')
+ingest_retries = registry.counter('nexus_ingest_flush_retries_total', 'Ingest flushes attempted again after a failure')
+
+
+# ===== SQLite instrumentation
+# Slots of the per-call totals kept on each connection
+CONNECT, EXECUTE, FETCH, COMMIT, LOCK_WAIT, ROWS_WRITTEN, ROWS_RETURNED = range(7)
+PHASES = (('connect', CONNECT), ('execute', EXECUTE), ('fetch', FETCH), ('commit', COMMIT))
+
+
+class _MethodMetrics:
+    # Children for one DatabaseAPI method, looked up once per method name
+    __slots__ = ('call', 'phases', 'lock_wait', 'rows_written', 'rows_returned')
+
+    def __init__(self, method):
+        self.call = db_call_seconds.labels(method)
+        self.phases = tuple((slot, db_phase_seconds.labels(method, phase)) for phase, slot in PHASES)
+        self.lock_wait = db_lock_wait_seconds.labels(method)
+        self.rows_written = db_rows_written.labels(method)
+        self.rows_returned = db_rows_returned.labels(method)
+
+
+_method_metrics = {}
+
+
+def _for_method(method):
+    metrics = _method_metrics.get(method)
+    if metrics is None:
+        metrics = _method_metrics.setdefault(method, _MethodMetrics(method))
+    return metrics
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._executed(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._executed(sql, time.perf_counter() - start)
+
+    def executescript(self, sql_script):
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self.connection.call[EXECUTE] += time.perf_counter() - start
+
+    def _executed(self, sql, elapsed):
+        call = self.connection.call
+        call[EXECUTE] += elapsed
+        # The write lock is taken up front by BEGIN IMMEDIATE, so its time is the lock wait
+        if sql.startswith('BEGIN'):
+            call[LOCK_WAIT] += elapsed
+        # -1 for SELECT and PRAGMA
+        if self.rowcount > 0:
+            call[ROWS_WRITTEN] += self.rowcount
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        call = self.connection.call
+        call[FETCH] += time.perf_counter() - start
+        if row is not None:
+            call[ROWS_RETURNED] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        call = self.connection.call
+        call[FETCH] += time.perf_counter() - start
+        call[ROWS_RETURNED] += len(rows)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        call = self.connection.call
+        call[FETCH] += time.perf_counter() - start
+        call[ROWS_RETURNED] += len(rows)
+        return rows
+
+
+class CallMetrics:
+    # Per-call totals of a pooled connection, reported when the DatabaseAPI call holding it ends.
+    # Shared by the SQLite connection below and the PostgreSQL one in src/postgres.py.
+    def init_call(self):
+        self.call = [0] * 7
+        self.method = None
+        self.call_start = 0.0
+
+    def begin_call(self, method, start):
+        call = self.call
+        for slot in range(7):
+            call[slot] = 0
+        call[CONNECT] = time.perf_counter() - start
+        self.method = method
+        self.call_start = start
+
+    def end_call(self):
+        call = self.call
+        metrics = _for_method(self.method)
+
+        metrics.call.observe(time.perf_counter() - self.call_start)
+        for slot, child in metrics.phases:
+            child.observe(call[slot])
+        if call[LOCK_WAIT]:
+            metrics.lock_wait.observe(call[LOCK_WAIT])
+        if call[ROWS_WRITTEN]:
+            metrics.rows_written.inc(call[ROWS_WRITTEN])
+        if call[ROWS_RETURNED]:
+            metrics.rows_returned.inc(call[ROWS_RETURNED])
+
+
+class InstrumentedConnection(CallMetrics, sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Totals for the DatabaseAPI call currently holding this connection
+        self.init_call()
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            self.call[COMMIT] += time.perf_counter() - start
@@ -1,24 +1,209 @@
+import os
+import shutil
+import tempfile
+
 from flask import Flask
 from src.flask_routes import nexus_routes
 from src.api import DatabaseAPI
-from src.logger import logger
+from src.sharding import ShardedDatabaseAPI
+from src.postgres import PostgresDatabaseAPI, embedded_dsn
+from src.cache import ResponseCache
+from src.stream import EventStream
+from src.json_provider import set_json_provider
+from src.checkpoint import Checkpointer
+from src.ingest import IngestQueue
+from src.pruner import Pruner
+from src.logger import get_logger, start_relay as start_log_relay, stop_relay as stop_log_relay
 import src.constants as constants
+import src.metrics as metrics
+
+logger = get_logger(__name__)
+
+
+def create_database_api(config):
+    database_config = config.get('database') or {}
+
+    options = {
+        'pool_size': database_config.get('pool_size', 8),
+        'pool_timeout': database_config.get('pool_timeout', 30),
+        'instrument': (config.get('metrics') or {}).get('enabled', True)
+    }
+
+    backend = database_config.get('backend', 'sqlite')
+    if backend == 'postgres':
+        # embedded runs a private server in that directory instead of connecting to the dsn
+        postgres_config = database_config.get('postgres') or {}
+        dsn = embedded_dsn(postgres_config['embedded']) if postgres_config.get('embedded') else postgres_config.get('dsn', '')
+        return PostgresDatabaseAPI(dsn, settings=postgres_config.get('settings'),
+                                   partition_days=postgres_config.get('partition_days', 7), **options)
+
+    if backend != 'sqlite':
+        raise ValueError(f'Unknown database backend: {backend}')
+
+    # The common tuning knobs have their own keys, anything else goes under pragmas
+    pragmas = {}
+    for name in ['busy_timeout', 'journal_mode', 'synchronous', 'cache_size', 'mmap_size']:
+        if database_config.get(name) is not None:
+            pragmas[name] = database_config[name]
+    pragmas.update(database_config.get('pragmas') or {})
+    options['pragmas'] = pragmas
+
+    # Sharded storage splits farmers and nodes over nexus-0.db ... nexus-N.db, the shard count
+    # decides where every name lives and can not change once data is written
+    shards = database_config.get('shards', 1)
+    if shards > 1:
+        return ShardedDatabaseAPI([config["database_location"] + f'nexus-{index}.db' for index in range(shards)], **options)
+
+    return DatabaseAPI(config["database_location"] + 'nexus.db', **options)
+
+
+def create_app(config, database_api=None, stream_relay_dir=None, metrics_dir=None):
+    app = Flask(__name__)
+    set_json_provider(app, (config.get('json') or {}).get('encoder', 'auto'))
+
+    app.config['database_api'] = database_api or create_database_api(config)
+    app.config['metrics_enabled'] = (config.get('metrics') or {}).get('enabled', True)
+
+    # Workers share their totals through metrics_dir, so /metrics answers for the whole server
+    # whichever worker takes the scrape
+    if app.config['metrics_enabled'] and metrics_dir:
+        metrics.registry.share(metrics_dir)
+    app.register_blueprint(nexus_routes)
+
+    # Cached GET responses are dropped by the writes of this process, the TTL bounds how long
+    # writes made by other workers (or the master's pruner) can go unnoticed
+    cache_config = config.get('cache') or {}
+    if cache_config.get('enabled', False):
+        response_cache = ResponseCache(
+            max_entries=cache_config.get('max_entries', 1024),
+            ttl_seconds=cache_config.get('ttl_seconds', 5)
+        )
+        app.config['database_api'].add_write_listener(response_cache.invalidate)
+        app.config['response_cache'] = response_cache
+
+    # Inserted rows are pushed to /stream clients as they are written, stream_relay_dir is shared
+    # by the workers of one server so rows written through any of them reach every client
+    stream_config = config.get('stream') or {}
+    if stream_config.get('enabled', False):
+        # The limit is per worker and every stream holds one of the worker's request threads
+        server_config = config.get('server') or {}
+        max_clients = stream_config.get('max_clients', 50)
+        if server_config.get('mode') == 'production' and max_clients >= server_config.get('threads', 4):
+            logger.warn(f'stream.max_clients ({max_clients}) is not below server.threads ({server_config.get("threads", 4)}), '
+                        f'open streams can take every request thread of a worker')
+
+        event_stream = EventStream(
+            max_clients=max_clients,
+            buffer_size=stream_config.get('buffer_size', 1000),
+            heartbeat_seconds=stream_config.get('heartbeat_seconds', 15),
+            relay_dir=stream_relay_dir
+        )
+        app.config['database_api'].add_write_listener(event_stream.publish)
+        app.config['event_stream'] = event_stream
+
+    # In async mode inserts are queued and group committed by a background writer
+    ingest_config = config.get('ingest') or {}
+    if ingest_config.get('mode', 'sync') == 'async':
+        ingest_queue = IngestQueue(
+            app.config['database_api'],
+            max_size=ingest_config.get('queue_size', 10000),
+            flush_interval_ms=ingest_config.get('flush_interval_ms', 50),
+            flush_rows=ingest_config.get('flush_rows', 500)
+        )
+        ingest_queue.start()
+        app.config['ingest_queue'] = ingest_queue
+
+    return app
 
-app = Flask(__name__)
 
 class Nexus:
     def __init__(self, config) -> None:
         self.config = config
 
-        self.database_api = DatabaseAPI(self.config["database_location"] + 'nexus.db')
+        self.database_api = create_database_api(self.config)
+
+        # Every database file has its own WAL to keep in check, server databases manage their own
+        checkpoint_config = (self.config.get('database') or {}).get('checkpoint') or {}
+        self.checkpointers = [
+            Checkpointer(
+                database_api,
+                interval=checkpoint_config.get('interval', 60),
+                truncate_size_mb=checkpoint_config.get('truncate_size_mb', 64)
+            )
+            for database_api in getattr(self.database_api, 'shards', [self.database_api])
+            if database_api.checkpoints_wal
+        ]
+
+        # Deleting history is opt in, retention.tables only applies with retention.enabled set
+        retention_config = self.config.get('retention') or {}
+        self.pruner = Pruner(
+            self.database_api,
+            (retention_config.get('tables') or {}) if retention_config.get('enabled', False) else {},
+            interval=retention_config.get('interval', 300),
+            batch_size=retention_config.get('batch_size', 1000),
+            pause_ms=retention_config.get('pause_ms', 50),
+            vacuum_pages=retention_config.get('vacuum_pages', 1000)
+        )
+        self.vacuum_existing = retention_config.get('vacuum_existing', False)
+
+    def start_maintenance(self) -> None:
+        for checkpointer in self.checkpointers:
+            checkpointer.start()
+        self.pruner.start()
 
     def run(self) -> None:
         logger.info(f'Initializing Nexus {constants.VERSIONS["nexus"]}.')
 
+        # Schema setup and migrations run once here, before any worker starts
         logger.info('Initializing Nexus DB')
-        self.database_api.initialize()
+        self.database_api.initialize(vacuum_existing=self.vacuum_existing)
+
+        server_config = self.config.get('server') or {}
+        mode = server_config.get('mode', 'development')
+
+        # Gunicorn forks its workers inside run_production and an exiting worker unwinds through
+        # the finally blocks below, only the master may clean up
+        master_pid = os.getpid()
+
+        try:
+            if mode == 'production':
+                try:
+                    from src.server import run_production
+                except ImportError:
+                    logger.error('Production mode requires gunicorn, install it with "pip install gunicorn"')
+                    raise
+
+                # Workers relay streamed rows to each other through sockets in this directory,
+                # write their metrics to the second one and send their log records to the master
+                # through the third, so only the master writes and rotates the log file
+                stream_relay_dir = tempfile.mkdtemp(prefix='nexus-stream-')
+                metrics_dir = tempfile.mkdtemp(prefix='nexus-metrics-')
+                log_dir = tempfile.mkdtemp(prefix='nexus-logs-')
+                start_log_relay(log_dir)
+                try:
+                    # The pruner and checkpointers start once the first workers are forked, and the
+                    # master's connections are closed while any worker is forked
+                    run_production(lambda: create_app(self.config, stream_relay_dir=stream_relay_dir, metrics_dir=metrics_dir), server_config,
+                                   database_api=self.database_api, on_started=self.start_maintenance)
+                finally:
+                    if os.getpid() == master_pid:
+                        stop_log_relay()
+                        shutil.rmtree(stream_relay_dir, ignore_errors=True)
+                        shutil.rmtree(metrics_dir, ignore_errors=True)
+                        shutil.rmtree(log_dir, ignore_errors=True)
 
-        app.config['database_api'] = self.database_api
-        app.register_blueprint(nexus_routes)
+            else:
+                app = create_app(self.config, self.database_api)
+                self.start_maintenance()
+                try:
+                    app.run(debug=True, host='0.0.0.0')
+                finally:
+                    if app.config.get('ingest_queue'):
+                        app.config['ingest_queue'].stop()
 
-        app.run(debug=True, host='0.0.0.0')
\ No newline at end of file
+        finally:
+            if os.getpid() == master_pid:
+                self.pruner.stop()
+                for checkpointer in self.checkpointers:
+                    checkpointer.stop()
+                self.database_api.close()
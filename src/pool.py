@@ -0,0 +1,137 @@
+import queue
+import sqlite3
+import threading
+import time
+
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Applied to every new connection unless overridden in the config, busy_timeout goes
+# first so switching the journal mode waits for other connections instead of failing
+DEFAULT_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16384,
+    'mmap_size': 268435456,
+    'journal_size_limit': 67108864
+}
+
+
+class ConnectionPool:
+    def __init__(self, db_location, size=8, timeout=30, pragmas=None, factory=sqlite3.Connection):
+        self.db_location = db_location
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = {**DEFAULT_PRAGMAS, **(pragmas or {})}
+        self.factory = factory
+
+        # LIFO so the most recently used (warmest) connection is handed out first
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+        # Set while suspended, acquire() waits for it and release() closes instead of pooling
+        self._resumed = threading.Event()
+        self._resumed.set()
+        self._drained = threading.Condition(self._lock)
+
+    def _create_connection(self):
+        conn = sqlite3.connect(self.db_location, timeout=self.timeout, check_same_thread=False, factory=self.factory)
+
+        for name, value in self.pragmas.items():
+            if not str(name).replace('_', '').isalnum():
+                raise ValueError(f'Invalid PRAGMA name: {name}')
+            conn.execute(f'PRAGMA {name} = {value}')
+
+        return conn
+
+    def acquire(self):
+        if self._closed:
+            raise sqlite3.ProgrammingError('Connection pool is closed')
+
+        if not self._resumed.wait(self.timeout):
+            raise TimeoutError(f'Timed out after {self.timeout}s waiting for a suspended pool')
+
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        # Open a new connection if we are still below the pool size
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+
+        if create:
+            try:
+                return self._create_connection()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        # Otherwise wait for another thread to hand one back
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f'Timed out after {self.timeout}s waiting for a database connection')
+
+    def release(self, conn):
+        # Never hand out a connection that still holds a transaction (and its locks)
+        if conn.in_transaction:
+            logger.warning('Connection returned to pool with an open transaction, rolling back')
+            conn.rollback()
+
+        if self._closed:
+            conn.close()
+            return
+
+        if not self._resumed.is_set():
+            self._discard(conn)
+            return
+
+        self._idle.put(conn)
+
+    def _discard(self, conn):
+        conn.close()
+        with self._lock:
+            self._created -= 1
+            self._drained.notify_all()
+
+    def suspend(self, timeout=None):
+        # Closes every connection and holds off new ones until resume(). Waits for the connections
+        # in use to be handed back, so nothing is open while the process forks.
+        self._resumed.clear()
+        deadline = time.monotonic() + (timeout or self.timeout)
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+
+            with self._lock:
+                if self._created == 0:
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning(f'{self._created} connections to {self.db_location} still in use while suspended')
+                    return
+                self._drained.wait(min(remaining, 0.1))
+
+    def resume(self):
+        self._resumed.set()
+
+    def close(self):
+        self._closed = True
+
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
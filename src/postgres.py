@@ -0,0 +1,618 @@
+import functools
+import json
+import os
+import re
+import threading
+import time
+import weakref
+
+try:
+    import psycopg
+    import psycopg_pool
+    from psycopg.adapt import Dumper
+    from psycopg.types.numeric import FloatLoader
+except ImportError:
+    psycopg = None
+    Dumper = object
+
+from src.api import DatabaseAPI
+from src.logger import get_logger
+from src.metrics import CallMetrics, EXECUTE, FETCH, COMMIT, ROWS_WRITTEN, ROWS_RETURNED
+import src.rollups as rollups
+import src.schema as schema
+import src.state as state
+import src.timestamps as timestamps
+
+logger = get_logger(__name__)
+
+# PostgreSQL storage backend. The queries, validation, pagination and response building of
+# DatabaseAPI are reused as they are, only the SQLite specifics are replaced: a psycopg
+# connection pool, PostgreSQL DDL, COPY for bulk ingest and time partitioned plots and
+# consensus (TimescaleDB hypertables when the extension is available, native range
+# partitions otherwise). Datetimes stay integer microseconds, see src/timestamps.py.
+
+
+# ===== SQL
+# DatabaseAPI writes ? and :name parameters, psycopg expects %s and %(name)s. A literal %
+# (the modulo of the rollup buckets) has to be doubled, even inside quotes.
+NAMED_PARAMETER = re.compile(r'(?<![:\w]):([A-Za-z_]\w*)')
+QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+
+
+@functools.lru_cache(maxsize=1024)
+def translate(sql):
+    # Split on string literals and quoted identifiers, the odd parts are quoted and keep their ? and :name
+    parts = QUOTED.split(sql.replace('%', '%%'))
+    return ''.join(part if index % 2 else NAMED_PARAMETER.sub(r'%(\1)s', part.replace('?', '%s'))
+                   for index, part in enumerate(parts))
+
+
+# SQLite column types -> PostgreSQL, SQLite integers are 64 bit and REAL is a double
+column_types = {'INTEGER': 'BIGINT', 'INT': 'BIGINT', 'REAL': 'DOUBLE PRECISION'}
+COLUMN_TYPE = re.compile(r'\b(INTEGER|INT|REAL)\b')
+
+
+def table_sql(sqlite_sql):
+    # The rollup and state table DDL of src/rollups.py and src/state.py with PostgreSQL types and
+    # a rowid, which keyset pagination and pruning order rows by
+    sql = COLUMN_TYPE.sub(lambda match: column_types[match.group(1)], sqlite_sql)
+    return sql.replace(', UNIQUE (', ', rowid BIGSERIAL, UNIQUE (')
+
+
+def insert_sql(entity):
+    sql = schema.insert_sql(entity)
+    if schema.schemas[entity]['ignore_duplicates']:
+        return sql.replace('INSERT OR IGNORE INTO', 'INSERT INTO') + ' ON CONFLICT DO NOTHING'
+    return sql
+
+
+def copy_sql(entity):
+    return f"COPY {schema.schemas[entity]['table']} ({', '.join(schema.columns(entity))}) FROM STDIN"
+
+
+def state_backfill_sql(entity):
+    # PostgreSQL has no bare columns next to max(), DISTINCT ON keeps the newest row per series
+    entity_state = state.states[entity]
+    key = ', '.join(entity_state['key'])
+    columns = state.select_columns(entity)
+    return (f"INSERT INTO {entity_state['table']} ({columns}) "
+            f"SELECT DISTINCT ON ({key}) {columns} FROM {entity_state['source']} ORDER BY {key}, {entity_state['datetime']} DESC")
+
+
+# ===== CONNECTIONS
+class UntypedIntDumper(Dumper):
+    # Integers are sent without a type, like SQLite's loose typing the server casts them to
+    # whatever they meet, so Farm Index 3 matches the TEXT farm_index columns as well
+    def dump(self, obj):
+        return str(obj).encode()
+
+    def quote(self, obj):
+        # Inlined into statements psycopg composes itself (FETCH of a server side cursor)
+        value = self.dump(obj)
+        return b' ' + value if obj < 0 else value
+
+
+class PostgresCursor:
+    # The parts of the sqlite3 cursor DatabaseAPI uses, timed like src/metrics.py InstrumentedCursor
+    def __init__(self, connection, name=None):
+        self.connection = connection
+        self.cursor = connection.raw.cursor(name) if name else connection.raw.cursor()
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            self.cursor.execute(translate(sql), parameters)
+        finally:
+            self._executed(time.perf_counter() - start)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            self.cursor.executemany(translate(sql), seq_of_parameters)
+        finally:
+            self._executed(time.perf_counter() - start)
+        return self
+
+    def copy_rows(self, sql, rows):
+        # COPY ... FROM STDIN, one round trip for the whole batch
+        start = time.perf_counter()
+        try:
+            with self.cursor.copy(sql) as copy:
+                for row in rows:
+                    copy.write_row(row)
+        finally:
+            self._executed(time.perf_counter() - start)
+
+    def _executed(self, elapsed):
+        call = self.connection.call
+        call[EXECUTE] += elapsed
+        # rowcount is also set for SELECT, only count what the statement changed
+        status = self.cursor.statusmessage or ''
+        if status.startswith(('INSERT', 'UPDATE', 'DELETE', 'COPY')) and self.cursor.rowcount > 0:
+            call[ROWS_WRITTEN] += self.cursor.rowcount
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = self.cursor.fetchone()
+        call = self.connection.call
+        call[FETCH] += time.perf_counter() - start
+        if row is not None:
+            call[ROWS_RETURNED] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = self.cursor.fetchmany(size or self.cursor.arraysize)
+        call = self.connection.call
+        call[FETCH] += time.perf_counter() - start
+        call[ROWS_RETURNED] += len(rows)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = self.cursor.fetchall()
+        call = self.connection.call
+        call[FETCH] += time.perf_counter() - start
+        call[ROWS_RETURNED] += len(rows)
+        return rows
+
+    def close(self):
+        self.cursor.close()
+
+
+class PostgresConnection(CallMetrics):
+    def __init__(self, raw):
+        self.raw = raw
+        # Totals for the DatabaseAPI call currently holding this connection
+        self.init_call()
+
+    def cursor(self, name=None):
+        # A named cursor lives on the server and streams its rows instead of fetching them all
+        return PostgresCursor(self, name)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            self.raw.commit()
+        finally:
+            self.call[COMMIT] += time.perf_counter() - start
+
+    def rollback(self):
+        self.raw.rollback()
+
+    @property
+    def in_transaction(self):
+        return self.raw.info.transaction_status != psycopg.pq.TransactionStatus.IDLE
+
+
+# Pools of this process, see _after_fork
+_pools = weakref.WeakSet()
+
+
+def _after_fork():
+    # A forked child (a gunicorn worker) inherits the parent's connections, and closing one there
+    # would end the parent's session on the server. Pointing the sockets at /dev/null first lets
+    # the child drop them without touching the parent's.
+    devnull = os.open(os.devnull, os.O_RDWR)
+    try:
+        for pool in list(_pools):
+            for conn in list(pool.connections):
+                try:
+                    os.dup2(devnull, conn.pgconn.socket)
+                except Exception:
+                    pass
+            _pools.discard(pool)
+    finally:
+        os.close(devnull)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+class PostgresPool:
+    # The acquire/release interface of src/pool.py ConnectionPool on top of psycopg_pool
+    def __init__(self, dsn, size=8, timeout=30, settings=None):
+        self.settings = settings or {}
+        self.connections = weakref.WeakSet()
+        self.pool = psycopg_pool.ConnectionPool(dsn, min_size=1, max_size=size, timeout=timeout,
+                                                configure=self._configure, name='nexus', open=True)
+        _pools.add(self)
+
+    def _configure(self, conn):
+        self.connections.add(conn)
+
+        # Averages and rates come back as float like on SQLite instead of Decimal
+        conn.adapters.register_loader('numeric', FloatLoader)
+        conn.adapters.register_dumper(int, UntypedIntDumper)
+
+        # Any server setting applied to every connection when it is opened
+        for name, value in self.settings.items():
+            conn.execute("SELECT set_config(%s, %s, false)", (name, str(value)))
+        conn.commit()
+
+    def acquire(self):
+        return PostgresConnection(self.pool.getconn())
+
+    def release(self, conn):
+        # Reads leave their transaction open, ending it here hands the connection back clean
+        if conn.in_transaction:
+            conn.rollback()
+        self.pool.putconn(conn.raw)
+
+    def close(self):
+        self.pool.close()
+
+    # A forked child detaches the connections it inherits in _after_fork, so they stay open
+    def suspend(self):
+        pass
+
+    def resume(self):
+        pass
+
+
+# Embedded servers started by this process, kept referenced so they keep running
+_embedded_servers = {}
+
+
+def embedded_dsn(data_dir):
+    # A private PostgreSQL server in data_dir from the pgserver package, for development and tests
+    try:
+        import pgserver
+    except ImportError:
+        raise ImportError('Embedded PostgreSQL requires pgserver, install it with "pip install pgserver"')
+
+    if data_dir not in _embedded_servers:
+        logger.info(f'Starting embedded PostgreSQL in {data_dir}')
+        _embedded_servers[data_dir] = pgserver.get_server(data_dir)
+    return _embedded_servers[data_dir].get_uri()
+
+
+def stop_embedded(data_dir):
+    # Stops a server started by embedded_dsn(), otherwise it is stopped when the process exits
+    server = _embedded_servers.pop(data_dir, None)
+    if server is not None:
+        server.cleanup()
+
+
+# ===== DATABASE API
+class PostgresDatabaseAPI(DatabaseAPI):
+    # PostgreSQL checkpoints its own WAL
+    checkpoints_wal = False
+
+    # Tables and their columns. Tables without an id column get a rowid, every table needs a
+    # unique column to order rows of equal datetime by.
+    tables = {
+        'farmers': ['farmer_name TEXT', 'farmer_piece_cache_status TEXT', 'farmer_piece_cache_percent DOUBLE PRECISION',
+                    'farmer_workers BIGINT', 'creation_datetime BIGINT', 'rowid BIGSERIAL PRIMARY KEY'],
+        'nodes': ['node_name TEXT', 'node_status TEXT', 'creation_datetime BIGINT', 'rowid BIGSERIAL PRIMARY KEY'],
+        'farms': ['farm_id TEXT', 'farmer_name TEXT', 'farm_index BIGINT', 'farm_public_key TEXT', 'farm_allocated_space_gib DOUBLE PRECISION',
+                  'farm_directory TEXT', 'farm_status TEXT', 'creation_datetime BIGINT', 'rowid BIGSERIAL PRIMARY KEY'],
+        'farmer_events': ['event_id BIGSERIAL PRIMARY KEY', 'farmer_name TEXT', 'event_type TEXT', 'event_data TEXT',
+                          'event_datetime BIGINT', 'event_hash BIGINT'],
+        'node_events': ['event_id BIGSERIAL PRIMARY KEY', 'node_name TEXT', 'event_type TEXT', 'event_data TEXT',
+                        'event_datetime BIGINT', 'event_hash BIGINT'],
+        # Partitioned tables can only have unique keys that include the datetime, so no primary key
+        'plots': ['plot_id BIGSERIAL', 'farmer_name TEXT', 'farm_index TEXT', 'plot_percentage DOUBLE PRECISION',
+                  'plot_current_sector BIGINT', 'plot_type BIGINT', 'plot_datetime BIGINT'],
+        'rewards': ['reward_id BIGSERIAL PRIMARY KEY', 'farmer_name TEXT', 'farm_index TEXT', 'reward_hash TEXT',
+                    'reward_type TEXT', 'reward_datetime BIGINT'],
+        'errors': ['error_id BIGSERIAL PRIMARY KEY', 'farmer_name TEXT', 'error TEXT', 'error_datetime BIGINT'],
+        'claims': ['claim_id BIGSERIAL PRIMARY KEY', 'node_name TEXT', 'slot BIGINT', 'claim_type TEXT', 'claim_datetime BIGINT'],
+        'consensus': ['consensus_id BIGSERIAL', 'node_name TEXT', 'status TEXT', 'peers BIGINT', 'best BIGINT', 'target BIGINT',
+                      'finalized BIGINT', 'bps DOUBLE PRECISION', 'down_speed_kib DOUBLE PRECISION', 'up_speed_kib DOUBLE PRECISION',
+                      'consensus_datetime BIGINT']
+    }
+
+    row_ids = {
+        'farmer_events': 'event_id',
+        'node_events': 'event_id',
+        'plots': 'plot_id',
+        'rewards': 'reward_id',
+        'errors': 'error_id',
+        'claims': 'claim_id',
+        'consensus': 'consensus_id'
+    }
+
+    # Time series split into one partition (or TimescaleDB chunk) per period of their datetime
+    partitioned = {
+        'plots': 'plot_datetime',
+        'consensus': 'consensus_datetime'
+    }
+
+    rollup_table_statements = {key: table_sql(sql) for key, sql in DatabaseAPI.rollup_table_statements.items()}
+    state_table_statements = {entity: table_sql(sql) for entity, sql in DatabaseAPI.state_table_statements.items()}
+    state_backfill_statements = {entity: state_backfill_sql(entity) for entity in state.states}
+
+    insert_statements = {entity: insert_sql(entity) for entity in schema.schemas}
+    farm_statements = [DatabaseAPI.farm_statements[0], insert_statements['farm']]
+
+    # Append-only entities are written with COPY, see _insert_rows
+    copy_statements = {entity: copy_sql(entity) for entity, entity_schema in schema.schemas.items() if not entity_schema['ignore_duplicates']}
+
+    rollup_statements = {
+        (entity, resolution): rollups.upsert_sql(entity, resolution, 'LEAST', 'GREATEST')
+        for entity in rollups.rollups
+        for resolution in rollups.resolutions
+    }
+
+    explain = ("EXPLAIN ", 0)
+
+    def __init__(self, dsn, pool_size=8, pool_timeout=30, settings=None, instrument=True, partition_days=7):
+        if psycopg is None:
+            raise ImportError('The postgres backend requires psycopg, install it with "pip install psycopg[binary] psycopg_pool"')
+
+        # Only the host and database are logged, the DSN may hold a password
+        info = psycopg.conninfo.conninfo_to_dict(dsn)
+        self.db_location = f"postgresql://{info.get('host', 'localhost')}/{info.get('dbname', '')}"
+        self.instrument = instrument
+        self.pool = PostgresPool(dsn, size=pool_size, timeout=pool_timeout, settings=settings)
+
+        # Each thread checks out its own connection, so concurrent requests never share a handle
+        self._local = threading.local()
+
+        # Called as listener(action, table, rows) after every committed write
+        self.write_listeners = []
+
+        self.partition_size = int(partition_days * timestamps.MICROS_PER_DAY)
+        # Table -> 'partitions', 'hypertable' or 'table', and the partition starts known to exist
+        self._layouts = {}
+        self._partitions = {table: set() for table in self.partitioned}
+
+    def checkpoint(self, mode='PASSIVE'):
+        return {
+            "Success": True,
+            "Message": "PostgreSQL checkpoints its own WAL"
+        }
+
+    def initialize(self, vacuum_existing=False):
+        logger.info(f'initializing DB at location: {self.db_location}')
+
+        self.connect()
+        try:
+            cursor = self.conn.cursor()
+            timescale = self._enable_timescale(cursor)
+
+            for table, columns in self.tables.items():
+                logger.info(f'initializing "{table}" Table')
+                exists = self._table_exists(cursor, table)
+                sql = f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns)})"
+                if table in self.partitioned and not timescale:
+                    sql += f" PARTITION BY RANGE ({self.partitioned[table]})"
+                cursor.execute(sql)
+
+                if table in self.partitioned and timescale and not exists:
+                    cursor.execute("SELECT create_hypertable(CAST(? AS regclass), ?, chunk_time_interval => CAST(? AS BIGINT), if_not_exists => TRUE)",
+                                   (table, self.partitioned[table], self.partition_size))
+
+            self._migrate(cursor)
+            self._create_indexes(cursor)
+            self._create_rollups(cursor)
+            self._create_state_tables(cursor)
+
+            self.conn.commit()
+
+        finally:
+            self.disconnect()
+
+    def _enable_timescale(self, cursor):
+        # Hypertables when TimescaleDB is installed on the server, native partitions otherwise
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'timescaledb')")
+        if not cursor.fetchone()[0]:
+            logger.info('TimescaleDB is not available, using native partitions')
+            return False
+
+        try:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS timescaledb")
+            self.conn.commit()
+            return True
+        except Exception as e:
+            self.conn.rollback()
+            logger.warn(f'TimescaleDB could not be enabled, using native partitions: {e}')
+            return False
+
+    def _table_exists(self, cursor, table):
+        cursor.execute("SELECT to_regclass(?) IS NOT NULL", (table,))
+        return cursor.fetchone()[0]
+
+    def _migrate(self, cursor):
+        # Typed columns over the JSON payload, stored since PostgreSQL has no virtual generated columns
+        for table, fields in self.event_fields.items():
+            cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = ?", (table,))
+            columns = [row[0] for row in cursor.fetchall()]
+            for field, (column, column_type) in fields.items():
+                if column not in columns:
+                    logger.info(f'Adding "{column}" column to "{table}"')
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_types[column_type]} "
+                                   f"GENERATED ALWAYS AS ({self._typed_payload_expression(field, column_type)}) STORED")
+
+    def _analyze(self, cursor):
+        cursor.execute("ANALYZE")
+
+    def _payload_expression(self, field):
+        # Field names end up inside the SQL, only plain names are allowed
+        if not field.replace(' ', '').replace('_', '').isalnum():
+            raise ValueError(f"Invalid payload field: {field}")
+        return f"(CAST(event_data AS jsonb) -> '{field}')"
+
+    def _typed_payload_expression(self, field, column_type):
+        # Numbers and booleans convert, anything else is NULL like json_extract() into a typed column
+        value = self._payload_expression(field)
+        text = f"(CAST(event_data AS jsonb) ->> '{field}')"
+        return (f"CASE jsonb_typeof({value}) "
+                f"WHEN 'number' THEN CAST(CAST({text} AS NUMERIC) AS {column_types[column_type]}) "
+                f"WHEN 'boolean' THEN CAST(CAST({text} AS BOOLEAN) AS INTEGER) END")
+
+    def _payload_conditions(self, table, payload):
+        # Numbers compare against the generated columns (and their indexes), anything else as JSON
+        conditions = []
+        params = []
+        for field, value in payload or ():
+            if field in self.event_fields[table] and isinstance(value, (int, float)):
+                conditions.append(f"{self.event_fields[table][field][0]} = ?")
+                params.append(int(value) if isinstance(value, bool) else value)
+            else:
+                conditions.append(f"{self._payload_expression(field)} = CAST(? AS jsonb)")
+                params.append(json.dumps(value))
+        return conditions, params
+
+    # ===== INSERT
+    def _begin_write(self, cursor):
+        # Rows are locked as they are written, there is no database wide write lock to take up front
+        pass
+
+    def _insert_rows(self, cursor, entity, rows):
+        table = self.insert_tables[entity]
+        if table not in self.partitioned or self._layout(cursor, table) != 'partitions':
+            return self._write_table_rows(cursor, entity, rows)
+
+        self._create_partitions(cursor, table, rows)
+
+        # Another process (the master's pruner) may have dropped a partition this one still
+        # believes exists. The insert then finds no partition, so the known set is read again.
+        cursor.execute("SAVEPOINT nexus_partitions")
+        try:
+            count = self._write_table_rows(cursor, entity, rows)
+        except psycopg.errors.CheckViolation:
+            cursor.execute("ROLLBACK TO SAVEPOINT nexus_partitions")
+            logger.info(f'Missing "{table}" partition, reading the partitions again')
+            self._partitions[table].clear()
+            self._create_partitions(cursor, table, rows)
+            count = self._write_table_rows(cursor, entity, rows)
+        cursor.execute("RELEASE SAVEPOINT nexus_partitions")
+        return count
+
+    def _write_table_rows(self, cursor, entity, rows):
+        # COPY beats INSERT for batches, single rows keep the prepared INSERT
+        if entity in self.copy_statements and len(rows) > 1:
+            columns = schema.columns(entity)
+            cursor.copy_rows(self.copy_statements[entity], [[row[column] for column in columns] for row in rows])
+            return len(rows)
+
+        return super()._insert_rows(cursor, entity, rows)
+
+    def _layout(self, cursor, table):
+        # 'partitions' for native range partitions, 'hypertable' for TimescaleDB, 'table' otherwise
+        layout = self._layouts.get(table)
+        if layout is None:
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(?))", (table,))
+            if cursor.fetchone()[0]:
+                layout = 'partitions'
+            else:
+                cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'timescaledb')")
+                layout = 'table'
+                if cursor.fetchone()[0]:
+                    cursor.execute("SELECT EXISTS (SELECT 1 FROM timescaledb_information.hypertables WHERE hypertable_name = ?)", (table,))
+                    if cursor.fetchone()[0]:
+                        layout = 'hypertable'
+            self._layouts[table] = layout
+        return layout
+
+    def _partition_bounds(self, cursor, table):
+        # Partition name -> (start, end) from the bound expression, e.g. FOR VALUES FROM ('0') TO ('100')
+        cursor.execute("""SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+                          FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                          WHERE i.inhparent = to_regclass(?)""", (table,))
+        bounds = {}
+        for name, bound in cursor.fetchall():
+            values = re.findall(r"'(-?\d+)'", bound)
+            if len(values) == 2:
+                bounds[name] = (int(values[0]), int(values[1]))
+        return bounds
+
+    def _create_partitions(self, cursor, table, rows):
+        # Partitions are created as rows for a new period arrive. The partition length decides the
+        # bounds and can not change once data is written.
+        datetime_column = self.partitioned[table]
+        known = self._partitions[table]
+        starts = {row[datetime_column] - row[datetime_column] % self.partition_size for row in rows} - known
+        if not starts:
+            return
+
+        # Writers in other workers creating the same partition wait here instead of failing
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(?))", (table,))
+        existing = {start for start, _ in self._partition_bounds(cursor, table).values()}
+        for start in sorted(starts):
+            if start not in existing:
+                logger.info(f'Creating partition "{table}_p{start}"')
+                cursor.execute(f"CREATE TABLE {table}_p{start} PARTITION OF {table} FOR VALUES FROM ({start}) TO ({start + self.partition_size})")
+            known.add(start)
+
+    # ===== EXPORT
+    def _export_cursor(self):
+        return self.conn.cursor(name='nexus_export')
+
+    # ===== PRUNE
+    def prune(self, table, cutoff_datetime, batch_size=1000):
+        # Partitions and chunks entirely past the cutoff are dropped whole, row deletes only
+        # have to clear the one the cutoff falls in
+        if table in self.partitioned:
+            if isinstance(cutoff_datetime, str):
+                cutoff_datetime = timestamps.parse(cutoff_datetime)
+
+            response = self._drop_partitions(table, cutoff_datetime)
+            if not response['Success']:
+                return response
+
+        return super().prune(table, cutoff_datetime, batch_size)
+
+    def _drop_partitions(self, table, cutoff_datetime):
+        try:
+            self.connect()
+            cursor = self.conn.cursor()
+
+            dropped = 0
+            layout = self._layout(cursor, table)
+            if layout == 'hypertable':
+                cursor.execute("SELECT drop_chunks(CAST(? AS regclass), older_than => CAST(? AS BIGINT))", (table, cutoff_datetime))
+                dropped = len(cursor.fetchall())
+            elif layout == 'partitions':
+                for name, (start, end) in self._partition_bounds(cursor, table).items():
+                    if end <= cutoff_datetime:
+                        cursor.execute(f"DROP TABLE {name}")
+                        self._partitions[table].discard(start)
+                        dropped += 1
+
+            self.conn.commit()
+            if dropped:
+                logger.info(f'Dropped {dropped} "{table}" partitions older than {timestamps.to_string(cutoff_datetime)}')
+                self._notify_write('delete', table)
+
+            response = {
+                'Success': True,
+                'Data': {
+                    'Dropped Partitions': dropped
+                }
+            }
+
+        except Exception as e:
+            logger.error(f'Error dropping {table} partitions: {e}')
+            if self.conn:
+                self.conn.rollback()
+            response = {
+                "Success": False,
+                'Message': f'Error dropping {table} partitions: {e}'
+            }
+
+        finally:
+            self.disconnect()
+
+        return response
+
+    def incremental_vacuum(self, pages):
+        # Autovacuum reclaims the space of deleted rows
+        return {
+            'Success': True,
+            'Data': {
+                'Freed Pages': 0
+            }
+        }
@@ -0,0 +1,72 @@
+import threading
+import time
+
+from src.logger import get_logger
+import src.timestamps as timestamps
+
+logger = get_logger(__name__)
+
+
+class Pruner:
+    def __init__(self, database_api, tables, interval=300, batch_size=1000, pause_ms=50, vacuum_pages=1000):
+        self.database_api = database_api
+        # Table -> days to keep, None keeps everything
+        self.tables = {table: days for table, days in tables.items() if days is not None}
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause_ms / 1000
+        self.vacuum_pages = vacuum_pages
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        for table in self.tables:
+            if table not in database_api.retention_columns:
+                raise ValueError(f'Retention is not supported for table: {table}')
+
+    def start(self):
+        if not self.tables:
+            return
+
+        policies = ', '.join(f'{table} {days}d' for table, days in self.tables.items())
+        logger.info(f'Starting pruner every {self.interval}s: {policies}')
+        self._thread = threading.Thread(target=self._run, name='nexus-pruner', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        # Prune once right away, then on every interval
+        while True:
+            self.prune()
+            if self._stop_event.wait(self.interval):
+                break
+
+    def prune(self):
+        now = timestamps.now()
+        total = 0
+
+        for table, days in self.tables.items():
+            cutoff = now - int(days * timestamps.MICROS_PER_DAY)
+
+            # Small batches with a pause in between so the write lock is never held for long
+            while not self._stop_event.is_set():
+                response = self.database_api.prune(table, cutoff, self.batch_size)
+                if not response['Success']:
+                    break
+
+                deleted = response['Data']['Deleted Rows']
+                total += deleted
+                if deleted < self.batch_size:
+                    break
+                time.sleep(self.pause)
+
+        if total:
+            logger.info(f'Pruned {total} expired rows')
+            if self.vacuum_pages:
+                self.database_api.incremental_vacuum(self.vacuum_pages)
+
+        return total
@@ -0,0 +1,122 @@
+import src.timestamps as timestamps
+
+# Downsampled copies of the consensus and plot time series. Every raw row is folded into
+# a 1 minute, 1 hour and 1 day bucket per series as it is written, keeping min/max/sum/count/last
+# for each metric so charts over long ranges never have to read the raw rows.
+rollups = {
+    'consensus': {
+        'table': 'consensus',
+        'datetime': 'consensus_datetime',
+        'group': {'node_name': 'TEXT'},
+        'metrics': ['peers', 'best', 'target', 'finalized', 'bps', 'down_speed_kib', 'up_speed_kib']
+    },
+    'plot': {
+        'table': 'plots',
+        'datetime': 'plot_datetime',
+        'group': {'farmer_name': 'TEXT', 'farm_index': 'TEXT', 'plot_type': 'INTEGER'},
+        'metrics': ['plot_percentage', 'plot_current_sector']
+    }
+}
+
+# Length of each bucket, used to truncate timestamps and to turn counts into hourly rates
+resolution_seconds = {
+    '1m': 60,
+    '1h': 3600,
+    '1d': 86400
+}
+
+# Resolution -> bucket length in the microseconds datetimes are stored as
+resolutions = {resolution: seconds * timestamps.MICROS_PER_SECOND for resolution, seconds in resolution_seconds.items()}
+
+# With auto, the finest resolution that keeps a series under this many points is used
+MAX_AUTO_POINTS = 1000
+
+
+def rollup_table(entity, resolution):
+    return f"{rollups[entity]['table']}_rollup_{resolution}"
+
+
+def bucket(micros, resolution):
+    # Wall-clock microseconds, so whole days and hours start at local midnight and on the hour
+    return micros - micros % resolutions[resolution]
+
+
+def bucket_sql(column, resolution):
+    # SQL expression doing the same truncation as bucket()
+    return f"({column} - {column} % {resolutions[resolution]})"
+
+
+def create_table_sql(entity, resolution):
+    rollup = rollups[entity]
+    # Group columns keep the raw table's types so filters compare the same way
+    columns = [f'{column} {column_type}' for column, column_type in rollup['group'].items()]
+    columns += ['bucket_datetime INTEGER', 'samples INTEGER', 'last_datetime INTEGER']
+    for metric in rollup['metrics']:
+        columns += [f'{metric}_min REAL', f'{metric}_max REAL', f'{metric}_sum REAL', f'{metric}_count INTEGER', f'{metric}_last REAL']
+
+    key = ', '.join(list(rollup['group']) + ['bucket_datetime'])
+    return f"CREATE TABLE IF NOT EXISTS {rollup_table(entity, resolution)} ({', '.join(columns)}, UNIQUE ({key}))"
+
+
+def create_index_sql(entity, resolution):
+    table = rollup_table(entity, resolution)
+    return f"CREATE INDEX IF NOT EXISTS idx_{table}_bucket_datetime ON {table} (bucket_datetime)"
+
+
+def upsert_sql(entity, resolution, least='min', greatest='max'):
+    # least and greatest name the two argument min() and max(), LEAST and GREATEST on PostgreSQL
+    rollup = rollups[entity]
+    table = rollup_table(entity, resolution)
+
+    columns = list(rollup['group']) + ['bucket_datetime', 'samples', 'last_datetime']
+    values = [f':{column}' for column in rollup['group']] + [':bucket_datetime', '1', f":{rollup['datetime']}"]
+    updates = [f'samples = {table}.samples + 1']
+
+    for metric in rollup['metrics']:
+        current = f'{table}.{metric}'
+        columns += [f'{metric}_min', f'{metric}_max', f'{metric}_sum', f'{metric}_count', f'{metric}_last']
+        # The cast gives the parameter a type when it is NULL, which PostgreSQL needs to compare it
+        values += [f':{metric}', f':{metric}', f':{metric}', f'CASE WHEN CAST(:{metric} AS DOUBLE PRECISION) IS NULL THEN 0 ELSE 1 END', f':{metric}']
+
+        # Optional metrics (target, bps) can be NULL, which min() and max() would propagate
+        updates += [
+            f'{metric}_min = {least}(coalesce({current}_min, excluded.{metric}_min), coalesce(excluded.{metric}_min, {current}_min))',
+            f'{metric}_max = {greatest}(coalesce({current}_max, excluded.{metric}_max), coalesce(excluded.{metric}_max, {current}_max))',
+            f'{metric}_sum = coalesce({current}_sum, 0) + coalesce(excluded.{metric}_sum, 0)',
+            f'{metric}_count = {current}_count + excluded.{metric}_count',
+            f'{metric}_last = CASE WHEN excluded.last_datetime >= {table}.last_datetime THEN excluded.{metric}_last ELSE {current}_last END'
+        ]
+
+    # SET expressions all see the previous row, so the CASEs above compare against the old last_datetime
+    updates.append(f'last_datetime = {greatest}({table}.last_datetime, excluded.last_datetime)')
+
+    return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(values)}) "
+            f"ON CONFLICT ({', '.join(list(rollup['group']) + ['bucket_datetime'])}) DO UPDATE SET {', '.join(updates)}")
+
+
+def select_columns(entity):
+    # Group columns, then samples and min/max/avg/last per metric, matching keys['<Entity> Rollup']
+    rollup = rollups[entity]
+    columns = list(rollup['group']) + ['bucket_datetime', 'samples']
+    for metric in rollup['metrics']:
+        # NULLIF makes a series that never reported the metric average to NULL instead of failing on PostgreSQL
+        columns += [f'{metric}_min', f'{metric}_max', f'{metric}_sum / NULLIF({metric}_count, 0)', f'{metric}_last']
+    return ', '.join(columns)
+
+
+def pick_resolution(resolution, start_time, end_time):
+    if resolution != 'auto':
+        return resolution
+
+    try:
+        minutes = (timestamps.parse_bound(end_time) - timestamps.parse_bound(start_time)) / timestamps.MICROS_PER_MINUTE
+    except ValueError:
+        return '1d'
+
+    if minutes <= 60:
+        return 'raw'
+    if minutes <= MAX_AUTO_POINTS:
+        return '1m'
+    if minutes / 60 <= MAX_AUTO_POINTS:
+        return '1h'
+    return '1d'
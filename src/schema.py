@@ -0,0 +1,277 @@
+import json
+
+from src.constants import keys
+from src.helpers import Helpers
+import src.timestamps as timestamps
+
+# Insert schema of every entity. Fields are named by their display key in src/constants.keys,
+# the column is the key in snake case unless given. Each field reads one key of the payload,
+# either at the top level or inside its "Data" object, and is checked for presence and type.
+# The INSERT statements and the validation below are all built from this.
+
+
+def field(key, source, field_type='any', required=True, nested=True, column=None):
+    # required is True, False, or a function of the prepared row for conditional fields
+    return {
+        'key': key,
+        'column': column or key.lower().replace(' ', '_'),
+        'source': source,
+        'nested': nested,
+        'type': field_type,
+        'required': required
+    }
+
+
+schemas = {
+    'farmer': {
+        'table': 'farmers',
+        'keys': 'Farmer',
+        'ignore_duplicates': True,
+        'fields': [
+            field('Farmer Name', 'Farmer Name', 'text', nested=False)
+        ],
+        'created': 'creation_datetime',
+        'missing': 'No Farmer Name Provided',
+        'messages': ('{farmer_name} Added to Database', 'Farmer {farmer_name} exists, no changes needed')
+    },
+    'node': {
+        'table': 'nodes',
+        'keys': 'Node',
+        'ignore_duplicates': True,
+        'fields': [
+            field('Node Name', 'Node Name', 'text', nested=False),
+            field('Node Status', 'Node Status', required=False, nested=False)
+        ],
+        'created': 'creation_datetime',
+        'missing': 'No Node Name Provided',
+        'messages': ('{node_name} Added to Database', 'Node {node_name} exists, no changes needed')
+    },
+    'farm': {
+        'table': 'farms',
+        'keys': 'Farm',
+        'ignore_duplicates': True,
+        'fields': [
+            field('Farm ID', 'Farm ID'),
+            field('Farm Index', 'Farm Index'),
+            field('Farmer Name', 'Farmer Name', 'text', nested=False),
+            field('Farm Status', 'Farm Status', required=False)
+        ],
+        'created': 'creation_datetime',
+        'missing': 'Farm ID, Farmer Name, and Farm Index is required',
+        'messages': ('Inserted new farm with id of {farm_id}, farmer_name of {farmer_name}, farm_status of {farm_status} and index of {farm_index}',
+                     'Complete match exists, no need to insert')
+    },
+    'farmer_event': {
+        'table': 'farmer_events',
+        'keys': 'Farm Event',
+        'ignore_duplicates': True,
+        'fields': [
+            field('Farmer Name', 'Farmer Name', 'text', nested=False),
+            field('Event Datetime', 'Datetime', 'datetime', nested=False),
+            field('Event Type', 'Event Type', 'text', nested=False),
+            field('Event Data', 'Data', 'json', nested=False)
+        ],
+        # Identical events are told apart from new ones by this digest of event_data
+        'hash': ('event_hash', 'event_data'),
+        'messages': ('Successfully inserted farmer event', 'Event already exists'),
+        'inserted_flag': 'Inserted Event'
+    },
+    'node_event': {
+        'table': 'node_events',
+        'keys': 'Node Event',
+        'ignore_duplicates': True,
+        'fields': [
+            field('Node Name', 'Node Name', 'text', nested=False),
+            field('Event Datetime', 'Datetime', 'datetime', nested=False),
+            field('Event Type', 'Event Type', 'text', nested=False),
+            field('Event Data', 'Data', 'json', nested=False)
+        ],
+        'hash': ('event_hash', 'event_data'),
+        'messages': ('Successfully inserted node event', 'Event already exists'),
+        'inserted_flag': 'Inserted Event'
+    },
+    'plot': {
+        'table': 'plots',
+        'keys': 'Plot',
+        'ignore_duplicates': False,
+        'fields': [
+            field('Farmer Name', 'Farmer Name', 'text', nested=False),
+            field('Farm Index', 'Farm Index'),
+            field('Plot Percentage', 'Plot Percentage', 'real'),
+            # A finished plot does not report a current sector
+            field('Plot Current Sector', 'Plot Current Sector', 'integer', required=lambda row: row['plot_percentage'] != 100.0),
+            field('Plot Type', 'Plot Type', 'integer'),
+            field('Plot Datetime', 'Datetime', 'datetime', nested=False)
+        ],
+        'messages': ('Successfully inserted plot', None)
+    },
+    'reward': {
+        'table': 'rewards',
+        'keys': 'Reward',
+        'ignore_duplicates': False,
+        'fields': [
+            field('Farmer Name', 'Farmer Name', 'text', nested=False),
+            field('Farm Index', 'Farm Index'),
+            field('Reward Result', 'Reward Type', 'text', column='reward_type'),
+            field('Reward Hash', 'Reward Hash', required=lambda row: row['reward_type'] == 'Reward'),
+            field('Reward Datetime', 'Datetime', 'datetime', nested=False)
+        ],
+        'messages': ('Successfully inserted reward', None)
+    },
+    'error': {
+        'table': 'errors',
+        'keys': 'Error',
+        'ignore_duplicates': False,
+        'fields': [
+            field('Farmer Name', 'Farmer Name', 'text', nested=False),
+            field('Error', 'Error'),
+            field('Error Datetime', 'Datetime', 'datetime', nested=False)
+        ],
+        'missing': 'Missing Required Fields',
+        'messages': ('Successfully inserted error', None)
+    },
+    'claim': {
+        'table': 'claims',
+        'keys': 'Claim',
+        'ignore_duplicates': False,
+        'fields': [
+            field('Node Name', 'Node Name', 'text', nested=False),
+            field('Slot', 'Slot'),
+            field('Claim Type', 'Claim Type', 'text'),
+            field('Claim Datetime', 'Datetime', 'datetime', nested=False)
+        ],
+        'messages': ('Successfully inserted claim', None)
+    },
+    'consensus': {
+        'table': 'consensus',
+        'keys': 'Consensus',
+        'ignore_duplicates': False,
+        'fields': [
+            field('Node Name', 'Node Name', 'text', nested=False),
+            field('Status', 'Status', 'text'),
+            field('Peers', 'Peers', 'integer'),
+            field('Best', 'Best', 'integer'),
+            # Target and BPS are optional and stored as NULL when not reported
+            field('Target', 'Target', 'integer', required=False),
+            field('Finalized', 'Finalized', 'integer'),
+            field('BPS', 'BPS', 'real', required=False),
+            field('Down Speed KiB', 'Down Speed', 'real'),
+            field('Up Speed KiB', 'Up Speed', 'real'),
+            field('Consensus Datetime', 'Datetime', 'datetime', nested=False)
+        ],
+        'messages': ('Successfully inserted consensus', None)
+    }
+}
+
+for _entity, _schema in schemas.items():
+    for _field in _schema['fields']:
+        if _field['key'] not in keys[_schema['keys']]:
+            raise ValueError(f"{_entity} field {_field['key']} is not in keys['{_schema['keys']}']")
+
+
+# Type name -> check run on every present value
+checks = {
+    'any': None,
+    'json': None,
+    'text': lambda value: isinstance(value, str),
+    'integer': lambda value: isinstance(value, int) and not isinstance(value, bool),
+    'real': lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    'datetime': None
+}
+
+# Type name -> conversion to the stored value, raising ValueError when the value is invalid
+converters = {
+    'datetime': timestamps.parse
+}
+
+
+def columns(entity):
+    schema = schemas[entity]
+    names = [f['column'] for f in schema['fields']]
+    if 'hash' in schema:
+        names.append(schema['hash'][0])
+    if 'created' in schema:
+        names.append(schema['created'])
+    return names
+
+
+def insert_sql(entity):
+    schema = schemas[entity]
+    names = columns(entity)
+    conflict = 'OR IGNORE ' if schema['ignore_duplicates'] else ''
+    return (f"INSERT {conflict}INTO {schema['table']} ({', '.join(names)}) "
+            f"VALUES ({', '.join(':' + name for name in names)})")
+
+
+class Validator:
+    # Everything a record needs checked, resolved once per entity so validating a row is a
+    # single loop over plain tuples with no schema lookups
+    def __init__(self, entity):
+        schema = schemas[entity]
+        self.fields = tuple((f['column'], f['source'], f['nested'], f['required'] is True, checks[f['type']], converters.get(f['type']))
+                            for f in schema['fields'])
+        self.conditional = tuple((f['column'], f['source'], f['required'])
+                                 for f in schema['fields'] if f['required'] not in (True, False))
+        self.json_columns = tuple(f['column'] for f in schema['fields'] if f['type'] == 'json')
+        self.hash = schema.get('hash')
+        self.created = schema.get('created')
+        self.missing_message = schema.get('missing')
+
+    def __call__(self, data, created=None):
+        # Returns (row, None) or (None, error message)
+        if not isinstance(data, dict):
+            return None, 'Record must be a JSON object'
+
+        nested = data.get('Data')
+        if not isinstance(nested, dict):
+            nested = {}
+
+        row = {}
+        missing = None
+        invalid = None
+        for column, source, is_nested, required, check, convert in self.fields:
+            value = nested.get(source) if is_nested else data.get(source)
+            row[column] = value
+            if value is None or value == '':
+                if required:
+                    if missing is None:
+                        missing = []
+                    missing.append(source)
+            elif check is not None and invalid is None and not check(value):
+                invalid = f'Invalid {source}'
+            elif convert is not None:
+                try:
+                    row[column] = convert(value)
+                except ValueError:
+                    if invalid is None:
+                        invalid = f'Invalid {source}'
+
+        for column, source, required in self.conditional:
+            if (row[column] is None or row[column] == '') and required(row):
+                if missing is None:
+                    missing = []
+                missing.append(source)
+
+        if missing:
+            return None, self.missing_message or f"Missing {' and '.join(missing)}"
+        if invalid:
+            return None, invalid
+
+        for column in self.json_columns:
+            row[column] = json.dumps(row[column])
+        if self.hash:
+            row[self.hash[0]] = Helpers.hash_event_data(row[self.hash[1]])
+        if self.created:
+            row[self.created] = created or timestamps.now()
+
+        return row, None
+
+
+validators = {entity: Validator(entity) for entity in schemas}
+
+
+def prepare(entity, records):
+    # Single inserts are a list of one, a batch shares the creation timestamp
+    validate = validators[entity]
+    created = timestamps.now() if validate.created else None
+    return [validate(data, created) for data in records]
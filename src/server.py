@@ -0,0 +1,100 @@
+import os
+import sys
+
+from gunicorn.app.base import BaseApplication
+from gunicorn.arbiter import Arbiter
+
+from src.logger import get_logger
+import src.metrics as metrics
+
+logger = get_logger(__name__)
+
+
+class NexusArbiter(Arbiter):
+    # Forks workers only while the master's database connections are closed, and runs
+    # on_started once the first workers are up
+    def manage_workers(self):
+        super().manage_workers()
+        on_started, self.app.on_started = self.app.on_started, None
+        if on_started:
+            on_started()
+
+    def spawn_worker(self):
+        database_api = self.app.database_api
+        if database_api:
+            database_api.suspend()
+        try:
+            return super().spawn_worker()
+        finally:
+            # The child leaves through SystemExit and never uses the master's connections
+            if database_api and os.getpid() == self.pid:
+                database_api.resume()
+
+
+class NexusApplication(BaseApplication):
+    def __init__(self, app_factory, options, database_api=None, on_started=None):
+        self.app_factory = app_factory
+        self.options = options
+        self.database_api = database_api
+        self.on_started = on_started
+        super().__init__()
+
+    def run(self):
+        # BaseApplication.run with the arbiter above
+        try:
+            NexusArbiter(self).run()
+        except RuntimeError as e:
+            print(f"\nError: {e}\n", file=sys.stderr)
+            sys.stderr.flush()
+            sys.exit(1)
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        # Called in every worker after the fork, so each one gets its own connection pool
+        return self.app_factory()
+
+
+def worker_exit(server, worker):
+    if not worker.wsgi:
+        return
+
+    # Flush queued inserts, then return the worker's pooled connections before it goes away
+    ingest_queue = worker.wsgi.config.get('ingest_queue')
+    if ingest_queue:
+        ingest_queue.stop()
+
+    event_stream = worker.wsgi.config.get('event_stream')
+    if event_stream:
+        event_stream.close()
+
+    database_api = worker.wsgi.config.get('database_api')
+    if database_api:
+        database_api.close()
+
+    # Written last so the totals include the final flush
+    metrics.registry.close()
+
+
+def run_production(app_factory, server_config, database_api=None, on_started=None):
+    # database_api is the master's own, it is suspended while a worker is forked
+    workers = server_config.get('workers', 4)
+    threads = server_config.get('threads', 4)
+
+    options = {
+        'bind': server_config.get('bind', '0.0.0.0:5000'),
+        'workers': workers,
+        'threads': threads,
+        # Threads only take effect with the gthread worker
+        'worker_class': 'gthread' if threads > 1 else 'sync',
+        'keepalive': server_config.get('keepalive', 5),
+        'timeout': server_config.get('timeout', 60),
+        'graceful_timeout': server_config.get('graceful_timeout', 30),
+        'worker_exit': worker_exit
+    }
+
+    logger.info(f"Serving on {options['bind']} with {workers} workers x {threads} threads")
+    NexusApplication(app_factory, options, database_api, on_started).run()
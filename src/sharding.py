@@ -0,0 +1,389 @@
+import concurrent.futures
+import heapq
+import itertools
+import threading
+import zlib
+
+from src.api import DatabaseAPI
+from src.constants import keys
+from src.helpers import Helpers
+from src.logger import get_logger
+import src.rollups as rollups
+import src.schema as schema
+import src.state as state
+
+logger = get_logger(__name__)
+
+# Every farmer's (or node's) rows live in exactly one of N SQLite files, each with its own
+# pool and write lock, so ingestion from different farmers never waits on the same writer.
+# Calls naming a farmer or node go to its shard, everything else fans out to all shards
+# in parallel and the results are merged as if they came from a single database.
+
+# Entity -> (data key, column) of the name its rows are sharded by
+entity_keys = {
+    entity: next((f['key'], f['column']) for f in entity_schema['fields'] if f['key'] in ('Farmer Name', 'Node Name'))
+    for entity, entity_schema in schema.schemas.items()
+}
+
+# Table -> column it is sharded by, rollup and state tables follow their source
+table_columns = {schema.schemas[entity]['table']: column for entity, (_, column) in entity_keys.items()}
+table_columns.update({entity_state['table']: table_columns[entity_state['source']] for entity_state in state.states.values()})
+
+# Cursor rowid that sorts after (or before) every row sharing the cursor datetime
+MAX_ROWID = 2 ** 63 - 1
+
+
+def shard_index(name, count):
+    # crc32 is stable across processes and restarts, unlike hash()
+    return zlib.crc32(str(name).encode('utf-8')) % count
+
+
+class ShardedDatabaseAPI(DatabaseAPI):
+    def __init__(self, db_locations, pool_size=8, pool_timeout=30, pragmas=None, instrument=True):
+        # No pool of its own, every query runs on the shards. The inherited attributes are still
+        # set, so conn is None and listeners are recorded here as well as on every shard.
+        self.db_location = db_locations[0]
+        self.instrument = instrument
+        self.pool = None
+        self._local = threading.local()
+        self.write_listeners = []
+        self.shards = [DatabaseAPI(db_location, pool_size=pool_size, pool_timeout=pool_timeout, pragmas=pragmas, instrument=instrument)
+                       for db_location in db_locations]
+
+        # Threads are only started on the first fan out, so forked workers each get their own
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix='nexus-shard')
+
+    # The inherited getters connect around their queries, the shards connect themselves
+    def connect(self, call_name=None):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def shard_for(self, name):
+        return self.shards[shard_index(name, len(self.shards))]
+
+    def _fan_out(self, function):
+        # Runs function(index, shard) on every shard in parallel, results in shard order
+        futures = [self.executor.submit(function, index, shard) for index, shard in enumerate(self.shards)]
+        return [future.result() for future in futures]
+
+    def _combine(self, responses):
+        # The first failure, or the first response with every count in Data summed over the shards.
+        # A failure lists the shards that failed, the others have already committed their part.
+        failed = [index for index, response in enumerate(responses) if not response['Success']]
+        if failed:
+            combined = dict(responses[failed[0]])
+            if len(failed) < len(responses):
+                combined['Message'] = f"{combined['Message']} (shards {', '.join(map(str, failed))} failed, the other {len(responses) - len(failed)} committed)"
+            combined['Failed Shards'] = failed
+            return combined
+
+        combined = dict(responses[0])
+        if 'Data' in combined:
+            combined['Data'] = dict(combined['Data'])
+            for name, value in combined['Data'].items():
+                if isinstance(value, bool):
+                    combined['Data'][name] = any(response['Data'][name] for response in responses)
+                elif isinstance(value, (int, float)):
+                    combined['Data'][name] = sum(response['Data'][name] for response in responses)
+        return combined
+
+    def _broadcast(self, method, *args):
+        # Maintenance and bulk deletes run on one shard after the other
+        return self._combine([getattr(shard, method)(*args) for shard in self.shards])
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        for shard in self.shards:
+            shard.close()
+
+    def suspend(self):
+        for shard in self.shards:
+            shard.suspend()
+
+    def resume(self):
+        for shard in self.shards:
+            shard.resume()
+
+    def add_write_listener(self, listener):
+        self.write_listeners.append(listener)
+        for shard in self.shards:
+            shard.add_write_listener(listener)
+
+    def initialize(self, vacuum_existing=False):
+        for shard in self.shards:
+            shard.initialize(vacuum_existing)
+
+    def checkpoint(self, mode='PASSIVE'):
+        return self._broadcast('checkpoint', mode)
+
+    def prune(self, table, cutoff_datetime, batch_size=1000):
+        return self._broadcast('prune', table, cutoff_datetime, batch_size)
+
+    def incremental_vacuum(self, pages):
+        return self._broadcast('incremental_vacuum', pages)
+
+    # ===== INSERT
+    def insert(self, entity, data):
+        # Records without a name fail validation on any shard, the first one reports it
+        if entity not in entity_keys or not isinstance(data, dict):
+            return self.shards[0].insert(entity, data)
+
+        return self.shard_for(data.get(entity_keys[entity][0])).insert(entity, data)
+
+    def write_rows(self, rows_by_entity):
+        # Each shard commits its part in its own transaction, a batch is only atomic per shard
+        split = [{} for _ in self.shards]
+        for entity, rows in rows_by_entity.items():
+            column = entity_keys[entity][1]
+            for row in rows:
+                split[shard_index(row[column], len(self.shards))].setdefault(entity, []).append(row)
+
+        def write(index, shard):
+            if not split[index]:
+                return {"Success": True, "Data": {"Inserted Rows": 0}}
+            return shard.write_rows(split[index])
+
+        responses = self._fan_out(write)
+        response = self._combine(responses)
+        if not response['Success']:
+            # Only the failed shards' rows may be written again, the rest are already in. A shard
+            # that wrote its rows one at a time lists the few that failed.
+            unwritten = {}
+            for index in response['Failed Shards']:
+                for entity, rows in responses[index].get('Unwritten Rows', split[index]).items():
+                    unwritten.setdefault(entity, []).extend(rows)
+            response['Unwritten Rows'] = unwritten
+            response['Data'] = {
+                "Inserted Rows": sum(shard_response['Data']['Inserted Rows'] for shard_response in responses if 'Data' in shard_response)
+            }
+        return response
+
+    # ===== GET
+    def _get_page(self, key_name, result_name, table, columns, datetime_column, conditions, params, data, time_range=True):
+        # A page filtered on the sharded column is read from that name's shard alone
+        condition = f"{table_columns.get(table.split('_rollup_')[0])} = ?"
+        name = params[conditions.index(condition)] if condition in conditions else None
+
+        # Explaining one shard's plan is enough, they all share the schema
+        if name is not None or data.get('Explain'):
+            shard = self.shard_for(name) if name is not None else self.shards[0]
+            try:
+                shard.connect(self._caller_name())
+                return shard._get_page(key_name, result_name, table, columns, datetime_column, conditions, params, data, time_range)
+            finally:
+                shard.disconnect()
+
+        self._response_format(data)
+        order = self._page_order(table, data)
+        call_name = self._caller_name()
+        limit = data['Limit']
+
+        # A cursor holds the datetime and (shard, rowid) of the last row. Rows of lower shards with
+        # the same datetime come after it newest first and before it oldest first, rows of higher
+        # shards the other way round. The rowid bounds below take all or none of them in both orders.
+        cursor_datetime, cursor_shard, cursor_id = None, None, None
+        if data.get('Cursor'):
+            cursor_datetime, last_id = Helpers.decode_cursor(data['Cursor'])
+            if isinstance(last_id, list):
+                cursor_shard, cursor_id = last_id
+
+        # Without a cursor every shard returns all rows up to the end of the requested page
+        skip = 0 if data.get('Cursor') else (data['Page'] - 1) * limit
+
+        def fetch(index, shard):
+            shard_data = dict(data)
+            if cursor_shard is not None:
+                if index == cursor_shard:
+                    last_id = cursor_id
+                else:
+                    last_id = MAX_ROWID if index < cursor_shard else 0
+                shard_data['Cursor'] = Helpers.encode_cursor(cursor_datetime, last_id)
+            elif not data.get('Cursor'):
+                shard_data['Page'] = 1
+                shard_data['Limit'] = skip + limit
+
+            try:
+                shard.connect(call_name)
+                return shard._fetch_page(shard.conn.cursor(), table, columns, datetime_column, conditions, params, shard_data, time_range)
+            finally:
+                shard.disconnect()
+
+        results = self._fan_out(fetch)
+
+        # Each shard's rows are already in page order, merge them on (datetime, shard, rowid)
+        streams = [[((row[-2], index, row[-1]), row) for row in rows] for index, (_, rows, _) in enumerate(results)]
+        merged = list(itertools.islice(heapq.merge(*streams, reverse=order == 'desc'), skip, skip + limit))
+
+        next_cursor = None
+        if len(merged) == limit:
+            (last_datetime, last_shard, last_rowid), _ = merged[-1]
+            next_cursor = Helpers.encode_cursor(last_datetime, [last_shard, last_rowid])
+
+        totals = [total for _, _, total in results]
+        total_items = None if None in totals else sum(totals)
+
+        rows = [row for _, row in merged]
+        return self._page_response(key_name, result_name, results[0][0], rows, total_items, next_cursor, data)
+
+    def _get_state(self, method, key_name, result_name, data_key, data, counts):
+        # State tables hold one row per series and are not paged, the shards' rows are
+        # concatenated and put back in name order (a name is only ever on one shard)
+        if data.get(data_key):
+            return getattr(self.shard_for(data[data_key]), method)(data)
+
+        try:
+            response_format = self._response_format(data)
+            responses = self._fan_out(lambda index, shard: getattr(shard, method)(dict(data, Format='rows')))
+            for response in responses:
+                if not response['Success']:
+                    return response
+
+            rows = sorted(itertools.chain.from_iterable(response['Data'][result_name] for response in responses), key=lambda row: row[0])
+
+            columns = keys[key_name]
+            response = {
+                "Success": True,
+                "Data": {
+                    result_name: self._format_rows(columns, rows, response_format),
+                    "Total Items": len(rows)
+                }
+            }
+            for count in counts:
+                response["Data"][count] = sum(shard_response['Data'][count] for shard_response in responses)
+            if response_format != 'objects':
+                response["Data"]["Columns"] = columns
+                response["Data"]["Format"] = response_format
+
+        except Exception as e:
+            logger.error(f'Error getting {result_name.lower()}: {e}')
+            response = {
+                "Success": False,
+                "Message": f"Error getting {result_name.lower()}: {e}"
+            }
+
+        return response
+
+    def get_plot_state(self, data):
+        return self._get_state('get_plot_state', 'Plot State', 'Plot State', 'Farmer Name', data, [])
+
+    def get_consensus_state(self, data):
+        return self._get_state('get_consensus_state', 'Consensus State', 'Consensus State', 'Node Name', data, ['Synced Nodes', 'Stale Nodes'])
+
+    # ===== AGGREGATE
+    def _aggregate(self, method, data, resolution_totals=None):
+        # Grouped by farm or farmer every group lives on one shard and the rows are only
+        # re-sorted, ungrouped buckets are summed when resolution_totals says how
+        if data.get('Farmer Name'):
+            return getattr(self.shard_for(data['Farmer Name']), method)(data)
+
+        try:
+            group_by = data.get('Group By') or 'farm'
+            if group_by == 'none' and resolution_totals is None:
+                raise ValueError("group_by none can not be combined across shards, group by farm or farmer")
+
+            responses = self._fan_out(lambda index, shard: getattr(shard, method)(data))
+            for response in responses:
+                if not response['Success']:
+                    return response
+
+            columns = responses[0]['Data']['Columns']
+            resolution = responses[0]['Data']['Resolution']
+            bucket = columns.index('Bucket Datetime')
+            rows = list(itertools.chain.from_iterable(zip(*response['Data']['Values']) for response in responses))
+
+            if group_by == 'none':
+                rows = resolution_totals(rows, bucket, resolution)
+            else:
+                rows.sort(key=lambda row: (row[bucket], row[0]))
+
+            response = {
+                "Success": True,
+                "Data": dict(self._columnar(columns, rows), Resolution=resolution)
+            }
+
+        except Exception as e:
+            logger.error(f'Error aggregating {method.split("_")[-1]}: {e}')
+            response = {
+                "Success": False,
+                "Message": f"Error aggregating {method.split('_')[-1]}: {e}"
+            }
+
+        return response
+
+    def _reward_totals(self, rows, bucket, resolution):
+        totals = {}
+        for row in rows:
+            totals[row[bucket]] = totals.get(row[bucket], 0) + row[bucket + 1]
+        return [(bucket_datetime, count, count * 3600.0 / rollups.resolution_seconds[resolution])
+                for bucket_datetime, count in sorted(totals.items())]
+
+    def aggregate_rewards(self, data):
+        return self._aggregate('aggregate_rewards', data, self._reward_totals)
+
+    def aggregate_plots(self, data):
+        # Percentiles of separate shards can not be combined, so plots need a group
+        return self._aggregate('aggregate_plots', data)
+
+    # ===== EXPORT
+    def export_rows(self, sql, params, batch_size=1000):
+        # Every shard streams oldest first, merged on the datetime (always the last column)
+        streams = [itertools.chain.from_iterable(shard.export_rows(sql, params, batch_size)) for shard in self.shards]
+        merged = heapq.merge(*streams, key=lambda row: row[-1])
+        while True:
+            rows = list(itertools.islice(merged, batch_size))
+            if not rows:
+                break
+            yield rows
+
+    # ===== UPDATE
+    def update_farmer(self, data):
+        return self.shard_for(data.get('Farmer Name')).update_farmer(data)
+
+    def update_node(self, data):
+        return self.shard_for(data.get('Node Name')).update_node(data)
+
+    def update_farm(self, data):
+        return self.shard_for(data.get('Farmer Name')).update_farm(data)
+
+    # ===== DELETE
+    def delete_farmer(self, data):
+        return self.shard_for(data.get('Farmer Name')).delete_farmer(data)
+
+    def delete_node(self, data):
+        return self.shard_for(data.get('Node Name')).delete_node(data)
+
+    def delete_farm(self, data):
+        return self.shard_for(data.get('Farmer Name')).delete_farm(data)
+
+    # ===== DELETE ALL
+    def delete_all_farmers(self):
+        return self._broadcast('delete_all_farmers')
+
+    def delete_all_nodes(self):
+        return self._broadcast('delete_all_nodes')
+
+    def delete_all_farms(self):
+        return self._broadcast('delete_all_farms')
+
+    def delete_all_farmer_events(self):
+        return self._broadcast('delete_all_farmer_events')
+
+    def delete_all_node_events(self):
+        return self._broadcast('delete_all_node_events')
+
+    def delete_all_plots(self):
+        return self._broadcast('delete_all_plots')
+
+    def delete_all_rewards(self):
+        return self._broadcast('delete_all_rewards')
+
+    def delete_all_errors(self):
+        return self._broadcast('delete_all_errors')
+
+    def delete_all_claims(self):
+        return self._broadcast('delete_all_claims')
+
+    def delete_all_consensus(self):
+        return self._broadcast('delete_all_consensus')
@@ -0,0 +1,54 @@
+# Latest-state tables, one row per series holding its newest raw row. They are upserted
+# alongside every insert, so "current value per farm/node" reads never touch the history.
+states = {
+    'plot': {
+        'table': 'plot_state',
+        'source': 'plots',
+        'datetime': 'plot_datetime',
+        'key': {'farmer_name': 'TEXT', 'farm_index': 'TEXT'},
+        'columns': {'plot_type': 'INTEGER', 'plot_percentage': 'REAL', 'plot_current_sector': 'INTEGER'}
+    },
+    'consensus': {
+        'table': 'consensus_state',
+        'source': 'consensus',
+        'datetime': 'consensus_datetime',
+        'key': {'node_name': 'TEXT'},
+        'columns': {'status': 'TEXT', 'peers': 'INT', 'best': 'INT', 'target': 'INT', 'finalized': 'INT',
+                    'bps': 'REAL', 'down_speed_kib': 'REAL', 'up_speed_kib': 'REAL'}
+    }
+}
+
+
+def _columns(entity):
+    state = states[entity]
+    return list(state['key']) + list(state['columns']) + [state['datetime']]
+
+
+def create_table_sql(entity):
+    state = states[entity]
+    columns = [f'{column} {column_type}' for column, column_type in {**state['key'], **state['columns']}.items()]
+    columns.append(f"{state['datetime']} INTEGER")
+    return f"CREATE TABLE IF NOT EXISTS {state['table']} ({', '.join(columns)}, UNIQUE ({', '.join(state['key'])}))"
+
+
+def upsert_sql(entity):
+    state = states[entity]
+    columns = _columns(entity)
+    updates = [f'{column} = excluded.{column}' for column in list(state['columns']) + [state['datetime']]]
+
+    # Rows can arrive out of order (async ingest, batches), an older row never replaces a newer one
+    return (f"INSERT INTO {state['table']} ({', '.join(columns)}) VALUES ({', '.join(':' + column for column in columns)}) "
+            f"ON CONFLICT ({', '.join(state['key'])}) DO UPDATE SET {', '.join(updates)} "
+            f"WHERE excluded.{state['datetime']} >= {state['table']}.{state['datetime']}")
+
+
+def backfill_sql(entity):
+    # With a single max() SQLite takes the other bare columns from the row holding the maximum
+    state = states[entity]
+    selected = list(state['key']) + list(state['columns']) + [f"max({state['datetime']})"]
+    return (f"INSERT INTO {state['table']} ({', '.join(_columns(entity))}) "
+            f"SELECT {', '.join(selected)} FROM {state['source']} GROUP BY {', '.join(state['key'])}")
+
+
+def select_columns(entity):
+    return ', '.join(_columns(entity))
@@ -0,0 +1,315 @@
+import collections
+import json
+import os
+import socket
+import threading
+import time
+
+from src.logger import get_logger
+import src.schema as schema
+import src.timestamps as timestamps
+
+logger = get_logger(__name__)
+
+# Largest datagram relayed to another worker, bigger batches are split
+MAX_DATAGRAM = 60000
+
+# Seconds the list of workers with stream clients is cached for
+PEER_REFRESH_SECONDS = 1
+
+
+class Subscriber:
+    # One stream client, its events wait here until the response generator picks them up
+    def __init__(self, tables, names, max_events):
+        self.tables = tables
+        self.names = names
+        self.max_events = max_events
+        self.events = collections.deque()
+        self.evicted = False
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def push(self, table, events):
+        # Returns False when the buffer overflowed, a client that far behind is dropped. A caught up
+        # client takes a batch of any size, only events still waiting from earlier pushes count.
+        with self.condition:
+            behind = bool(self.events)
+            self.events.extend((table, event) for event in events)
+            if behind and len(self.events) > self.max_events:
+                self.evicted = True
+                self.events.clear()
+            self.condition.notify()
+            return not self.evicted
+
+    def wait(self, timeout):
+        # Buffered (table, event) pairs, [] when nothing arrived in time, None once evicted or closed
+        with self.condition:
+            if not self.events and not self.evicted and not self.closed:
+                self.condition.wait(timeout)
+            if self.evicted or self.closed:
+                return None
+            events = list(self.events)
+            self.events.clear()
+            return events
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+
+class StreamRelay:
+    # Forwards events to the other workers of the same server. A worker binds a datagram socket in
+    # the shared directory while it has stream clients, publishers send to every socket there.
+    def __init__(self, directory, deliver):
+        self.directory = directory
+        self.deliver = deliver
+        self.path = os.path.join(directory, f'{os.getpid()}.sock')
+        self.dropped = 0
+
+        self._receiver = None
+        self._peers = (0.0, [])
+
+        # A worker whose socket is full is not waited for, its clients are behind anyway
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+        self._lock = threading.Lock()
+
+    def open(self):
+        with self._lock:
+            if self._receiver is not None:
+                return
+
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            receiver.bind(self.path)
+            # The receive thread checks once a second whether the relay was closed
+            receiver.settimeout(1)
+            self._receiver = receiver
+
+        threading.Thread(target=self._receive, args=(receiver,), name='stream-relay', daemon=True).start()
+
+    def close(self):
+        with self._lock:
+            receiver, self._receiver = self._receiver, None
+            if receiver is None:
+                return
+
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    def peers(self):
+        checked, peers = self._peers
+        now = time.monotonic()
+        if now - checked >= PEER_REFRESH_SECONDS:
+            try:
+                peers = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                         if name.endswith('.sock') and os.path.join(self.directory, name) != self.path]
+            except FileNotFoundError:
+                peers = []
+            self._peers = (now, peers)
+        return peers
+
+    def send(self, peers, table, events):
+        for datagram in self._datagrams(table, events):
+            for peer in peers:
+                try:
+                    self._sender.sendto(datagram, peer)
+                except BlockingIOError:
+                    self.dropped += 1
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Left behind by a worker that exited without closing
+                    try:
+                        os.unlink(peer)
+                    except OSError:
+                        pass
+                except OSError as e:
+                    logger.warn(f'Error relaying stream events to {peer}: {e}')
+                    self.dropped += 1
+
+    def _datagrams(self, table, events):
+        # Splits the batch so every datagram stays under MAX_DATAGRAM bytes
+        chunk = []
+        size = 0
+        for event in events:
+            encoded = json.dumps(event)
+            if len(encoded) > MAX_DATAGRAM:
+                logger.warn(f'Stream event of {len(encoded)} bytes is too large to relay')
+                continue
+            if chunk and size + len(encoded) > MAX_DATAGRAM:
+                yield f'["{table}", [{", ".join(chunk)}]]'.encode()
+                chunk = []
+                size = 0
+            chunk.append(encoded)
+            size += len(encoded) + 2
+        if chunk:
+            yield f'["{table}", [{", ".join(chunk)}]]'.encode()
+
+    def _receive(self, receiver):
+        try:
+            while self._receiver is receiver:
+                try:
+                    datagram = receiver.recv(MAX_DATAGRAM + 1024)
+                except socket.timeout:
+                    continue
+
+                try:
+                    table, events = json.loads(datagram)
+                    self.deliver(table, events)
+                except Exception as e:
+                    logger.error(f'Error handling relayed stream events: {e}')
+        finally:
+            receiver.close()
+
+
+class EventStream:
+    # Streamed table -> the display key the farmer_name or node_name filter matches
+    tables = {
+        'farmer_events': 'Farmer Name',
+        'node_events': 'Node Name',
+        'plots': 'Farmer Name',
+        'rewards': 'Farmer Name',
+        'errors': 'Farmer Name',
+        'claims': 'Node Name',
+        'consensus': 'Node Name'
+    }
+
+    # Table -> (display key, column, is a datetime) of the inserted rows, from src/schema.py
+    fields = {
+        entity_schema['table']: [(f['key'], f['column'], f['type'] == 'datetime') for f in entity_schema['fields']]
+        for entity_schema in schema.schemas.values()
+    }
+
+    # Batches report every row they were given, including events the unique index dropped as
+    # duplicates, so recently streamed events are remembered and not sent twice
+    deduplicated = {entity_schema['table'] for entity_schema in schema.schemas.values() if entity_schema['ignore_duplicates']}
+
+    def __init__(self, max_clients=50, buffer_size=1000, heartbeat_seconds=15, recent_size=10000, relay_dir=None):
+        self.max_clients = max_clients
+        self.buffer_size = buffer_size
+        self.heartbeat_seconds = heartbeat_seconds
+        self.recent_size = recent_size
+
+        self._subscribers = []
+        self._recent = {table: collections.OrderedDict() for table in self.deduplicated if table in self.tables}
+        self._lock = threading.Lock()
+
+        self._stats = {
+            'Published Events': 0,
+            'Delivered Events': 0,
+            'Duplicate Events': 0,
+            'Rejected Clients': 0,
+            'Evicted Clients': 0
+        }
+
+        # With several workers, rows inserted through one reach the clients of all of them
+        self.relay = StreamRelay(relay_dir, self._deliver) if relay_dir else None
+
+    def subscribe(self, tables, names=None):
+        # Returns None when the worker already serves max_clients streams
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                self._stats['Rejected Clients'] += 1
+                return None
+
+            subscriber = Subscriber(set(tables), set(names) if names else None, self.buffer_size)
+            self._subscribers.append(subscriber)
+            first = len(self._subscribers) == 1
+
+        if first and self.relay:
+            self.relay.open()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            if subscriber not in self._subscribers:
+                return
+            self._subscribers.remove(subscriber)
+            last = not self._subscribers
+
+        if last and self.relay:
+            self.relay.close()
+
+    def publish(self, action, table, rows):
+        # Write listener, only inserted rows are streamed and only if someone is listening
+        if action != 'insert' or not rows or table not in self.tables:
+            return
+
+        local = bool(self._subscribers)
+        peers = self.relay.peers() if self.relay else []
+        if not local and not peers:
+            return
+
+        events = self._events(table, rows)
+        with self._lock:
+            self._stats['Published Events'] += len(events)
+
+        if local:
+            self._deliver(table, events)
+        if peers:
+            self.relay.send(peers, table, events)
+
+    def _events(self, table, rows):
+        # Inserted rows as the display keyed objects /get returns, minus the ID the database assigned
+        fields = self.fields[table]
+        to_string = timestamps.to_string
+        return [{key: to_string(row.get(column)) if is_datetime else row.get(column) for key, column, is_datetime in fields}
+                for row in rows]
+
+    def _deliver(self, table, events):
+        with self._lock:
+            recent = self._recent.get(table)
+            if recent is not None:
+                fresh = []
+                for event in events:
+                    key = tuple(event.values())
+                    if key in recent:
+                        self._stats['Duplicate Events'] += 1
+                        continue
+                    recent[key] = None
+                    fresh.append(event)
+                while len(recent) > self.recent_size:
+                    recent.popitem(last=False)
+                events = fresh
+
+            subscribers = [subscriber for subscriber in self._subscribers if table in subscriber.tables]
+
+        name_key = self.tables[table]
+        evicted = []
+        delivered = 0
+        for subscriber in subscribers:
+            matched = events if subscriber.names is None else [event for event in events if event.get(name_key) in subscriber.names]
+            if not matched:
+                continue
+            if subscriber.push(table, matched):
+                delivered += len(matched)
+            else:
+                evicted.append(subscriber)
+
+        with self._lock:
+            self._stats['Delivered Events'] += delivered
+            self._stats['Evicted Clients'] += len(evicted)
+
+        for subscriber in evicted:
+            logger.warn(f'Stream client fell more than {self.buffer_size} events behind, disconnecting it')
+            self.unsubscribe(subscriber)
+
+    def close(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.close()
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['Clients'] = len(self._subscribers)
+
+        stats['Max Clients'] = self.max_clients
+        stats['Buffer Size'] = self.buffer_size
+        stats['Dropped Relay Datagrams'] = self.relay.dropped if self.relay else 0
+        return stats
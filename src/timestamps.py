@@ -0,0 +1,131 @@
+import datetime
+import functools
+import re
+import time
+
+# Datetimes are stored as integer microseconds since 1970-01-01 00:00:00, counted in the same
+# wall-clock time the clients report them in. Integers compare, index and subtract cheaply and
+# convert to and from the 'YYYY-MM-DD HH:MM:SS.ffffff' strings the API accepts and returns
+# without any timezone math, so ordering is exactly that of the strings.
+
+FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+PATTERN = re.compile(r'[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}:[0-9]{2}\.[0-9]{6}')
+
+# What strptime(FORMAT) used to accept, unpadded date and time parts and 1 to 6 fraction digits
+LOOSE_PATTERN = re.compile(r'([0-9]{4})-([0-9]{1,2})-([0-9]{1,2}) ([0-9]{1,2}):([0-9]{1,2}):([0-9]{1,2})\.([0-9]{1,6})')
+
+# Range bounds may also leave out the fraction, or the whole time of day
+BOUND_PATTERN = re.compile(r'([0-9]{4})-([0-9]{1,2})-([0-9]{1,2})(?: ([0-9]{1,2}):([0-9]{1,2}):([0-9]{1,2})(?:\.([0-9]{1,6}))?)?')
+
+MICROS_PER_SECOND = 1000000
+MICROS_PER_MINUTE = 60 * MICROS_PER_SECOND
+MICROS_PER_DAY = 86400 * MICROS_PER_SECOND
+EPOCH = datetime.datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+# The local UTC offset is looked up at most this often, often enough to follow DST changes
+OFFSET_REFRESH_SECONDS = 60
+
+
+# Rows arrive in time order, so consecutive values nearly always share their minute and
+# only the seconds need converting. Both caches hold a few days worth of minutes.
+@functools.lru_cache(maxsize=8192)
+def _minute_micros(minute_str):
+    # 'YYYY-MM-DD HH:MM' -> microseconds, raises ValueError for impossible dates and times
+    day = datetime.date.fromisoformat(minute_str[:10]).toordinal() - EPOCH_ORDINAL
+    hour, minute = int(minute_str[11:13]), int(minute_str[14:16])
+    if hour > 23 or minute > 59:
+        raise ValueError(f'Invalid datetime: {minute_str}')
+    return day * MICROS_PER_DAY + (hour * 60 + minute) * MICROS_PER_MINUTE
+
+
+@functools.lru_cache(maxsize=8192)
+def _minute_string(minutes):
+    return (EPOCH + datetime.timedelta(minutes=minutes)).strftime('%Y-%m-%d %H:%M')
+
+
+def _padded(match):
+    # The matched parts as a fully padded 'YYYY-MM-DD HH:MM:SS.ffffff' string
+    year, month, day, hour, minute, second, fraction = match.groups()
+    return (f'{year}-{month:0>2}-{day:0>2} {hour or 0:0>2}:{minute or 0:0>2}:{second or 0:0>2}.'
+            f'{fraction or "":0<6}')
+
+
+def parse(value):
+    # 'YYYY-MM-DD HH:MM:SS.ffffff' -> microseconds, raises ValueError for anything else.
+    # Clients padding every part take the fast path, the rest are padded first.
+    if not isinstance(value, str):
+        raise ValueError('Datetime must be in the format YYYY-MM-DD HH:MM:SS.ffffff')
+    if not PATTERN.fullmatch(value):
+        match = LOOSE_PATTERN.fullmatch(value)
+        if not match:
+            raise ValueError('Datetime must be in the format YYYY-MM-DD HH:MM:SS.ffffff')
+        value = _padded(match)
+
+    second = int(value[17:19])
+    if second > 59:
+        raise ValueError(f'Invalid datetime: {value}')
+
+    return _minute_micros(value[:16]) + second * MICROS_PER_SECOND + int(value[20:])
+
+
+def parse_bound(value):
+    # Like parse(), but a range bound may also be 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS',
+    # the missing parts count as zero
+    if isinstance(value, str) and not PATTERN.fullmatch(value):
+        match = BOUND_PATTERN.fullmatch(value)
+        if match:
+            value = _padded(match)
+    return parse(value)
+
+
+def is_valid(value):
+    try:
+        parse(value)
+        return True
+    except ValueError:
+        return False
+
+
+def to_string(micros):
+    # Anything that is not a timestamp (NULL, text a migration could not convert) passes through
+    if type(micros) is not int:
+        return micros
+
+    minutes, micros = divmod(micros, MICROS_PER_MINUTE)
+    seconds, micros = divmod(micros, MICROS_PER_SECOND)
+    return f'{_minute_string(minutes)}:{seconds:02d}.{micros:06d}'
+
+
+_offset = [0, -OFFSET_REFRESH_SECONDS]
+
+
+def local_offset():
+    # UTC offset of the local timezone in microseconds, cached instead of resolved on every call
+    checked = time.monotonic()
+    if checked - _offset[1] >= OFFSET_REFRESH_SECONDS:
+        _offset[0] = time.localtime().tm_gmtoff * MICROS_PER_SECOND
+        _offset[1] = checked
+    return _offset[0]
+
+
+def now():
+    return time.time_ns() // 1000 + local_offset()
+
+
+def from_iso(value):
+    # ISO 8601 with or without an offset. Aware times are converted to local wall-clock time,
+    # naive ones are taken as local already.
+    parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        return parse(parsed.strftime(FORMAT))
+
+    utc = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parse(utc.strftime(FORMAT)) + local_offset()
+
+
+def migrate_sql(column):
+    # SQL converting a stored datetime string to microseconds, used to migrate existing rows.
+    # Padding the fraction makes '.5' and a missing fraction convert too.
+    return (f"CAST(strftime('%s', {column}) AS INTEGER) * {MICROS_PER_SECOND} "
+            f"+ CAST(substr({column} || '000000', 21, 6) AS INTEGER)")
@@ -0,0 +1,33 @@
+import pytest
+
+from src.api import DatabaseAPI
+from src.nexus import create_app
+
+
+@pytest.fixture
+def database_api(tmp_path):
+    database_api = DatabaseAPI(str(tmp_path / 'nexus.db'))
+    database_api.initialize()
+    yield database_api
+    database_api.close()
+
+
+@pytest.fixture
+def client(database_api):
+    return create_app({}, database_api=database_api).test_client()
+
+
+@pytest.fixture
+def make_client(database_api):
+    # A client for an app built from config, its ingest writer is stopped after the test
+    apps = []
+
+    def make_client(config):
+        app = create_app(config, database_api=database_api)
+        apps.append(app)
+        return app.test_client()
+
+    yield make_client
+    for app in apps:
+        if app.config.get('ingest_queue'):
+            app.config['ingest_queue'].stop()
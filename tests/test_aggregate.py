@@ -0,0 +1,25 @@
+QUERY = {'start_datetime': '2024-05-01', 'end_datetime': '2024-05-02'}
+
+
+def plot(plot_type, minute, sector):
+    return {'Farmer Name': 'farmer', 'Datetime': f'2024-05-01 10:{minute:02d}:00.000000',
+            'Data': {'Farm Index': 0, 'Plot Percentage': 10.0, 'Plot Current Sector': sector, 'Plot Type': plot_type}}
+
+
+def plot_types(client, **query):
+    data = client.get('/aggregate/plots', query_string={**QUERY, **query}).get_json()['Data']
+    return sorted(set(data['Values'][data['Columns'].index('Plot Type')]))
+
+
+def test_plot_type_filter_matches_get(client):
+    for minute in range(3):
+        assert client.post('/insert/plot', json=plot(0, minute, minute + 1)).status_code == 200
+        assert client.post('/insert/plot', json=plot(1, minute + 10, minute + 1)).status_code == 200
+
+    assert plot_types(client) == [0, 1]
+    assert plot_types(client, plot_type='1') == [1]
+
+    # Parsed like /get and /export, a value that is not a plot type matches nothing
+    assert plot_types(client, plot_type='replot') == []
+    plots = client.get('/get/plots', query_string={**QUERY, 'plot_type': 'replot'}).get_json()['Data']
+    assert plots['Total Items'] == 0
@@ -0,0 +1,37 @@
+import pytest
+
+from src.api import DatabaseAPI
+from src.backend import StorageBackend
+from src.sharding import ShardedDatabaseAPI
+
+
+def test_incomplete_backend_fails_at_instantiation():
+    class Incomplete(StorageBackend):
+        def initialize(self, vacuum_existing=False):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_backends_implement_the_interface(tmp_path):
+    DatabaseAPI(str(tmp_path / 'nexus.db')).close()
+    ShardedDatabaseAPI([str(tmp_path / 'nexus-0.db'), str(tmp_path / 'nexus-1.db')]).close()
+
+
+def test_sharded_backend_has_the_inherited_attributes(tmp_path):
+    database_api = ShardedDatabaseAPI([str(tmp_path / 'nexus-0.db'), str(tmp_path / 'nexus-1.db')])
+    database_api.initialize()
+    try:
+        writes = []
+        database_api.add_write_listener(lambda action, table, rows: writes.append((action, table)))
+        database_api.connect()
+        assert database_api.conn is None
+        database_api.disconnect()
+
+        assert database_api.insert('farmer', {'Farmer Name': 'farmer'})['Success']
+        assert writes == [('insert', 'farmers')]
+        assert len(database_api.write_listeners) == 1
+        assert database_api.incremental_vacuum(10)['Success']
+    finally:
+        database_api.close()
@@ -0,0 +1,74 @@
+from src.sharding import ShardedDatabaseAPI
+
+
+def reward(farmer_name, minute, reward_hash=None):
+    return {'Farmer Name': farmer_name, 'Datetime': f'2024-05-01 10:{minute:02d}:00.000000',
+            'Data': {'Farm Index': 0, 'Reward Type': 'Vote', 'Reward Hash': reward_hash}}
+
+
+def farmer_event(farm_index):
+    return {'Farmer Name': 'farmer', 'Datetime': '2024-05-01 10:00:00.000000', 'Event Type': 'Started', 'Data': {'Farm Index': farm_index}}
+
+
+def test_batch_reports_every_item(client):
+    records = [reward('farmer', 0), {'Farmer Name': 'farmer'}, reward('farmer', 1), 'not an object']
+    response = client.post('/insert/reward/batch', json=records)
+    assert response.status_code == 200, response.get_json()
+
+    data = response.get_json()['Data']
+    assert data['Inserted Rows'] == 2
+    assert data['Failed Items'] == 2
+    assert [result['Success'] for result in data['Results']] == [True, False, True, False]
+    assert [result['Index'] for result in data['Results']] == [0, 1, 2, 3]
+
+    rewards = client.get('/get/rewards', query_string={'start_datetime': '2024-05-01', 'end_datetime': '2024-05-02'}).get_json()['Data']
+    assert rewards['Total Items'] == 2
+
+
+def test_batch_rejects_unknown_entities_and_non_arrays(client):
+    assert client.post('/insert/unknown/batch', json=[]).status_code == 400
+    assert client.post('/insert/reward/batch', json={'Farmer Name': 'farmer'}).status_code == 400
+
+
+def test_unique_index_drops_resent_events(client):
+    batch = [farmer_event(0), farmer_event(1)]
+    assert client.post('/insert/farmer_event/batch', json=batch).get_json()['Data']['Inserted Rows'] == 2
+
+    # A log shipper sending the same lines again after a restart
+    response = client.post('/insert/farmer_event/batch', json=batch + [farmer_event(2)])
+    assert response.get_json()['Data']['Inserted Rows'] == 1
+
+    events = client.get('/get/farmer_events', query_string={'start_datetime': '2024-05-01', 'end_datetime': '2024-05-02'}).get_json()['Data']
+    assert events['Total Items'] == 3
+
+
+def test_bad_row_fails_alone(client):
+    bad = reward('farmer', 1)
+    bad['Data']['Farm Index'] = {'not': 'bindable'}
+    response = client.post('/insert/reward/batch', json=[reward('farmer', 0), bad, reward('farmer', 2)])
+    assert response.status_code == 400
+
+    data = response.get_json()['Data']
+    assert data['Inserted Rows'] == 2
+    assert data['Failed Items'] == 1
+    assert [result['Success'] for result in data['Results']] == [True, False, True]
+    assert 'Unwritten Rows' not in response.get_json()
+
+    rewards = client.get('/get/rewards', query_string={'start_datetime': '2024-05-01', 'end_datetime': '2024-05-02'}).get_json()['Data']
+    assert rewards['Total Items'] == 2
+
+
+def test_bad_row_fails_alone_on_its_shard(tmp_path):
+    database_api = ShardedDatabaseAPI([str(tmp_path / f'nexus-{index}.db') for index in range(2)])
+    database_api.initialize()
+    try:
+        records = [reward(farmer_name, minute) for minute in range(2) for farmer_name in ['alice', 'bob', 'carol', 'dave']]
+        records[3]['Data']['Farm Index'] = {'not': 'bindable'}
+        rows = [database_api.prepare_insert('reward', record)[0] for record in records]
+
+        response = database_api.write_rows({'reward': rows})
+        assert not response['Success']
+        assert response['Data']['Inserted Rows'] == 7
+        assert response['Unwritten Rows'] == {'reward': [rows[3]]}
+    finally:
+        database_api.close()
@@ -0,0 +1,53 @@
+import pytest
+
+QUERY = {'start_datetime': '2024-05-01', 'end_datetime': '2024-05-02'}
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client({'cache': {'enabled': True, 'ttl_seconds': 60}})
+
+
+def reward(farmer_name, minute):
+    return {'Farmer Name': farmer_name, 'Datetime': f'2024-05-01 10:{minute:02d}:00.000000',
+            'Data': {'Farm Index': 0, 'Reward Type': 'Vote', 'Reward Hash': None}}
+
+
+def total(client, **query):
+    return client.get('/get/rewards', query_string={**QUERY, **query}).get_json()['Data']['Total Items']
+
+
+def stats(client):
+    return client.get('/cache/stats').get_json()['Data']
+
+
+def test_repeated_request_is_a_hit(client):
+    assert client.post('/insert/reward', json=reward('alice', 0)).status_code == 200
+
+    assert total(client) == 1
+    assert total(client) == 1
+    assert stats(client)['Hits'] == 1
+    assert stats(client)['Misses'] == 1
+
+
+def test_write_drops_only_the_pages_it_affects(client):
+    assert total(client) == 0
+    assert total(client, farmer_name='alice') == 0
+    assert total(client, farmer_name='bob') == 0
+
+    assert client.post('/insert/reward', json=reward('alice', 0)).status_code == 200
+
+    # The unfiltered and alice pages are read again, bob's is still served from the cache
+    assert total(client) == 1
+    assert total(client, farmer_name='alice') == 1
+    hits = stats(client)['Hits']
+    assert total(client, farmer_name='bob') == 0
+    assert stats(client)['Hits'] == hits + 1
+
+
+def test_batch_and_delete_invalidate(client):
+    assert total(client) == 0
+    assert client.post('/insert/reward/batch', json=[reward('alice', 0), reward('bob', 1)]).status_code == 200
+    assert total(client) == 2
+    assert client.post('/delete/rewards/all').status_code == 200
+    assert total(client) == 0
@@ -0,0 +1,54 @@
+import sqlite3
+
+from src.api import DatabaseAPI
+from src.metrics import InstrumentedCursor
+
+
+def farmer_event(data):
+    return {'Farmer Name': 'farmer', 'Datetime': '2024-05-01 10:00:00.000000', 'Event Type': 'Started', 'Data': data}
+
+
+def test_batch_reports_inserted_and_ignored_rows(database_api):
+    response = database_api.insert_batch('farmer_event', [farmer_event({'Farm Index': 0}), farmer_event({'Farm Index': 0}),
+                                                          farmer_event({'Farm Index': 1})])
+    assert response['Success'], response
+    assert response['Data']['Inserted Rows'] == 2
+    assert response['Data']['Failed Items'] == 0
+
+    assert database_api.insert('farmer_event', farmer_event({'Farm Index': 1}))['Success']
+    assert database_api.insert_batch('farmer', [{'Farmer Name': 'farmer'}, {'Farmer Name': 'farmer'}])['Data']['Inserted Rows'] == 1
+
+    connection = sqlite3.connect(database_api.db_location)
+    assert connection.execute("SELECT COUNT(*) FROM farmer_events").fetchone()[0] == 2
+    connection.close()
+
+
+def test_duplicates_are_removed_once_before_the_unique_index(tmp_path, monkeypatch):
+    location = str(tmp_path / 'nexus.db')
+    database_api = DatabaseAPI(location)
+    database_api.initialize()
+    database_api.insert('farmer', {'Farmer Name': 'farmer'})
+
+    # A database from before the unique indexes, holding a duplicate the old dedup let through
+    connection = sqlite3.connect(location)
+    connection.execute("DROP INDEX uq_farmers_farmer_name")
+    connection.execute("INSERT INTO farmers (farmer_name) VALUES ('farmer')")
+    connection.commit()
+
+    database_api.initialize()
+    assert connection.execute("SELECT COUNT(*) FROM farmers").fetchone()[0] == 1
+    connection.close()
+
+    # With the indexes in place the full table cleanup is skipped
+    statements = []
+    execute = InstrumentedCursor.execute
+
+    def spy(cursor, sql, parameters=()):
+        statements.append(sql)
+        return execute(cursor, sql, parameters)
+
+    monkeypatch.setattr(InstrumentedCursor, 'execute', spy)
+    database_api.initialize()
+    assert statements
+    assert not [sql for sql in statements if sql.startswith('DELETE')]
+    database_api.close()
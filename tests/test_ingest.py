@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+
+from src.ingest import IngestQueue
+
+QUERY = {'start_datetime': '2024-05-01', 'end_datetime': '2024-05-02'}
+
+
+def reward(minute):
+    return {'Farmer Name': 'farmer', 'Datetime': f'2024-05-01 10:{minute:02d}:00.000000',
+            'Data': {'Farm Index': 0, 'Reward Type': 'Vote', 'Reward Hash': None}}
+
+
+def rewards_written(client):
+    return client.get('/get/rewards', query_string=QUERY).get_json()['Data']['Total Items']
+
+
+def test_queued_rows_are_written(make_client):
+    client = make_client({'ingest': {'mode': 'async'}})
+    for minute in range(5):
+        assert client.post('/insert/reward', json=reward(minute)).status_code == 202
+    assert client.post('/insert/reward', json={'Farmer Name': 'farmer'}).status_code == 400
+
+    ingest_queue = client.application.config['ingest_queue']
+    ingest_queue.stop()
+    assert rewards_written(client) == 5
+    assert ingest_queue.stats()['Written Rows'] == 5
+
+
+def test_full_queue_answers_503(make_client, database_api, monkeypatch):
+    client = make_client({'ingest': {'mode': 'async', 'queue_size': 2, 'flush_rows': 1}})
+
+    # Hold the writer inside its first flush so the queue fills up behind it
+    writing = threading.Event()
+    release = threading.Event()
+    write_rows = database_api.write_rows
+
+    def slow_write_rows(rows_by_entity):
+        writing.set()
+        release.wait(5)
+        return write_rows(rows_by_entity)
+
+    monkeypatch.setattr(database_api, 'write_rows', slow_write_rows)
+
+    assert client.post('/insert/reward', json=reward(0)).status_code == 202
+    assert writing.wait(5)
+    assert client.post('/insert/reward', json=reward(1)).status_code == 202
+    assert client.post('/insert/reward', json=reward(2)).status_code == 202
+    assert client.post('/insert/reward', json=reward(3)).status_code == 503
+
+    release.set()
+    ingest_queue = client.application.config['ingest_queue']
+    ingest_queue.stop()
+    assert rewards_written(client) == 3
+    assert ingest_queue.stats()['Rejected'] == 1
+
+
+@pytest.mark.parametrize('failures, written', [(1, 3), (3, 0)])
+def test_failed_flush_is_retried(make_client, database_api, monkeypatch, failures, written):
+    # Not started yet, so the rows queued below are flushed together
+    client = make_client({})
+    ingest_queue = IngestQueue(database_api, flush_interval_ms=10)
+    client.application.config['ingest_queue'] = ingest_queue
+
+    calls = []
+    write_rows = database_api.write_rows
+
+    def flaky_write_rows(rows_by_entity):
+        calls.append(rows_by_entity)
+        if len(calls) <= failures:
+            return {"Success": False, "Message": "database is locked"}
+        return write_rows(rows_by_entity)
+
+    monkeypatch.setattr(database_api, 'write_rows', flaky_write_rows)
+
+    for minute in range(3):
+        assert client.post('/insert/reward', json=reward(minute)).status_code == 202
+    ingest_queue.start()
+    ingest_queue.stop()
+
+    stats = ingest_queue.stats()
+    assert rewards_written(client) == written
+    assert stats['Written Rows'] == written
+    assert stats['Failed Rows'] == 3 - written
+    assert stats['Retries'] == min(failures, 2)
+
+
+def test_bad_row_is_dropped_alone(make_client, database_api):
+    client = make_client({})
+    ingest_queue = IngestQueue(database_api, flush_interval_ms=10)
+    client.application.config['ingest_queue'] = ingest_queue
+
+    records = [reward(minute) for minute in range(3)]
+    records[1]['Data']['Farm Index'] = {'not': 'bindable'}
+    for record in records:
+        assert client.post('/insert/reward', json=record).status_code == 202
+    ingest_queue.start()
+    ingest_queue.stop()
+
+    stats = ingest_queue.stats()
+    assert rewards_written(client) == 2
+    assert stats['Written Rows'] == 2
+    assert stats['Failed Rows'] == 1
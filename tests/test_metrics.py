@@ -0,0 +1,10 @@
+def test_unknown_entities_share_one_series(client):
+    for entity in ['plots', 'no_such_thing', 'wp-admin', 'another_typo']:
+        client.get(f'/get/{entity}')
+
+    lines = [line for line in client.get('/metrics').get_data(as_text=True).splitlines()
+             if line.startswith('nexus_http_requests_total{route="/get/<entity>"')]
+    entities = {line.split('entity="')[1].split('"')[0] for line in lines}
+    # The registry is shared by every test, only the entities requested here are checked
+    assert {'plots', 'unknown'} <= entities
+    assert not entities & {'no_such_thing', 'wp-admin', 'another_typo'}
@@ -0,0 +1,81 @@
+import pytest
+
+from src.nexus import create_app
+from src.sharding import ShardedDatabaseAPI
+
+QUERY = {'start_datetime': '2024-05-01', 'end_datetime': '2024-05-02', 'limit': 4}
+
+
+def insert_rewards(client, farmer_names, count):
+    # Three rewards share every datetime, so pages split rows with equal datetimes
+    for i in range(count):
+        response = client.post('/insert/reward', json={
+            'Farmer Name': farmer_names[i % len(farmer_names)],
+            'Datetime': f'2024-05-01 10:{i // 3:02d}:00.000000',
+            'Data': {'Farm Index': i, 'Reward Type': 'Vote', 'Reward Hash': None}
+        })
+        assert response.status_code == 200, response.get_json()
+
+
+def page_through(client, query):
+    rows = []
+    query = dict(query)
+    while True:
+        data = client.get('/get/rewards', query_string=query).get_json()['Data']
+        rows += [(reward['Reward Datetime'], int(reward['Farm Index'])) for reward in data['Rewards']]
+        if not data['Next Cursor']:
+            return rows
+        query['cursor'] = data['Next Cursor']
+
+
+def test_pages_are_oldest_first_by_default(client):
+    insert_rewards(client, ['farmer'], 10)
+
+    first = client.get('/get/rewards', query_string=QUERY).get_json()['Data']
+    assert [int(reward['Farm Index']) for reward in first['Rewards']] == [0, 1, 2, 3]
+    second = client.get('/get/rewards', query_string={**QUERY, 'page': 2}).get_json()['Data']
+    assert [int(reward['Farm Index']) for reward in second['Rewards']] == [4, 5, 6, 7]
+
+    newest = client.get('/get/rewards', query_string={**QUERY, 'order': 'desc'}).get_json()['Data']
+    assert [int(reward['Farm Index']) for reward in newest['Rewards']] == [9, 8, 7, 6]
+
+
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_cursor_follows_the_order(client, order):
+    insert_rewards(client, ['farmer'], 10)
+
+    rows = page_through(client, {**QUERY, 'order': order})
+    assert [farm_index for _, farm_index in rows] == sorted(range(10), reverse=order == 'desc')
+
+
+def test_entity_lists_stay_newest_first(client):
+    for name in ['first', 'second', 'third']:
+        assert client.post('/insert/farmer', json={'Farmer Name': name}).status_code == 200
+
+    farmers = client.get('/get/farmers').get_json()['Data']['Farmers']
+    assert [farmer['Farmer Name'] for farmer in farmers][0] == 'third'
+
+
+def test_unknown_order_is_rejected(client):
+    response = client.get('/get/rewards', query_string={**QUERY, 'order': 'sideways'})
+    assert not response.get_json()['Success']
+
+
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_sharded_pages_merge_in_order(tmp_path, order):
+    database_api = ShardedDatabaseAPI([str(tmp_path / f'nexus-{index}.db') for index in range(3)])
+    database_api.initialize()
+    try:
+        client = create_app({}, database_api=database_api).test_client()
+        insert_rewards(client, ['alice', 'bob', 'carol', 'dave'], 12)
+
+        rows = page_through(client, {**QUERY, 'order': order})
+        datetimes = [datetime for datetime, _ in rows]
+        assert sorted(farm_index for _, farm_index in rows) == list(range(12))
+        assert datetimes == sorted(datetimes, reverse=order == 'desc')
+
+        pages = [client.get('/get/rewards', query_string={**QUERY, 'order': order, 'page': page}).get_json()['Data']['Rewards']
+                 for page in (1, 2, 3)]
+        assert [(reward['Reward Datetime'], int(reward['Farm Index'])) for page in pages for reward in page] == rows
+    finally:
+        database_api.close()
@@ -0,0 +1,28 @@
+import threading
+
+from src.pool import ConnectionPool
+
+
+def test_suspend_closes_every_connection(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'nexus.db'), size=2)
+    pool.release(pool.acquire())
+    in_use = pool.acquire()
+
+    # The connection in use is closed as soon as it is handed back
+    threading.Timer(0.2, pool.release, [in_use]).start()
+    pool.suspend()
+    assert pool._created == 0
+    assert pool._idle.empty()
+
+    # acquire() waits for resume() and then opens a new connection
+    acquired = []
+    thread = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+    thread.start()
+    thread.join(0.2)
+    assert not acquired
+
+    pool.resume()
+    thread.join(5)
+    assert acquired[0].execute("SELECT 1").fetchone() == (1,)
+    pool.release(acquired[0])
+    pool.close()
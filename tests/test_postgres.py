@@ -0,0 +1,166 @@
+import pytest
+
+pytest.importorskip('psycopg')
+pytest.importorskip('psycopg_pool')
+pytest.importorskip('pgserver')
+
+import src.timestamps as timestamps
+from src.postgres import PostgresCursor, PostgresDatabaseAPI, embedded_dsn, stop_embedded, translate
+
+START = '2024-05-01 00:00:00.000000'
+END = '2024-05-31 00:00:00.000000'
+
+
+@pytest.fixture(scope='module')
+def database_api(tmp_path_factory):
+    # One embedded server for the module, every test writes under its own farmer or node name
+    data_dir = str(tmp_path_factory.mktemp('pgdata'))
+    database_api = PostgresDatabaseAPI(embedded_dsn(data_dir), partition_days=1)
+    database_api.initialize()
+    yield database_api
+    database_api.close()
+    stop_embedded(data_dir)
+
+
+def get_data(**data):
+    base = {'Page': 1, 'Limit': 1000, 'Farmer Name': None, 'Node Name': None, 'Event Type': None, 'Plot Type': None,
+            'Farm Index': None, 'Start Time': START, 'End Time': END, 'Resolution': 'raw', 'Cursor': None,
+            'Count': True, 'Explain': False, 'Format': 'objects', 'Stale Minutes': 5, 'Payload': ()}
+    base.update(data)
+    return base
+
+
+def reward(farmer_name, datetime):
+    return {'Farmer Name': farmer_name, 'Datetime': datetime, 'Data': {'Farm Index': 0, 'Reward Type': 'Vote', 'Reward Hash': None}}
+
+
+def plot(farmer_name, datetime, percentage):
+    return {'Farmer Name': farmer_name, 'Datetime': datetime,
+            'Data': {'Farm Index': 0, 'Plot Percentage': percentage, 'Plot Current Sector': 1, 'Plot Type': 0}}
+
+
+@pytest.mark.parametrize('sql, expected', [
+    ("SELECT * FROM t WHERE a = ? AND b = :name", "SELECT * FROM t WHERE a = %s AND b = %(name)s"),
+    ("SELECT a % 60, b::text FROM t", "SELECT a %% 60, b::text FROM t"),
+    ("SELECT '?', ':name' FROM t WHERE a = ?", "SELECT '?', ':name' FROM t WHERE a = %s"),
+    ("SELECT 'it''s ? :x', \"odd?\" FROM t WHERE a = :a", "SELECT 'it''s ? :x', \"odd?\" FROM t WHERE a = %(a)s"),
+    ("SELECT '100%' FROM t", "SELECT '100%%' FROM t")
+])
+def test_translate(sql, expected):
+    assert translate(sql) == expected
+
+
+def test_insert_ignores_duplicates(database_api):
+    assert database_api.insert('farmer', {'Farmer Name': 'dedup'})['Success']
+    response = database_api.insert_batch('farmer', [{'Farmer Name': 'dedup'}, {'Farmer Name': 'dedup'}])
+    assert response['Success']
+    assert response['Data']['Inserted Rows'] == 0
+
+    event = {'Farmer Name': 'dedup', 'Datetime': '2024-05-01 10:00:00.000000', 'Event Type': 'Started', 'Data': {'Farm Index': 0}}
+    assert database_api.insert('farmer_event', event)['Success']
+    assert database_api.insert_batch('farmer_event', [event, event])['Data']['Inserted Rows'] == 0
+
+    events = database_api.get_farmer_events(get_data(**{'Farmer Name': 'dedup'}))['Data']
+    assert events['Total Items'] == 1
+
+
+def test_batch_uses_copy_across_partitions(database_api, monkeypatch):
+    copies = []
+    copy_rows = PostgresCursor.copy_rows
+
+    def spy(cursor, sql, rows):
+        copies.append(len(rows))
+        return copy_rows(cursor, sql, rows)
+
+    monkeypatch.setattr(PostgresCursor, 'copy_rows', spy)
+
+    # Three days of plots with one day partitions
+    records = [plot('copy', f'2024-05-0{1 + i % 3} 12:{i % 60:02d}:00.000000', 50.0) for i in range(90)]
+    response = database_api.insert_batch('plot', records)
+    assert response['Success'], response
+    assert response['Data']['Inserted Rows'] == 90
+    assert copies == [90]
+
+    plots = database_api.get_plots(get_data(**{'Farmer Name': 'copy'}))['Data']
+    assert plots['Total Items'] == 90
+
+    database_api.connect()
+    try:
+        assert len(database_api._partition_bounds(database_api.conn.cursor(), 'plots')) >= 3
+    finally:
+        database_api.disconnect()
+
+
+def test_cursor_paging(database_api):
+    records = [reward('paging', f'2024-05-02 10:{i // 3:02d}:00.000000') for i in range(25)]
+    assert database_api.insert_batch('reward', records)['Success']
+
+    expected = database_api.get_rewards(get_data(**{'Farmer Name': 'paging'}))['Data']['Rewards']
+    assert len(expected) == 25
+
+    seen = []
+    data = get_data(Limit=10, **{'Farmer Name': 'paging'})
+    while True:
+        page = database_api.get_rewards(data)['Data']
+        seen += page['Rewards']
+        if not page['Next Cursor']:
+            break
+        data['Cursor'] = page['Next Cursor']
+
+    assert seen == expected
+
+
+def test_bad_row_fails_alone(database_api):
+    records = [reward('bad_row', f'2024-05-04 10:0{i}:00.000000') for i in range(3)]
+    records[1]['Data']['Farm Index'] = {'not': 'bindable'}
+    response = database_api.insert_batch('reward', records)
+    assert not response['Success']
+    assert response['Data']['Inserted Rows'] == 2
+    assert [result['Success'] for result in response['Data']['Results']] == [True, False, True]
+
+    rewards = database_api.get_rewards(get_data(**{'Farmer Name': 'bad_row'}))['Data']
+    assert rewards['Total Items'] == 2
+
+def test_rollups(database_api):
+    records = [plot('rollup', f'2024-05-03 08:{i * 10:02d}:00.000000', percentage) for i, percentage in enumerate([10.0, 20.0, 30.0])]
+    records.append(plot('rollup', '2024-05-03 09:00:00.000000', 40.0))
+    assert database_api.insert_batch('plot', records)['Success']
+    assert database_api.insert('plot', plot('rollup', '2024-05-03 08:45:00.000000', 60.0))['Success']
+
+    buckets = database_api.get_plots(get_data(Resolution='1h', **{'Farmer Name': 'rollup'}))['Data']['Plots']
+    assert len(buckets) == 2
+
+    oldest, newest = buckets
+    assert newest['Bucket Datetime'] == '2024-05-03 09:00:00.000000'
+    assert newest['Samples'] == 1
+    assert oldest['Bucket Datetime'] == '2024-05-03 08:00:00.000000'
+    assert oldest['Samples'] == 4
+    assert oldest['Plot Percentage Min'] == 10.0
+    assert oldest['Plot Percentage Max'] == 60.0
+    assert oldest['Plot Percentage Avg'] == 30.0
+
+    counts = database_api.aggregate_rewards(get_data(Resolution='1h', **{'Farmer Name': 'paging', 'Group By': 'farmer'}))
+    assert counts['Success'], counts
+
+
+def test_insert_recreates_a_partition_dropped_elsewhere(database_api):
+    records = [plot('dropped', '2024-05-20 12:00:00.000000', 10.0), plot('dropped', '2024-05-20 13:00:00.000000', 20.0)]
+    assert database_api.insert_batch('plot', records)['Success']
+
+    # The master's pruner drops the partition, this process still believes it exists
+    database_api.connect()
+    try:
+        cursor = database_api.conn.cursor()
+        start = timestamps.parse('2024-05-20 00:00:00.000000')
+        name = next(name for name, (low, _) in database_api._partition_bounds(cursor, 'plots').items() if low == start)
+        cursor.execute(f"DROP TABLE {name}")
+        database_api.conn.commit()
+    finally:
+        database_api.disconnect()
+
+    response = database_api.insert('plot', plot('dropped', '2024-05-20 14:00:00.000000', 30.0))
+    assert response['Success'], response
+    assert database_api.insert_batch('plot', records)['Data']['Inserted Rows'] == 2
+
+    plots = database_api.get_plots(get_data(**{'Farmer Name': 'dropped'}))['Data']
+    assert plots['Total Items'] == 3
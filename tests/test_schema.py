@@ -0,0 +1,25 @@
+import pytest
+
+from src.schema import Validator
+
+
+def plot(**data):
+    base = {'Farm Index': 0, 'Plot Percentage': 50.0, 'Plot Current Sector': 3, 'Plot Type': 0}
+    base.update(data)
+    return {'Farmer Name': 'farmer', 'Datetime': '2024-05-01 10:00:00.000000', 'Data': base}
+
+
+def test_valid_plot():
+    row, error = Validator('plot')(plot())
+    assert error is None
+    assert row['plot_type'] == 0
+
+
+@pytest.mark.parametrize('data, error', [
+    ({'Plot Type': True}, 'Invalid Plot Type'),
+    ({'Plot Current Sector': False}, 'Invalid Plot Current Sector'),
+    ({'Plot Percentage': True}, 'Invalid Plot Percentage'),
+    ({'Plot Type': 1.5}, 'Invalid Plot Type')
+])
+def test_booleans_are_not_numbers(data, error):
+    assert Validator('plot')(plot(**data)) == (None, error)
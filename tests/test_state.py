@@ -0,0 +1,34 @@
+def plot(farm_index, minute, percentage):
+    return {'Farmer Name': 'farmer', 'Datetime': f'2024-05-01 10:{minute:02d}:00.000000',
+            'Data': {'Farm Index': farm_index, 'Plot Percentage': percentage, 'Plot Current Sector': 1, 'Plot Type': 0}}
+
+
+def test_plot_state_formats(client):
+    for farm_index, minute, percentage in [(0, 0, 10.0), (0, 5, 20.0), (1, 1, 50.0)]:
+        assert client.post('/insert/plot', json=plot(farm_index, minute, percentage)).status_code == 200
+
+    objects = client.get('/get/plot_state').get_json()['Data']
+    assert [row['Plot Percentage'] for row in objects['Plot State']] == [20.0, 50.0]
+
+    columnar = client.get('/get/plot_state', query_string={'format': 'columnar'}).get_json()['Data']
+    assert columnar['Format'] == 'columnar'
+    assert columnar['Plot State'][columnar['Columns'].index('Plot Percentage')] == [20.0, 50.0]
+
+    response = client.get('/get/plot_state', query_string={'format': 'xml'}).get_json()
+    assert not response['Success']
+    assert 'Unknown format: xml' in response['Message']
+
+
+def test_consensus_state_formats(client):
+    consensus = {'Node Name': 'node', 'Datetime': '2024-05-01 10:00:00.000000',
+                 'Data': {'Status': 'Syncing', 'Peers': 8, 'Best': 90, 'Target': 100, 'Finalized': 80, 'BPS': 2.0,
+                          'Down Speed': 1.0, 'Up Speed': 1.0}}
+    assert client.post('/insert/consensus', json=consensus).status_code == 200
+
+    rows = client.get('/get/consensus_state', query_string={'format': 'rows'}).get_json()['Data']
+    assert rows['Format'] == 'rows'
+    assert rows['Consensus State'][0][rows['Columns'].index('Blocks Behind')] == 10
+
+    response = client.get('/get/consensus_state', query_string={'format': 'xml'}).get_json()
+    assert not response['Success']
+    assert 'Unknown format: xml' in response['Message']
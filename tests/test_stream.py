@@ -0,0 +1,40 @@
+from src.stream import EventStream
+
+
+def plot(index):
+    return {'farmer_name': 'farmer', 'farm_index': 0, 'plot_percentage': 1.0, 'plot_current_sector': index,
+            'plot_type': 0, 'plot_datetime': index}
+
+
+def test_caught_up_client_takes_a_large_batch():
+    event_stream = EventStream(buffer_size=10)
+    subscriber = event_stream.subscribe(['plots'])
+
+    event_stream.publish('insert', 'plots', [plot(index) for index in range(25)])
+
+    assert len(subscriber.wait(0)) == 25
+    assert event_stream.stats()['Evicted Clients'] == 0
+    assert event_stream.stats()['Clients'] == 1
+
+
+def test_slow_client_is_evicted():
+    event_stream = EventStream(buffer_size=10)
+    subscriber = event_stream.subscribe(['plots'])
+
+    # Nothing is read between the pushes, the second one finds events still waiting
+    event_stream.publish('insert', 'plots', [plot(index) for index in range(6)])
+    event_stream.publish('insert', 'plots', [plot(index) for index in range(6, 12)])
+
+    assert subscriber.wait(0) is None
+    assert subscriber.evicted
+    assert event_stream.stats()['Evicted Clients'] == 1
+    assert event_stream.stats()['Clients'] == 0
+
+
+def test_filters_on_name():
+    event_stream = EventStream()
+    subscriber = event_stream.subscribe(['plots'], ['other'])
+
+    event_stream.publish('insert', 'plots', [plot(0), dict(plot(1), farmer_name='other')])
+
+    assert [event['Farmer Name'] for _, event in subscriber.wait(0)] == ['other']
@@ -0,0 +1,53 @@
+import pytest
+
+import src.timestamps as timestamps
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2024-04-04 15:02:41.819700', '2024-04-04 15:02:41.819700'),
+    ('2024-04-04 15:02:41.5', '2024-04-04 15:02:41.500000'),
+    ('2024-4-4 15:02:41.819700', '2024-04-04 15:02:41.819700'),
+    ('2024-04-04 5:2:1.01', '2024-04-04 05:02:01.010000')
+])
+def test_parse_accepts_strptime_formats(value, expected):
+    assert timestamps.to_string(timestamps.parse(value)) == expected
+
+
+@pytest.mark.parametrize('value', [
+    '2024-04-04',
+    '2024-04-04 15:02:41',
+    '2024-04-04 15:02:41.1234567',
+    '2024-02-30 00:00:00.000000',
+    '2024-04-04 24:00:00.000000',
+    None
+])
+def test_parse_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        timestamps.parse(value)
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2024-04-01', '2024-04-01 00:00:00.000000'),
+    ('2024-04-01 00:00:00', '2024-04-01 00:00:00.000000'),
+    ('2024-4-1 1:02:03.4', '2024-04-01 01:02:03.400000')
+])
+def test_parse_bound_accepts_short_bounds(value, expected):
+    assert timestamps.to_string(timestamps.parse_bound(value)) == expected
+
+
+def test_insert_and_get_with_short_datetimes(client):
+    for datetime in ['2024-04-04 15:02:41.5', '2024-4-5 15:02:41.819700']:
+        response = client.post('/insert/reward', json={
+            'Farmer Name': 'farmer',
+            'Datetime': datetime,
+            'Data': {'Farm Index': 0, 'Reward Type': 'Vote', 'Reward Hash': None}
+        })
+        assert response.status_code == 200, response.get_json()
+
+    for start in ['2024-04-01', '2024-04-01 00:00:00']:
+        response = client.get('/get/rewards', query_string={'start_datetime': start, 'end_datetime': '2024-04-05'})
+        assert response.status_code == 200, response.get_json()
+        assert [reward['Reward Datetime'] for reward in response.get_json()['Data']['Rewards']] == ['2024-04-04 15:02:41.500000']
+
+    response = client.get('/get/rewards', query_string={'start_datetime': 'yesterday'})
+    assert response.status_code == 400